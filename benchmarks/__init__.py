@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+
+"""
+    benchmarks
+    ~~~~~~~~~~
+
+    Performance benchmarks of jsondb.
+
+    Run all the benchmarks and save the timings:
+
+        python -m benchmarks -o results.json
+
+    Compare two runs, e.g. of two commits:
+
+        python -m benchmarks.compare before.json after.json
+
+"""
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Run the benchmarks.
+
+        python -m benchmarks [-o results.json] [--scale 1.0] [--repeat 3] [-k query]
+
+"""
+
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+
+from benchmarks import suite
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Run the benchmarks of jsondb.')
+    parser.add_argument('-o', '--output', help='write the results as json to this file')
+    parser.add_argument('--scale', type=float, default=1.0, help='size factor of the documents')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs of each benchmark')
+    parser.add_argument('-k', '--match', help='only run the benchmarks whose names contain this')
+    args = parser.parse_args(argv)
+
+    def log(name, summary):
+        if 'error' in summary:
+            print '%-40s %s' % (name, summary['error'])
+            return
+        print '%-40s %10.4fs %10.4fs' % (name, summary['min'], summary['median'])
+        sys.stdout.flush()
+
+    print '%-40s %11s %11s' % ('benchmark', 'min', 'median')
+    workdir = tempfile.mkdtemp(prefix='jsondb-bench-')
+    try:
+        results = suite.run(workdir, scale=args.scale, repeat=args.repeat, match=args.match, log=log)
+    finally:
+        shutil.rmtree(workdir)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
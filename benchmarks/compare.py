@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+"""
+    benchmarks.compare
+    ~~~~~~~~~~~~~~~~~~
+
+    Compare two results of `python -m benchmarks -o`.
+
+        python -m benchmarks.compare before.json after.json [--threshold 0.1]
+
+    Exits with 1 if any benchmark got slower by more than the threshold.
+
+"""
+
+import sys
+import json
+import argparse
+
+
+def compare(before, after, threshold=0.1, key='min'):
+    """
+    Return (name, time before, time after, ratio, regressed) of the benchmarks in both results.
+
+    The ratio is after / before, so greater than 1 means slower.
+    """
+    rows = []
+    for name in sorted(set(before['results']) & set(after['results'])):
+        old = before['results'][name].get(key)
+        new = after['results'][name].get(key)
+        if old is None or new is None:
+            # Failed in one of the runs.
+            continue
+        ratio = new / old if old else float('inf')
+        rows.append((name, old, new, ratio, ratio > 1 + threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.compare', description='Compare two benchmark results.')
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=0.1, help='slowdown ratio reported as a regression')
+    parser.add_argument('--key', default='min', choices=('min', 'median', 'mean'))
+    args = parser.parse_args(argv)
+
+    before = json.load(open(args.before))
+    after = json.load(open(args.after))
+    if before.get('scale') != after.get('scale'):
+        print 'warning: the results were run with different scales'
+
+    rows = compare(before, after, args.threshold, args.key)
+    print '%-40s %10s %10s %8s' % ('benchmark', 'before', 'after', 'ratio')
+    for name, old, new, ratio, regressed in rows:
+        print '%-40s %9.4fs %9.4fs %7.2fx%s' % (name, old, new, ratio, '  REGRESSION' if regressed else '')
+
+    return 1 if any(row[-1] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
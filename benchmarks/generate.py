@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+"""
+    benchmarks.generate
+    ~~~~~~~~~~~~~~~~~~~
+
+    Synthetic documents of different shapes.
+
+    All the documents are deterministic for a given size.
+
+"""
+
+import random
+
+
+WORDS = ['alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel',
+         'india', 'juliet', 'kilo', 'lima', 'mike', 'november', 'oscar', 'papa']
+
+CATEGORIES = ['reference', 'fiction', 'poetry', 'history']
+
+
+def words(rnd, n):
+    return ' '.join(rnd.choice(WORDS) for i in range(n))
+
+
+def deep(depth=100):
+    """Nested dicts, depth levels deep."""
+    data = {'name': 'leaf', 'leaf': True}
+    for i in reversed(range(depth)):
+        data = {'name': 'level%s' % i, 'level': i, 'child': data}
+    return data
+
+
+def wide(width=1000):
+    """A dict of width small dicts."""
+    rnd = random.Random(width)
+    return dict(('node%05d' % i, {'name': words(rnd, 2), 'size': rnd.randint(0, 1000), 'flag': i % 2 == 0})
+                for i in range(width))
+
+
+def many_keys(size=10000):
+    """A flat dict of size scalars."""
+    rnd = random.Random(size)
+    return dict(('key%06d' % i, rnd.random() if i % 2 else words(rnd, 1)) for i in range(size))
+
+
+def long_list(size=20000):
+    """A long list of scalars."""
+    rnd = random.Random(size)
+    return {'values': [rnd.randint(0, 1 << 20) for i in range(size)]}
+
+
+def bookstore(scale=1000):
+    """The bookstore of the JSONPath examples, with scale books."""
+    rnd = random.Random(scale)
+    books = []
+    for i in range(scale):
+        book = {
+            'category': rnd.choice(CATEGORIES),
+            'author': words(rnd, 2).title(),
+            'title': words(rnd, 4).capitalize(),
+            'price': round(rnd.uniform(5, 30), 2),
+        }
+        if i % 3 == 0:
+            book['isbn'] = '0-%03d-%05d-%d' % (rnd.randint(0, 999), i, i % 10)
+        books.append(book)
+    return {'store': {'book': books, 'bicycle': {'color': 'red', 'price': 19.95}}}
+
+
+def shapes(scale=1.0):
+    """Return the documents of all the shapes, sized by scale."""
+    size = lambda n: max(int(n * scale), 1)
+    return {
+        'deep': deep(min(size(100), 150)),
+        'wide': wide(size(1000)),
+        'many_keys': many_keys(size(10000)),
+        'long_list': long_list(size(20000)),
+        'bookstore': bookstore(size(1000)),
+    }
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+
+"""
+    benchmarks.suite
+    ~~~~~~~~~~~~~~~~
+
+    The benchmarks and how to time them.
+
+    Every benchmark is run *repeat* times on a fresh fixture.
+    Setting up the fixture (loading or copying a db) is not timed.
+
+"""
+
+import os
+import sys
+import json
+import shutil
+import timeit
+import sqlite3
+import subprocess
+
+import jsondb
+from benchmarks import generate
+
+
+timer = timeit.default_timer
+
+# Number of operations of the update and remove benchmarks.
+OPS = 20
+
+QUERIES = [
+    ('bookstore', 'child', '$.store.bicycle.color'),
+    ('bookstore', 'children', '$.store.book.title'),
+    ('bookstore', 'descendant', '$..author'),
+    ('bookstore', 'predicate', '$.store.book[?(@.price < 10)].title'),
+    ('bookstore', 'exists', '$.store.book[?(@.isbn)].author'),
+    ('bookstore', 'slice', '$.store.book[10:20].title'),
+    ('bookstore', 'index', '$.store.book[-1].title'),
+    ('deep', 'descendant', '$..leaf'),
+    ('wide', 'wildcard', '$.*.name'),
+    ('many_keys', 'child', '$.key000001'),
+    ('long_list', 'slice', '$.values[100:200]'),
+]
+
+
+class Benchmark(object):
+    def __init__(self, name, run, setup=None, teardown=None):
+        """
+        :param run: The timed function, called with what setup returns.
+
+        :param setup: Prepares a fresh fixture for each run.
+
+        :param teardown: Called with the fixture after each run.
+        """
+        self.name = name
+        self.run = run
+        self.setup = setup or (lambda: None)
+        self.teardown = teardown or (lambda fixture: None)
+
+    def measure(self, repeat=3):
+        """Return the wall time of each run, in seconds."""
+        times = []
+        for i in range(repeat):
+            fixture = self.setup()
+            try:
+                start = timer()
+                self.run(fixture)
+                times.append(timer() - start)
+            finally:
+                self.teardown(fixture)
+        return times
+
+
+class Suite(object):
+    """All the benchmarks over the documents of generate.shapes(scale)."""
+
+    def __init__(self, workdir, scale=1.0):
+        self.workdir = workdir
+        self.scale = scale
+        self.docs = generate.shapes(scale)
+        self.counter = 0
+
+    def path(self, name):
+        return os.path.join(self.workdir, name)
+
+    def scratch(self):
+        """A new db path for a single run."""
+        self.counter += 1
+        return self.path('scratch%s.db' % self.counter)
+
+    def remove(self, path):
+        if os.path.exists(path):
+            os.remove(path)
+
+    def prepare(self):
+        """Write the json files and the fixture dbs of all the shapes."""
+        for shape, doc in self.docs.iteritems():
+            with open(self.path(shape + '.json'), 'w') as f:
+                json.dump(doc, f)
+            jsondb.create(doc, url=self.path(shape + '.db')).close()
+
+    def load(self, shape):
+        return lambda: jsondb.load(self.path(shape + '.db'))
+
+    def copy(self, shape):
+        """A private copy of the fixture db of shape, for the benchmarks which modify it."""
+        def setup():
+            path = self.scratch()
+            shutil.copyfile(self.path(shape + '.db'), path)
+            return jsondb.load(path)
+        return setup
+
+    def close(self, db):
+        db.close()
+        self.remove(db.get_path())
+
+    def benchmarks(self):
+        for shape, doc in sorted(self.docs.iteritems()):
+            for bench in self.ingest(shape, doc):
+                yield bench
+            for bench in self.materialize(shape):
+                yield bench
+
+        for shape, name, path in QUERIES:
+            yield Benchmark('query/%s/%s' % (shape, name),
+                            lambda db, path=path: db.query(path).values(),
+                            self.load(shape), lambda db: db.close())
+
+        for bench in self.update():
+            yield bench
+        for bench in self.delete():
+            yield bench
+
+    def ingest(self, shape, doc):
+        def create(path):
+            jsondb.create(doc, url=path).close()
+
+        def from_file(path):
+            jsondb.from_file(self.path(shape + '.json'), url=path).close()
+
+        def feed(db):
+            db.feed({'doc': doc})
+            db.commit()
+
+        yield Benchmark('create/%s' % shape, create, self.scratch, self.remove)
+        yield Benchmark('from_file/%s' % shape, from_file, self.scratch, self.remove)
+        yield Benchmark('feed/%s' % shape, feed, lambda: jsondb.create({}, url=self.scratch()), self.close)
+
+    def materialize(self, shape):
+        yield Benchmark('data/%s' % shape, lambda db: db.data(), self.load(shape), lambda db: db.close())
+        yield Benchmark('dumps/%s' % shape, lambda db: db.dumps(), self.load(shape), lambda db: db.close())
+
+    def update(self):
+        def scalar(db):
+            bicycle = db['store']['bicycle']
+            for i in range(OPS):
+                bicycle['color'] = 'color%s' % i
+            db.commit()
+
+        def subtree(db):
+            store = db['store']
+            for i in range(OPS):
+                store['bicycle'] = {'color': 'color%s' % i, 'price': i, 'tags': ['a', 'b']}
+            db.commit()
+
+        def keys(db):
+            for i in range(OPS):
+                db['key%06d' % i] = i
+            db.commit()
+
+        yield Benchmark('setitem/bookstore/scalar', scalar, self.copy('bookstore'), self.close)
+        yield Benchmark('setitem/bookstore/subtree', subtree, self.copy('bookstore'), self.close)
+        yield Benchmark('setitem/many_keys', keys, self.copy('many_keys'), self.close)
+
+    def delete(self):
+        def items(db):
+            books = db['store']['book']
+            for i in range(min(OPS, len(books))):
+                del books[0]
+            db.commit()
+
+        def subtree(db):
+            del db['store']['book']
+            db.commit()
+
+        def keys(db):
+            for i in range(OPS):
+                del db['key%06d' % i]
+            db.commit()
+
+        yield Benchmark('remove/bookstore/items', items, self.copy('bookstore'), self.close)
+        yield Benchmark('remove/bookstore/subtree', subtree, self.copy('bookstore'), self.close)
+        yield Benchmark('remove/many_keys', keys, self.copy('many_keys'), self.close)
+
+
+def summarize(times):
+    ordered = sorted(times)
+    return {
+        'min': ordered[0],
+        'median': ordered[len(ordered) // 2],
+        'mean': sum(ordered) / len(ordered),
+        'runs': times,
+    }
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.STDOUT).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(workdir, scale=1.0, repeat=3, match=None, log=None):
+    """
+    Run the benchmarks whose names contain match, and return the results.
+
+    :param log: Called with each name and its summary as soon as it is measured.
+    """
+    suite = Suite(workdir, scale)
+    suite.prepare()
+
+    results = {}
+    for bench in suite.benchmarks():
+        if match and match not in bench.name:
+            continue
+        try:
+            results[bench.name] = summarize(bench.measure(repeat))
+        except Exception as e:
+            # Keep going, a failure is recorded rather than timed.
+            results[bench.name] = {'error': '%s: %s' % (type(e).__name__, e)}
+        if log:
+            log(bench.name, results[bench.name])
+
+    return {
+        'commit': get_commit(),
+        'python': sys.version.split()[0],
+        'sqlite': sqlite3.sqlite_version,
+        'scale': scale,
+        'repeat': repeat,
+        'results': results,
+    }
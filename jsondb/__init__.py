@@ -14,12 +14,16 @@ except:
 import core
 from datatypes import *
 import backends
+import importer
 from error import *
+from util import CancelToken
 
 
 class BaseDB:
     def set_link_key(self, link_key):
         self.link_key = link_key
+        if self.backend.writer:
+            return self.backend.submit(lambda backend: backend.set_link_key(link_key)).result()
         self.backend.set_link_key(link_key)
 
     def __enter__(self):
@@ -61,8 +65,13 @@ def create(data={}, url=None, overwrite=True, link_key=None, **kws):
     :param link_key: Key directive for links in the database.
 
     :param kws: Additional parameters to parse to the engine.
+                For sqlite3, *profile* selects one of the durability profiles
+                (default, bulk_load, durable, concurrent, read_only),
+                and *pragmas* is a dict of PRAGMAs overriding the profile.
+                *hashes* keeps the hashes of the nodes, see `jsondb.digest`,
+                and *changelog* logs the changes, see `changes`.
     """
-    _backend = backends.create(url, overwrite=overwrite)
+    _backend = backends.create(url, overwrite=overwrite, **kws)
 
     # guess root type from the data provided.
     root_type = TYPE_MAP.get(type(data))
@@ -98,9 +107,14 @@ def load(url, **kws):
 
     :param url: An RFC-1738-style string which specifies the URL to load from.
 
-    :param kws: Additional parameters to parse to the engine.
+    :param kws: Additional parameters to parse to the engine. See `create`.
+                For sqlite3, *readonly* opens the file read-only and shared,
+                and *immutable* additionally skips all locking, which is only
+                safe when no process writes to the file.
+                *snapshot* loads an in-memory copy of the file instead,
+                see `Queryable.snapshot`.
     """
-    _backend = backends.create(url, overwrite=False)
+    _backend = backends.create(url, overwrite=False, **kws)
     root_type = _backend.get_root_type()
 
     cls = get_class(root_type)
@@ -109,12 +123,21 @@ def load(url, **kws):
     return self
 
 
-def from_file(file, url=None, **kws):
-    """Create a new db from json file"""
+def from_file(file, url=None, processes=None, **kws):
+    """
+    Create a new db from json file
+
+    :param processes: If given, the elements of the top-level list or dict
+                      are parsed by this many worker processes in parallel.
+    """
     if isinstance(file, basestring):
         fileobj = open(file)
     else:
         fileobj = file
+
+    if processes:
+        return importer.import_file(fileobj, lambda data: create(data, url=url, **kws), processes=processes)
+
     # TODO: streaming
     data = json.load(fileobj)
 
@@ -128,4 +151,44 @@ def from_file(file, url=None, **kws):
     return self
 
 
-__all__ = ['version', 'create', 'load', 'from_file']
+def federate(urls, **kws):
+    """
+    Attach several existing DBs to run queries across all of them at once.
+
+    :param urls: URLs of the DBs to query.
+
+    :param kws: Additional parameters to parse to the engine.
+    """
+    return federation.Federation(urls, **kws)
+
+
+def diff(a, b, **kws):
+    """
+    Generate the JSON Patch operations turning a into b, with bounded memory.
+    See `jsondb.compare`.
+
+    :param a, b: Two dbs or nodes, or the URLs of dbs to open read-only.
+
+    :param kws: Additional parameters to parse to the engine, for the URLs.
+    """
+    opened = []
+    try:
+        if isinstance(a, basestring):
+            a = load(a, readonly=True, **kws)
+            opened.append(a)
+        if isinstance(b, basestring):
+            b = load(b, readonly=True, **kws)
+            opened.append(b)
+        for op in a.diff(b):
+            yield op
+    finally:
+        for db in opened:
+            db.close()
+
+
+from asyncdb import AsyncJsonDB
+import federation
+from replica import replicate
+
+
+__all__ = ['version', 'create', 'load', 'from_file', 'federate', 'diff', 'replicate', 'AsyncJsonDB', 'CancelToken']
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.asyncdb
+    ~~~~~~~~~~~~~~
+
+    Non-blocking access to a db.
+
+    All the work is done in a dedicated thread with its own connection.
+    Every call returns a `Future` immediately, which can be waited on,
+    or hooked into an event loop with `add_done_callback`.
+
+"""
+
+import threading
+import Queue
+
+import jsondb
+from jsondb.util import Future, CancelToken
+from jsondb.error import CancelledError
+
+import logging
+logger = logging.getLogger(__file__)
+
+
+STOP = object()
+
+
+class Executor(object):
+    """A thread which owns a db and runs func(db, *args) for the callers."""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.queue = Queue.Queue()
+        self.db = None
+        self.thread = threading.Thread(target=self.run, name='jsondb-executor')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, func, *args, **kws):
+        future = Future()
+        self.queue.put((func, args, kws, future))
+        return future
+
+    def stop(self):
+        self.queue.put(STOP)
+        self.thread.join()
+
+    def run(self):
+        try:
+            self.db = self.factory()
+        except Exception as e:
+            logger.exception('failed to open the db')
+            self.db = None
+            error = e
+        else:
+            error = None
+
+        while True:
+            item = self.queue.get()
+            if item is STOP:
+                break
+            func, args, kws, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            if error is not None:
+                future.set_exception(error)
+                continue
+            try:
+                result = func(self.db, *args, **kws)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+        if self.db is not None:
+            self.db.close()
+
+
+class AsyncQueryResult(object):
+    """
+    Streams the result of a query in chunks.
+
+        result = db.query('$..name').result()
+        while True:
+            chunk = result.fetch().result()
+            if not chunk:
+                break
+    """
+
+    def __init__(self, executor, seq, chunk_size, token):
+        self.executor = executor
+        self.seq = seq
+        self.chunk_size = chunk_size
+        self.token = token
+        self.pending = None
+
+    def _fetch(self, db, size):
+        chunk = []
+        for row in self.seq:
+            if self.token.cancelled:
+                raise CancelledError
+            chunk.append(db._make(row.id, row.type).data())
+            if len(chunk) >= size:
+                break
+        return chunk
+
+    def fetch(self, size=None):
+        """Return a `Future` of the next chunk of values. An empty chunk means the end."""
+        if self.token.cancelled:
+            future = Future()
+            future.cancel()
+            return future
+        self.pending = self.executor.submit(self._fetch, size or self.chunk_size)
+        return self.pending
+
+    def values(self):
+        """Return a `Future` of all the remaining values."""
+        return self.fetch(float('inf'))
+
+    def cancel(self):
+        """
+        Stop the query. It takes effect at the next row boundary, where a pending
+        fetch raises `CancelledError`. Chunks not fetched yet are discarded.
+        """
+        self.token.cancel()
+        if self.pending is not None:
+            self.pending.cancel()
+
+    def __iter__(self):
+        """Blocking iteration, chunk by chunk."""
+        while True:
+            chunk = self.fetch().result()
+            if not chunk:
+                break
+            for value in chunk:
+                yield value
+
+
+class AsyncJsonDB(object):
+    """
+    Non-blocking facade of an existing db.
+
+        db = AsyncJsonDB('path/to/filename.db')
+        result = db.query('$.store.book.title').result()
+        titles = result.values().result()
+    """
+
+    def __init__(self, url, chunk_size=100, **kws):
+        """
+        :param url: URL of the db, see `jsondb.load`.
+
+        :param chunk_size: Default number of values fetched at a time from query results.
+
+        :param kws: Additional parameters to parse to the engine.
+        """
+        self.url = url
+        self.chunk_size = chunk_size
+        self.executor = Executor(lambda: jsondb.load(url, **kws))
+
+    def _query(self, db, path, parent, timeout):
+        token = CancelToken()
+        seq = db.query(path, parent=parent, timeout=timeout, cancel=token).seq
+        return AsyncQueryResult(self.executor, seq, self.chunk_size, token)
+
+    def query(self, path, parent=None, timeout=None):
+        """Return a `Future` of an `AsyncQueryResult`."""
+        return self.executor.submit(self._query, path, parent, timeout)
+
+    def get(self, key, default=None):
+        """Return a `Future` of the value of key, as db[key].data() does."""
+        def _get(db):
+            node = db[key]
+            return node.data() if node is not None else default
+        return self.executor.submit(_get)
+
+    def data(self):
+        return self.executor.submit(lambda db: db.data())
+
+    def feed(self, data, parent=None):
+        """Return a `Future` of the list of ids, see `Queryable.feed`."""
+        return self.executor.submit(lambda db: db.feed(data, parent))
+
+    def commit(self):
+        return self.executor.submit(lambda db: db.commit())
+
+    def close(self):
+        """Commit and close. Blocks until the pending calls are done."""
+        self.executor.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
@@ -5,12 +5,14 @@ import tempfile
 import re
 
 from jsondb.backends.sqlite3_backend import Sqlite3Backend
+from jsondb.backends.sharded import ShardedBackend
 from jsondb.backends.url import URL
 from jsondb.util import IS_WINDOWS
 
 
 drivers = {
     'sqlite3' : Sqlite3Backend,
+    'sharded' : ShardedBackend,
 }
 
 
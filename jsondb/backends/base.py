@@ -1,8 +1,36 @@
 # -*- coding: utf-8 -*-
 
+from jsondb.util import Future
+from jsondb.tracing import Tracer
+from jsondb.slowlog import SlowLog
+from jsondb.backends import hooks
+
+
 class BackendBase(object):
+    writer = None
+
+    # The tracer started with trace=True, and all the tracers attached.
+    tracer = None
+    tracers = ()
+
+    # The `SlowLog` started with slow_log=threshold or slow_log=SlowLog(...).
+    slowlog = None
+
+    hooks = ()
+
+    # Whether the hashes of the nodes are kept, see `jsondb.digest`.
+    hashes = False
+
+    # Whether the changes are logged, see `iter_changes`.
+    changelog = False
+
     def __init__(self, *args, **kws):
-        pass
+        if kws.get('trace'):
+            self.tracer = Tracer()
+            self.add_tracer(self.tracer)
+        slow_log = kws.get('slow_log')
+        if slow_log is not None:
+            self.set_slowlog(slow_log if isinstance(slow_log, SlowLog) else SlowLog(threshold=slow_log))
 
     def get_path(self):
         raise NotImplementedError
@@ -12,6 +40,12 @@ class BackendBase(object):
   
     def rollback(self):
         raise NotImplementedError
+
+    def savepoint(self):
+        raise NotImplementedError
+
+    def release_savepoint(self, rollback=False):
+        raise NotImplementedError
  
     def close(self):
         raise NotImplementedError
@@ -43,3 +77,110 @@ class BackendBase(object):
     def iter_children(self, *args, **kws):
         raise NotImplementedError
 
+    def explain(self, *args, **kws):
+        raise NotImplementedError
+
+    def remove_trees(self, *args, **kws):
+        raise NotImplementedError
+
+    def get_rows(self, *args, **kws):
+        raise NotImplementedError
+
+    def update_values(self, *args, **kws):
+        raise NotImplementedError
+
+    def increase_values(self, *args, **kws):
+        raise NotImplementedError
+
+    def set_rows(self, *args, **kws):
+        raise NotImplementedError
+
+    def apply_value(self, *args, **kws):
+        raise NotImplementedError
+
+    def select_tree(self, *args, **kws):
+        raise NotImplementedError
+
+    def get_members(self, *args, **kws):
+        raise NotImplementedError
+
+    def copy_trees(self, *args, **kws):
+        raise NotImplementedError
+
+    def digests(self, *args, **kws):
+        raise NotImplementedError
+
+    def iter_members(self, *args, **kws):
+        raise NotImplementedError
+
+    def iter_changes(self, *args, **kws):
+        raise NotImplementedError
+
+    def trim_changes(self, *args, **kws):
+        raise NotImplementedError
+
+    def watch(self, *args, **kws):
+        raise NotImplementedError
+
+    def replace_rows(self, *args, **kws):
+        raise NotImplementedError
+
+    def delete_rows(self, *args, **kws):
+        raise NotImplementedError
+
+    def snapshot(self, *args, **kws):
+        raise NotImplementedError
+
+    def top_ids(self, *args, **kws):
+        raise NotImplementedError
+
+    def tree_ids(self, *args, **kws):
+        raise NotImplementedError
+
+    def set_parent(self, *args, **kws):
+        raise NotImplementedError
+
+    def renumber(self, *args, **kws):
+        raise NotImplementedError
+
+    def add_tracer(self, tracer):
+        """Report the statements run from now on to tracer, see `jsondb.tracing`."""
+        self.tracers.append(tracer)
+
+    def remove_tracer(self, tracer):
+        self.tracers.remove(tracer)
+
+    def add_hook(self, before=None, after=None, methods=None):
+        """
+        Call before(call) and after(call) around the calls of the interface methods.
+        See `jsondb.backends.hooks`. Returns the hook, to be passed to `remove_hook`.
+        """
+        hook = hooks.Hook(before, after, methods)
+        self.hooks = list(self.hooks) + [hook]
+        hooks.install(self, self.hooks)
+        return hook
+
+    def remove_hook(self, hook):
+        self.hooks = [x for x in self.hooks if x is not hook]
+        hooks.install(self, self.hooks)
+
+    def set_slowlog(self, slowlog):
+        """Report the slow calls to a `SlowLog`, or stop if None."""
+        if self.slowlog is not None:
+            self.remove_tracer(self.slowlog)
+        self.slowlog = slowlog
+        if slowlog is not None:
+            self.add_tracer(slowlog)
+
+    def submit(self, func, *args, **kws):
+        """
+        Run func(backend, *args, **kws) as a write operation and return a `Future`.
+        Backends without a writer thread run it right away.
+        """
+        future = Future()
+        try:
+            future.set_result(func(self, *args, **kws))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.backends.federation
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Query several sqlite3 dbs at once.
+
+    The dbs are attached to one in-memory connection, which reads the rows
+    of the results from the db they come from. A JSONPath is evaluated in
+    each db on a read-only connection of its own, so that every step is a
+    statement on the table of one db, searched by its indexes.
+
+    The ids are remapped to be unique over the dbs:
+    id = (original id + 1) * number of dbs + index of the db.
+    So the root of the n-th db has the id n.
+
+"""
+
+import os
+import time
+import urllib
+
+from jsondb.backends.sqlite3_backend import Sqlite3Backend, uri_supported
+from jsondb.backends.url import URL
+from jsondb.datatypes import *
+from jsondb.error import *
+
+import logging
+logger = logging.getLogger(__file__)
+
+
+# Fixed at compile time, 10 by default.
+MAX_ATTACHED = 10
+
+COLUMNS = ('(id + 1) * {n} + {k} as id,'
+           ' case when parent = -2 then -2 else (parent + 1) * {n} + {k} end as parent,'
+           ' type, value, link')
+
+
+class FederatedBackend(Sqlite3Backend):
+    def __init__(self, urls, **kws):
+        """
+        :param urls: URLs or paths of the sqlite3 dbs.
+        """
+        if len(urls) > MAX_ATTACHED:
+            raise UnsupportedOperation('At most %s dbs can be federated.' % MAX_ATTACHED)
+        self.sources = [URL.parse(url) if '://' in url else URL('sqlite3', database=url) for url in urls]
+        self.size = len(self.sources)
+        self.roots = range(self.size)
+        super(FederatedBackend, self).__init__(URL('sqlite3', database=':memory:'), **kws)
+
+    def encode(self, index, id):
+        return -2 if id == -2 else (id + 1) * self.size + index
+
+    def decode(self, id):
+        """Return the index of the db and the original id."""
+        return id % self.size, id // self.size - 1
+
+    def columns(self, index):
+        return COLUMNS.format(n=self.size, k=index)
+
+    def open(self, overwrite=False):
+        conn = self.get_connection()
+        for i, source in enumerate(self.sources):
+            path = os.path.abspath(source.database)
+            if not os.path.exists(path):
+                raise IOError('No such db: %s' % path)
+            if uri_supported():
+                path = 'file:%s?mode=ro' % urllib.quote(path)
+            conn.execute('attach database ? as db%s' % i, (path,))
+
+        conn.execute('create temp view jsondata as %s' % ' union all '.join(
+                     'select %s from db%s.jsondata' % (self.columns(i), i) for i in range(self.size)))
+        self.conn = conn
+        self.dbs = [Sqlite3Backend(source, readonly=True) for source in self.sources]
+
+    def add_tracer(self, tracer):
+        super(FederatedBackend, self).add_tracer(tracer)
+        for db in self.dbs:
+            db.add_tracer(tracer)
+
+    def remove_tracer(self, tracer):
+        super(FederatedBackend, self).remove_tracer(tracer)
+        for db in self.dbs:
+            db.remove_tracer(tracer)
+
+    def get_source(self, id):
+        """URL of the db the row comes from."""
+        return unicode(self.sources[id % self.size])
+
+    def select_from(self, id, where, variables=(), cols=None):
+        """Select the rows of the db of id, with the ids remapped."""
+        index, _id = self.decode(id)
+        stmt = 'select %s from db%s.jsondata where %s' % (cols or self.columns(index), index, where)
+        return self.select(stmt, (_id,) + tuple(variables))
+
+    def get_root_type(self):
+        return self.get_row_type(self.roots[0])
+
+    def get_link_key(self):
+        c = self.cursor or self.get_cursor()
+        c.execute('select value from db0.settings where key = ?', ('link_key',))
+        rslt = c.fetchone()
+        return rslt['value'] if rslt else None
+
+    def get_row(self, rowid):
+        rows = self.select_from(rowid, 'id = ?')
+        return rows[0] if rows else None
+
+    def get_row_type(self, rowid):
+        row = self.get_row(rowid)
+        return row['type'] if row else None
+
+    def get_children_count(self, id):
+        return self.select_from(id, 'parent = ?', cols='count(id) as count')[0]['count']
+
+    def iter_children(self, parent_id, value=None, only_one=False):
+        where = 'parent = ?'
+        variables = ()
+        if value is not None:
+            where += ' and value = ?'
+            variables = (value,)
+        rows = self.select_from(parent_id, where + ' order by id asc', variables)
+        return rows[:1] if only_one else rows
+
+    def iter_slice(self, id, start=None, stop=None, step=None):
+        rowids = [row['id'] for row in self.iter_children(id)]
+        return rowids[slice(start, stop, step)]
+
+    def get_nth_child(self, parent_id, offset):
+        rowid = self.iter_slice(parent_id)[offset]
+        return Result.from_row(self.get_row(rowid))
+
+    def find_key(self, key, parent_id):
+        rows = self.iter_children(parent_id, value=key)
+        if not rows or rows[0]['type'] != KEY:
+            return None, None
+        key_id = rows[0]['id']
+        children = self.iter_children(key_id, only_one=True)
+        return key_id, children[0]['id'] if children else None
+
+    def iter_dict(self, parent_id):
+        for row_key in self.iter_children(parent_id):
+            if row_key['type'] != KEY:
+                continue
+            for row in self.iter_children(row_key['id'], only_one=True):
+                yield row_key['value'], Result.from_row(row)
+
+    def jsonpath(self, ast, parent=None, one=False, timeout=None, **kws):
+        """
+        Evaluate the JSONPath from the roots of all the dbs, or the rows of parent,
+        in each db in turn. The timeout is for all the dbs together.
+        """
+        if parent is None:
+            parent = self.roots
+        parents = list(parent) if isinstance(parent, (list, tuple)) else [parent]
+        deadline = time.time() + timeout if timeout is not None else None
+        return self._jsonpath(ast, parents, one, deadline, kws)
+
+    def _jsonpath(self, ast, parents, one, deadline, kws):
+        for index, db in enumerate(self.dbs):
+            ids = [self.decode(id)[1] for id in parents if id % self.size == index]
+            if not ids:
+                continue
+            if deadline is not None:
+                kws['timeout'] = max(deadline - time.time(), 0)
+            for row in db.jsonpath(ast, parent=ids, one=one, **kws):
+                yield Result(self.encode(index, row.id), row.type, row.link)
+                if one:
+                    return
+
+    def commit(self):
+        pass
+
+    def close(self):
+        for db in self.dbs:
+            db.close()
+        if self.cursor:
+            self.cursor.close()
+        if self.conn:
+            self.conn.close()
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.backends.hooks
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Callbacks around the calls of backend methods.
+
+        def after(call):
+            histogram[call.name].append(call.elapsed)
+
+        hook = backend.add_hook(after=after, methods=['jsonpath', 'get_row'])
+        ...
+        backend.remove_hook(hook)
+
+    The methods are wrapped on the backend instance only while hooks are
+    registered, so a backend without hooks runs its methods untouched.
+
+"""
+
+import sys
+import types
+import timeit
+
+
+timer = timeit.default_timer
+
+# The interface methods hooks can be attached to.
+HOOKABLE = (
+    'insert_root',
+    'insert',
+    'batch_insert',
+    'insert_rows',
+    'replace_rows',
+    'delete_rows',
+    'set_row',
+    'set_value',
+    'increase_value',
+    'update_values',
+    'increase_values',
+    'apply_value',
+    'set_rows',
+    'update_link',
+    'copy_trees',
+    'set_parent',
+    'renumber',
+    'remove',
+    'remove_trees',
+    'jsonpath',
+    'get_row',
+    'get_rows',
+    'get_row_type',
+    'get_nth_child',
+    'get_children_count',
+    'iter_children',
+    'iter_slice',
+    'iter_dict',
+    'get_members',
+    'iter_members',
+    'select_tree',
+    'tree_ids',
+    'digests',
+    'find_key',
+    'top_ids',
+    'iter_changes',
+    'snapshot',
+    'trim_changes',
+    'commit',
+    'rollback',
+    'savepoint',
+    'release_savepoint',
+)
+
+
+class Hook(object):
+    def __init__(self, before=None, after=None, methods=None):
+        """
+        :param before: Called with a `Call` before the method runs.
+
+        :param after: Called with the `Call` after the method returns or raises.
+                      For a method returning a generator, after the generator
+                      is exhausted or closed.
+
+        :param methods: Names of the methods to hook, all of HOOKABLE if None.
+        """
+        if methods is not None:
+            unknown = set(methods) - set(HOOKABLE)
+            if unknown:
+                raise ValueError('Not hookable: %s' % ', '.join(sorted(unknown)))
+        self.before = before
+        self.after = after
+        self.methods = frozenset(methods if methods is not None else HOOKABLE)
+
+
+class Call(object):
+    """
+    A call of a hooked method.
+
+    name, args, kws: The method and its arguments.
+    result: What it returned. The number of items for a generator.
+    error: The exception it raised, if any.
+    elapsed: Seconds spent in the method. For a generator, in producing the items.
+    data: A dict for the hooks to keep their own state between before and after.
+    """
+
+    def __init__(self, name, args, kws):
+        self.name = name
+        self.args = args
+        self.kws = kws
+        self.result = None
+        self.error = None
+        self.elapsed = 0.0
+        self.data = {}
+
+
+def install(backend, hooks):
+    """Wrap the methods of backend which any of hooks is attached to, and unwrap the others."""
+    cls = type(backend)
+    for name in HOOKABLE:
+        if not hasattr(cls, name):
+            continue
+        attached = [hook for hook in hooks if name in hook.methods]
+        if attached:
+            setattr(backend, name, wrap(getattr(cls, name).__get__(backend, cls), name, attached))
+        elif name in backend.__dict__:
+            delattr(backend, name)
+
+
+def wrap(method, name, hooks):
+    befores = [hook.before for hook in hooks if hook.before]
+    afters = [hook.after for hook in hooks if hook.after]
+
+    def wrapper(*args, **kws):
+        call = Call(name, args, kws)
+        for before in befores:
+            before(call)
+        start = timer()
+        try:
+            call.result = method(*args, **kws)
+        except Exception as e:
+            exc_info = sys.exc_info()
+            call.error = e
+            call.elapsed = timer() - start
+            for after in afters:
+                after(call)
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+        if isinstance(call.result, types.GeneratorType):
+            return iterate(call, call.result, timer() - start, afters)
+
+        call.elapsed = timer() - start
+        for after in afters:
+            after(call)
+        return call.result
+
+    wrapper.__name__ = name
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+def iterate(call, seq, elapsed, afters):
+    count = 0
+    try:
+        while True:
+            start = timer()
+            try:
+                item = next(seq)
+            except StopIteration:
+                break
+            except Exception as e:
+                call.error = e
+                raise
+            finally:
+                elapsed += timer() - start
+            count += 1
+            yield item
+    finally:
+        call.result = count
+        call.elapsed = elapsed
+        for after in afters:
+            after(call)
@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.backends.sharded
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    One logical db spread over several sqlite3 files.
+
+        sharded:///path/to/filename.db?shards=4&range=1000
+
+    The shards are stored as filename.db.0 ... filename.db.3.
+    Every shard has its own copy of the root. The children of the root are
+    partitioned: the keys of a dict root by a hash of the key, the elements
+    of a list root by ranges of *range* consecutive elements.
+    A subtree always lives in the same shard as its parent.
+
+    The ids are unique over all the shards and increase in insertion order:
+    id = sequence * shards + shard index. So the shard of a row is id % shards,
+    and the rows of all the shards can be merged in document order by id.
+
+    Transactions are per shard: commit() is not atomic over the shards.
+
+"""
+
+import heapq
+import threading
+import zlib
+
+from jsondb.backends.base import BackendBase
+from jsondb.backends.sqlite3_backend import Sqlite3Backend
+from jsondb.backends.url import URL
+from jsondb.datatypes import *
+from jsondb.digest import node_digest
+from jsondb.error import UnsupportedOperation
+
+import logging
+logger = logging.getLogger(__file__)
+
+
+ROOT = -1
+
+
+def merge_rows(row_lists):
+    """Merge the rows of the shards in document order."""
+    return sorted((row for rows in row_lists for row in rows), key=lambda row: row['id'])
+
+
+class ShardedBackend(BackendBase):
+    def __init__(self, url, *args, **kws):
+        self.url = url
+        if kws.get('changelog'):
+            raise UnsupportedOperation('The changes of several shards can not be logged in one sequence')
+        if kws.get('snapshot'):
+            raise UnsupportedOperation('Sharded dbs can not be copied to memory')
+        self.nshards = int(url.query.get('shards', kws.pop('shards', 4)))
+        self.range_size = int(url.query.get('range', kws.pop('range', 1000)))
+        self.tracers = []
+        trace = kws.pop('trace', False)
+        slow_log = kws.pop('slow_log', None)
+
+        # Each shard is only used by one thread at a time,
+        # but queries run on the shards from worker threads.
+        kws['check_same_thread'] = False
+        self.shards = [Sqlite3Backend(URL('sqlite3', database=path), *args, **kws)
+                       for path in self.get_shard_paths()]
+
+        self.hashes = self.shards[0].hashes
+        self.lock = threading.Lock()
+        max_id = self.get_max_id()
+        self.sequence = max_id // self.nshards + 1 if max_id >= 0 else 0
+        self.root_count = self.get_children_count(ROOT)
+
+        super(ShardedBackend, self).__init__(*args, trace=trace, slow_log=slow_log, **kws)
+
+    def get_shard_paths(self):
+        return ['%s.%s' % (self.url.database, i) for i in range(self.nshards)]
+
+    def get_path(self):
+        return self.url.database
+
+    def get_url(self):
+        return unicode(self.url)
+
+    def get_shard(self, id):
+        return self.shards[id % self.nshards]
+
+    def next_id(self, shard_index):
+        with self.lock:
+            id = self.sequence * self.nshards + shard_index
+            self.sequence += 1
+        return id
+
+    def route(self, parent, _type, value):
+        """Index of the shard where a new row goes."""
+        if parent != ROOT:
+            return parent % self.nshards
+        if _type == KEY:
+            if isinstance(value, unicode):
+                value = value.encode('utf-8')
+            return (zlib.crc32(str(value)) & 0xffffffff) % self.nshards
+        index = self.root_count
+        self.root_count += 1
+        return (index // self.range_size) % self.nshards
+
+    def each(self, method, *args, **kws):
+        return [getattr(shard, method)(*args, **kws) for shard in self.shards]
+
+    def add_tracer(self, tracer):
+        super(ShardedBackend, self).add_tracer(tracer)
+        self.each('add_tracer', tracer)
+
+    def remove_tracer(self, tracer):
+        super(ShardedBackend, self).remove_tracer(tracer)
+        self.each('remove_tracer', tracer)
+
+    def commit(self):
+        self.each('commit')
+
+    def rollback(self):
+        self.each('rollback')
+
+    def savepoint(self):
+        self.each('savepoint')
+
+    def release_savepoint(self, rollback=False):
+        self.each('release_savepoint', rollback=rollback)
+
+    def close(self):
+        self.each('close')
+
+    def insert_root(self, *args, **kws):
+        self.each('insert_root', *args, **kws)
+
+    def insert(self, (parent, _type, value)):
+        index = self.route(parent, _type, value)
+        id = self.next_id(index)
+        self.shards[index].insert_rows([(id, parent, _type, value, None)])
+        return id
+
+    def batch_insert(self, pending_list=[]):
+        rows = [[] for shard in self.shards]
+        for parent, _type, value in pending_list:
+            index = self.route(parent, _type, value)
+            rows[index].append((self.next_id(index), parent, _type, value, None))
+        for shard, shard_rows in zip(self.shards, rows):
+            if shard_rows:
+                shard.insert_rows(shard_rows)
+
+    def set_row(self, id, *args):
+        if id == ROOT:
+            self.each('set_row', id, *args)
+        else:
+            self.get_shard(id).set_row(id, *args)
+
+    def set_value(self, id, value):
+        if id == ROOT:
+            self.each('set_value', id, value)
+        else:
+            self.get_shard(id).set_value(id, value)
+
+    def increase_value(self, id, increase_by=0):
+        self.get_shard(id).increase_value(id, increase_by)
+
+    def apply_value(self, id, op, operand):
+        if id == ROOT:
+            return self.each('apply_value', id, op, operand)[0]
+        return self.get_shard(id).apply_value(id, op, operand)
+
+    def update_link(self, rowid, link=None):
+        if rowid == ROOT:
+            self.each('update_link', rowid, link)
+        else:
+            self.get_shard(rowid).update_link(rowid, link)
+
+    def set_link_key(self, key):
+        self.each('set_link_key', key)
+
+    def get_link_key(self):
+        return self.shards[0].get_link_key()
+
+    def get_root_type(self):
+        return self.shards[0].get_root_type()
+
+    def get_row(self, rowid):
+        if rowid == ROOT:
+            return self.shards[0].get_row(rowid)
+        return self.get_shard(rowid).get_row(rowid)
+
+    def get_row_type(self, rowid):
+        if rowid == ROOT:
+            return self.shards[0].get_row_type(rowid)
+        return self.get_shard(rowid).get_row_type(rowid)
+
+    def get_max_id(self):
+        return max([ROOT] + [id for id in self.each('get_max_id') if id is not None])
+
+    def get_children_count(self, id):
+        if id == ROOT:
+            return sum(self.each('get_children_count', id))
+        return self.get_shard(id).get_children_count(id)
+
+    def find_key(self, key, parent_id):
+        if parent_id == ROOT:
+            return self.shards[self.route(ROOT, KEY, key)].find_key(key, parent_id)
+        return self.get_shard(parent_id).find_key(key, parent_id)
+
+    def iter_children(self, parent_id, value=None, only_one=False):
+        if parent_id != ROOT:
+            return self.get_shard(parent_id).iter_children(parent_id, value=value, only_one=only_one)
+        rows = merge_rows(shard.iter_children(parent_id, value=value) for shard in self.shards)
+        return rows[:1] if only_one else rows
+
+    def iter_slice(self, id, start=None, stop=None, step=None):
+        if id != ROOT:
+            return self.get_shard(id).iter_slice(id, start, stop, step)
+        rowids = sorted(sum((list(shard.iter_slice(id)) for shard in self.shards), []))
+        return rowids[slice(start, stop, step)]
+
+    def get_nth_child(self, parent_id, offset):
+        if parent_id != ROOT:
+            return self.get_shard(parent_id).get_nth_child(parent_id, offset)
+        rowid = self.iter_slice(parent_id)[offset]
+        return Result.from_row(self.get_row(rowid))
+
+    def get_members(self, parent_id):
+        if parent_id != ROOT:
+            return self.get_shard(parent_id).get_members(parent_id)
+        return sum(self.each('get_members', parent_id), [])
+
+    def iter_members(self, parent_id, type, sort_keys=False):
+        if parent_id != ROOT:
+            return self.get_shard(parent_id).iter_members(parent_id, type, sort_keys)
+        order = 'key' if sort_keys and type == DICT else 'id'
+        streams = [((row[order], row) for row in shard.iter_members(parent_id, type, sort_keys)) for shard in self.shards]
+        return (row for order, row in heapq.merge(*streams))
+
+    def iter_dict(self, parent_id):
+        if parent_id != ROOT:
+            return self.get_shard(parent_id).iter_dict(parent_id)
+        return (item for shard in self.shards for item in shard.iter_dict(parent_id))
+
+    def remove(self, id, recursive=True, include_self=False):
+        if id == ROOT:
+            self.each('remove', id, recursive=recursive, include_self=include_self)
+            self.root_count = 0
+            return
+        self.get_shard(id).remove(id, recursive=recursive, include_self=include_self)
+        if include_self and self.get_row_type(ROOT) == LIST:
+            self.root_count = self.get_children_count(ROOT)
+
+    def remove_trees(self, ids):
+        ids = set(ids)
+        if ROOT in ids:
+            count = sum(self.each('remove_trees', [ROOT]))
+            self.root_count = 0
+            return count
+        count = sum(shard.remove_trees(group) for shard, group in self.group(ids))
+        if self.get_row_type(ROOT) == LIST:
+            self.root_count = self.get_children_count(ROOT)
+        return count
+
+    def group(self, ids):
+        """Pairs of (shard, the ids in it), for the shards with any of ids. The root is in all of them."""
+        groups = [[] for shard in self.shards]
+        for id in ids:
+            if id == ROOT:
+                for group in groups:
+                    group.append(id)
+            else:
+                groups[id % self.nshards].append(id)
+        return [(shard, group) for shard, group in zip(self.shards, groups) if group]
+
+    def get_rows(self, ids):
+        rows = merge_rows(shard.get_rows(group) for shard, group in self.group(ids))
+        return [row for i, row in enumerate(rows) if row['id'] != ROOT or i == 0]
+
+    def update_values(self, ids, type, value):
+        return sum(shard.update_values(group, type, value) for shard, group in self.group(ids))
+
+    def increase_values(self, ids, increase_by):
+        return sum(shard.increase_values(group, increase_by) for shard, group in self.group(ids))
+
+    def set_rows(self, rows):
+        rows = list(rows)
+        for shard, group in self.group(row[0] for row in rows):
+            group = set(group)
+            shard.set_rows(row for row in rows if row[0] in group)
+
+    def select_tree(self, id):
+        if id == ROOT:
+            return [self.get_row(ROOT)] + merge_rows(shard.select_tree(id)[1:] for shard in self.shards)
+        return self.get_shard(id).select_tree(id)
+
+    def digests(self, ids):
+        ids = set(ids)
+        children = []
+        if ROOT in ids:
+            # The members of the root are spread over the shards.
+            children = self.iter_slice(ROOT)
+        digests = {}
+        for shard, group in self.group(ids.difference([ROOT]).union(children)):
+            digests.update(shard.digests(group))
+        if ROOT in ids:
+            root = self.get_row(ROOT)
+            digests[ROOT] = node_digest(root['type'], root['value'], [digests[id] for id in children])
+        return dict((id, digests[id]) for id in ids)
+
+    def top_ids(self, ids):
+        ids = set(ids)
+        top = set()
+        for id in ids:
+            parent = self.get_row(id)['parent']
+            while parent not in ids and parent > ROOT:
+                parent = self.get_row(parent)['parent']
+            if parent not in ids:
+                top.add(id)
+        return top
+
+    def copy_tree(self, id, parent, index, rows=None):
+        """
+        Copy the subtree of id under parent into the shard index, with new ids.
+        Returns the new ids of the rows of the subtree, as a dict.
+        """
+        rows = rows or self.get_shard(id).select_tree(id)
+        new_ids = dict((r['id'], self.next_id(index)) for r in rows)
+        for r in rows:
+            if r['id'] == id:
+                new_ids[r['parent']] = parent
+        self.shards[index].insert_rows([(new_ids[r['id']], new_ids[r['parent']], r['type'], r['value'], r['link'])
+                                        for r in rows])
+        return new_ids
+
+    def copy_trees(self, ids, parent):
+        ids = sorted(set(ids))
+        trees = dict((id, self.get_shard(id).select_tree(id)) for id in ids)
+        # The ids below another one are copied with it only.
+        below = set(r['id'] for id in ids for r in trees[id] if r['id'] != id)
+        new_ids = {}
+        for id in ids:
+            if id in below:
+                continue
+            if parent == ROOT:
+                row = self.get_row(id)
+                index = self.route(ROOT, row['type'], row['value'])
+            else:
+                index = parent % self.nshards
+            new_ids.update(self.copy_tree(id, parent, index, trees[id]))
+        if parent == ROOT and self.get_row_type(ROOT) == LIST:
+            self.root_count = self.get_children_count(ROOT)
+        return [new_ids[id] for id in ids]
+
+    def set_parent(self, id, parent):
+        row = self.get_row(id)
+        if parent == ROOT:
+            index = self.route(ROOT, row['type'], row['value'])
+        else:
+            index = parent % self.nshards
+        source = self.get_shard(id)
+        if index == id % self.nshards:
+            new_id = source.set_parent(id, parent)
+        else:
+            # A subtree lives in the shard of its parent: copy its rows there under new ids.
+            new_id = self.copy_tree(id, parent, index)[id]
+            source.remove(id, include_self=True)
+        if ROOT in (parent, row['parent']) and self.get_row_type(ROOT) == LIST:
+            self.root_count = self.get_children_count(ROOT)
+        return new_id
+
+    def renumber(self, ids):
+        trees = {}
+        for shard, group in self.group(ids):
+            trees.update(zip(group, shard.tree_ids(group)))
+        new_ids = []
+        pairs = [[] for shard in self.shards]
+        for id in ids:
+            index = id % self.nshards
+            # The subtree is in the shard of its root.
+            tree_pairs = [(self.next_id(index), tree_id) for tree_id in trees[id]]
+            new_ids.append(tree_pairs[0][0])
+            pairs[index] += tree_pairs
+        for shard, shard_pairs in zip(self.shards, pairs):
+            if shard_pairs:
+                shard.change_ids(shard_pairs)
+        return new_ids
+
+    def jsonpath(self, ast, parent=ROOT, one=False, **kws):
+        if parent != ROOT:
+            return self.get_shard(parent).jsonpath(ast, parent=parent, one=one, **kws)
+
+        # Fan out to all the shards in parallel, then merge by id.
+        results = [None] * self.nshards
+        errors = []
+
+        def run(index):
+            try:
+                results[index] = list(self.shards[index].jsonpath(ast, parent=parent, one=one, **kws))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(self.nshards)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+        rows = heapq.merge(*results)
+        if one:
+            rows = list(rows)[:1]
+        return iter(rows)
+
+    def explain(self, stmt, variables=()):
+        # All the shards have the same schema.
+        return self.shards[0].explain(stmt, variables)
+
+    def dumprows(self):
+        fmt = '{0:>12} {1:>12} {2:12} {3:12}'
+        yield fmt.format('id', 'parent', 'type', 'value')
+        rows = merge_rows(shard.conn.execute('select * from jsondata where id != ?', (ROOT,))
+                          for shard in self.shards)
+        for row in [self.get_row(ROOT)] + rows:
+            yield fmt.format(row['id'], row['parent'], DATA_TYPE_NAME[row['type']], 'LINK: %s' % row['link'] if row['link'] else row['value'])
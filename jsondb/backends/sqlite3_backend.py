@@ -11,34 +11,354 @@
 import os
 import re
 import sqlite3
+import threading
+import time
+import urllib
 
 from jsondb.backends.base import BackendBase
+from jsondb.backends.writer import GroupCommitWriter
+from jsondb import tracing
+from jsondb.tracing import TracingConnection
 from jsondb.datatypes import *
+from jsondb.digest import tree_digests
+from jsondb.error import CancelledError, TimeoutError, UnsupportedOperation
+from jsondb.util import IS_WINDOWS
 
 import logging
 logger = logging.getLogger(__file__)
 
 SQL_INSERT_ROOT     = "insert into jsondata values(-1, -2, ?, ?, null)"
 SQL_INSERT          = "insert into jsondata values(null, ?, ?, ?, null)"
+SQL_INSERT_ROWS     = "insert into jsondata (id, parent, type, value, link) values(?, ?, ?, ?, ?)"
 SQL_UPDATE_LINK     = "update jsondata set link = ? where id = ?"
 SQL_UPDATE_VALUE    = "update jsondata set value = ? where id = ?"
 SQL_SELECT_CHILDREN = "select id, type, value, link from jsondata where parent = ? order by id asc"
 SQL_SELECT          = "select * from jsondata where id = ?"
 
+# The ids of whole subtrees, from a select of the ids of their roots.
+# The recursive CTE is always used in a subquery, so that the statements start
+# with DELETE, INSERT or SELECT: the sqlite3 module of Python 2 commits before
+# any other kind of statement.
+SQL_TREE = """with recursive tree(id) as (
+        %s
+        union all
+        select j.id from jsondata j join tree on j.parent = tree.id)
+    select id from tree"""
+
+# Delete whole subtrees in one statement.
+SQL_DELETE_TREES = "delete from jsondata where id in (%s)" % SQL_TREE
+
+# The rows of a subtree in document order, from the id of its root.
+SQL_SELECT_TREE = "select * from jsondata where id in (%s) order by id" % (SQL_TREE % 'select ?')
+
+# The ids of the rows of the subtrees of ids, with the id of their root.
+SQL_SELECT_TREE_ROOTS = """select id, root from (
+        with recursive tree(id, root) as (
+            select id, id from jsondata where id in (%s)
+            union all
+            select j.id, tree.root from jsondata j join tree on j.parent = tree.id)
+        select id, root from tree)"""
+
+# The ids among ids which are not below another one of them.
+SQL_SELECT_TOP = """select id from jsondata where id in (%(ids)s) and id not in (
+        with recursive up(id, origin) as (
+            select parent, id from jsondata where id in (%(ids)s)
+            union
+            select j.parent, up.origin from jsondata j join up on j.id = up.id)
+        select origin from up where id in (%(ids)s))"""
+
+# Copy whole subtrees in one statement, adding an offset to the ids.
+# The roots get the new parent, the other rows the copy of their parent.
+SQL_COPY_TREES = """insert into jsondata (id, parent, type, value, link)
+    select id + :offset, case when id in (%%s) then :parent else parent + :offset end, type, value, link
+    from jsondata where id in (%s)""" % SQL_TREE
+
+# The hashes of the lists, dicts and keys, see `jsondb.digest`.
+# A change of a row drops its hash and, through jsonhash_propagate,
+# the hashes of all its ancestors. It stops at the first one without a hash,
+# as a node is only hashed after all its descendants.
+SQL_CREATE_HASHES = (
+    "create table if not exists jsonhash (id integer primary key, parent integer, digest text)",
+    """create trigger if not exists jsonhash_insert after insert on jsondata
+    begin delete from jsonhash where id = new.parent; end""",
+    """create trigger if not exists jsonhash_update after update on jsondata
+    begin delete from jsonhash where id in (old.id, old.parent, new.parent); end""",
+    """create trigger if not exists jsonhash_delete after delete on jsondata
+    begin delete from jsonhash where id in (old.id, old.parent); end""",
+    """create trigger if not exists jsonhash_propagate after delete on jsonhash
+    begin delete from jsonhash where id = old.parent; end""",
+)
+
+# The change log: a row per row inserted, updated or deleted, in the order of the changes.
+# A row changing its id is logged as the delete of the old id and an update.
+SQL_CREATE_CHANGELOG = (
+    """create table if not exists jsonchanges
+    (seq integer primary key autoincrement, id integer, parent integer, op text, commit_seq integer)""",
+    # The changes not stamped with their commit yet, see `stamp_changes`.
+    "create index if not exists jsonchanges_pending on jsonchanges (seq) where commit_seq is null",
+    """create trigger if not exists jsonchanges_insert after insert on jsondata
+    begin insert into jsonchanges (id, parent, op) values (new.id, new.parent, 'insert'); end""",
+    """create trigger if not exists jsonchanges_update after update on jsondata
+    begin
+        insert into jsonchanges (id, parent, op) select old.id, old.parent, 'delete' where old.id != new.id;
+        insert into jsonchanges (id, parent, op) values (new.id, new.parent, 'update');
+    end""",
+    """create trigger if not exists jsonchanges_delete after delete on jsondata
+    begin insert into jsonchanges (id, parent, op) values (old.id, old.parent, 'delete'); end""",
+)
+
+# Which of the seed ids are any of the targets or below them.
+SQL_SELECT_UNDER = """with recursive up(id, origin) as (
+        select id, id from jsondata where id in (%s)
+        union
+        select j.parent, up.origin from jsondata j join up on j.id = up.id)
+    select distinct origin from up where id in (%s)"""
+
+# The rows needed to hash the nodes of ids: their own rows, and the children of
+# the lists, dicts and keys without a hash, down to the hashed ones.
+SQL_SELECT_UNHASHED = """select j.id, j.parent, j.type, j.value, h.digest
+    from jsondata j left join jsonhash h on h.id = j.id
+    where j.id in (%(ids)s) or j.parent in (
+        with recursive unhashed(id) as (
+            select id from jsondata where id in (%(ids)s) and type in (%(types)s)
+                and id not in (select id from jsonhash)
+            union all
+            select j.id from jsondata j join unhashed on j.parent = unhashed.id
+            where j.type in (%(types)s) and j.id not in (select id from jsonhash))
+        select id from unhashed)
+    order by j.id"""
+
+# The same without the jsonhash table: all the rows of the subtrees.
+SQL_SELECT_HASHED_TREES = """select id, parent, type, value, null as digest
+    from jsondata where id in (%s) order by id""" % SQL_TREE
+
+# The in-place operators run by SQLite, and the types of the rows they apply to.
+INPLACE_OPS = {
+    '+'  : (INT, FLOAT, BOOL),
+    '-'  : (INT, FLOAT, BOOL),
+    '*'  : (INT, FLOAT, BOOL),
+    '||' : (STR, UNICODE),
+}
+
+# UPDATE ... RETURNING, from SQLite 3.35.
+RETURNING_SUPPORTED = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Lines of EXPLAIN QUERY PLAN, "SCAN TABLE x" before SQLite 3.36.
+# A SCAN goes through a whole table or index, a SEARCH uses the index.
+RE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+RE_SUBQUERY = re.compile(r'^(CO-ROUTINE|MATERIALIZE) (?:SUBQUERY )?(\w+)')
+
+# Number of SQLite VM instructions between two calls of the progress handler.
+PROGRESS_STEPS = 1000
+
+# PRAGMAs applied to every connection, regardless of the profile.
+BASE_PRAGMAS = (
+    ('encoding', '"UTF-8"'),
+    ('foreign_keys', 'ON'),
+    ('page_size', 8192),
+    ('automatic_index', 1),
+    ('temp_store', 'MEMORY'),
+)
+
+# Durability / performance profiles.
+#
+# default   -- The historical behaviour. No fsync, rollback journal in memory.
+#              Fast, but a crash or power loss can corrupt the file.
+# bulk_load -- For building a db from scratch. No journal at all, no fsync,
+#              exclusive lock and a large page cache. rollback() is not
+#              reliable; rebuild the file if the load fails.
+# durable   -- WAL journal with a fsync on every commit. Survives crashes and
+#              power loss without losing committed transactions.
+# concurrent -- WAL journal, fsync at checkpoints only, and a busy timeout so
+#              readers in other processes do not block writers.
+#              Crash-safe, but the last commits may be lost on power loss.
+# read_only -- For dbs which are never written. Memory-mapped I/O, a large
+#              cache and query_only so accidental writes fail.
+PROFILES = {
+    'default': (
+        ('synchronous', 'OFF'),
+        ('journal_mode', 'MEMORY'),
+    ),
+    'bulk_load': (
+        ('synchronous', 'OFF'),
+        ('journal_mode', 'OFF'),
+        ('locking_mode', 'EXCLUSIVE'),
+        ('cache_size', -262144),
+    ),
+    'durable': (
+        ('synchronous', 'FULL'),
+        ('journal_mode', 'WAL'),
+        ('busy_timeout', 5000),
+    ),
+    'concurrent': (
+        ('synchronous', 'NORMAL'),
+        ('journal_mode', 'WAL'),
+        ('busy_timeout', 5000),
+        ('cache_size', -65536),
+    ),
+    'read_only': (
+        ('query_only', 1),
+        ('mmap_size', 268435456),
+        ('cache_size', -65536),
+        ('busy_timeout', 5000),
+    ),
+}
+
+
+def get_pragmas(profile=None, pragmas=None):
+    """
+    Return the list of (name, value) PRAGMAs for a connection.
+
+    :param profile: Name of one of the PROFILES. 'default' if not specified.
+
+    :param pragmas: A dict of extra PRAGMAs which override the profile.
+    """
+    profile = profile or 'default'
+    if profile not in PROFILES:
+        raise ValueError('Unknown profile: %s' % profile)
+
+    result = list(BASE_PRAGMAS) + list(PROFILES[profile])
+    if pragmas:
+        result = [(k, v) for k, v in result if k not in pragmas]
+        result += sorted(pragmas.items())
+    return result
+
+
+def uri_supported():
+    """Whether SQLite accepts URI filenames without the *uri* parameter."""
+    if uri_supported.result is None:
+        conn = sqlite3.connect(':memory:')
+        options = [row[0] for row in conn.execute('PRAGMA compile_options')]
+        conn.close()
+        uri_supported.result = 'USE_URI' in options
+    return uri_supported.result
+
+uri_supported.result = None
+
+
+MIN_ROWID = -2 ** 63
+
+
+def attach_path(path):
+    """The name to attach the file path as, read-only if SQLite accepts URIs."""
+    path = os.path.abspath(path)
+    return 'file:%s?mode=ro' % urllib.quote(path) if uri_supported() else path
+
+
+def copy_database(conn, src, dst, step=1000, progress=None):
+    """
+    Copy the tables of the attached db src into the empty db dst of conn,
+    in one transaction, step rows per statement. The triggers are created
+    last so that they do not fire on the rows copied. The read lock on src
+    is held until the end, which blocks its writers unless it is in WAL mode.
+
+    :param progress: Called with the number of pages of dst after each statement.
+
+    Returns a dict of the pages copied, the seconds and the pages_per_sec.
+    """
+    start = time.time()
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        conn.execute('begin')
+        schema = conn.execute("select type, name, sql from %s.sqlite_master"
+                              " where sql is not null and name not like 'sqlite_%%'" % src).fetchall()
+        for _type, name, sql in schema:
+            if _type != 'trigger':
+                conn.execute(re.sub(r'^CREATE (\w+) ', r'CREATE \1 %s.' % dst, sql))
+        for _type, name, sql in schema:
+            if _type != 'table':
+                continue
+            last = MIN_ROWID
+            while True:
+                bounds = conn.execute('select min(rowid), max(rowid) from (select rowid from %s.%s where rowid > ?'
+                                      ' order by rowid limit ?)' % (src, name), (last, step)).fetchone()
+                if bounds[0] is None:
+                    break
+                conn.execute('insert into %s.%s select * from %s.%s where rowid between ? and ?'
+                             % (dst, name, src, name), bounds)
+                last = bounds[1]
+                if progress:
+                    progress(conn.execute('PRAGMA %s.page_count' % dst).fetchone()[0])
+        if conn.execute("select 1 from %s.sqlite_master where name = 'sqlite_sequence'" % src).fetchone():
+            # Still counts the rows deleted, e.g. the changes trimmed.
+            conn.execute('delete from %s.sqlite_sequence' % dst)
+            conn.execute('insert into %s.sqlite_sequence select * from %s.sqlite_sequence' % (dst, src))
+        for _type, name, sql in schema:
+            if _type == 'trigger':
+                conn.execute(re.sub(r'^CREATE (\w+) ', r'CREATE \1 %s.' % dst, sql))
+        conn.execute('commit')
+    except:
+        conn.execute('rollback')
+        raise
+    finally:
+        conn.isolation_level = isolation_level
+
+    pages = conn.execute('PRAGMA %s.page_count' % dst).fetchone()[0]
+    seconds = time.time() - start
+    return {'pages': pages, 'seconds': seconds, 'pages_per_sec': pages / seconds if seconds else None}
+
 
 class Sqlite3Backend(BackendBase):
     def __init__(self, url, *args, **kws):
         self.conn = None
         self.cursor = None
+        self.tracers = []
+        tracing.register(self)
         self.url = url
         self.dbpath = url.database
         self.link_key = kws.get('link_key')
+        self.check_same_thread = kws.get('check_same_thread', True)
+        self.rows_examined = 0
+        # An in-memory copy of the file, see `copy_database`.
+        self.source = self.dbpath if kws.get('snapshot') else None
+        if self.source:
+            self.dbpath = ':memory:'
+        self.snapshot_stats = None
+        self.readonly = kws.get('readonly', False) and not self.source
+        self.immutable = kws.get('immutable', False)
+        self.keep_hashes = kws.get('hashes', False)
+        self.keep_changelog = kws.get('changelog', False)
+        self.watchers = []
+        # The nodes to store the hashes of on commit, see `digests`.
+        self.hash_roots = set()
+        self.watch_seq = 0
+        self.profile = kws.get('profile') or ('read_only' if self.readonly else 'default')
+        self.pragmas = get_pragmas(self.profile, kws.get('pragmas'))
+        if self.readonly:
+            self.pragmas.append(('query_only', 1))
+
+        self.writer = None
+        if kws.get('group_commit'):
+            options = {'profile': self.profile, 'pragmas': kws.get('pragmas'),
+                       'hashes': self.keep_hashes, 'changelog': self.keep_changelog}
+            factory = lambda: Sqlite3Backend(self.url, overwrite=False, **options)
+            self.writer = GroupCommitWriter(factory, batch_size=kws.get('group_commit_size', 1000))
+
+        self.open(overwrite=kws.get('overwrite', False))
+
+        super(Sqlite3Backend, self).__init__(*args, **kws)
 
-        overwrite = kws.get('overwrite', False)
-        if overwrite or not os.path.exists(self.dbpath):
+    def open(self, overwrite=False):
+        if self.source:
+            if not os.path.exists(self.source):
+                raise IOError('No such db: %s' % self.source)
+            self.conn = self.get_connection()
+            self.conn.execute('attach database ? as source', (attach_path(self.source),))
+            try:
+                self.snapshot_stats = copy_database(self.conn, 'source', 'main')
+            finally:
+                self.conn.execute('detach database source')
+            self.detect_tables()
+        elif self.readonly:
+            self.conn = self.get_connection()
+            self.detect_tables()
+        elif overwrite or not os.path.exists(self.dbpath):
             try:
                 conn = self.conn or self.get_connection()
                 conn.execute('drop table jsondata')
+                conn.execute('drop table if exists jsonhash')
+                conn.execute('drop table if exists jsonchanges')
             except sqlite3.OperationalError:
                 pass
 
@@ -46,12 +366,48 @@ class Sqlite3Backend(BackendBase):
 
         else:
             self.conn = self.get_connection()
+            self.detect_tables()
 
-        super(Sqlite3Backend, self).__init__(*args, **kws)
+        if self.keep_hashes and not self.hashes and not self.readonly:
+            self.create_hashes()
+        if self.keep_changelog and not self.changelog and not self.readonly:
+            self.create_changelog()
 
     def get_path(self):
         return os.path.normpath(self.dbpath)
 
+    def snapshot(self, path, step=1000, progress=None):
+        """
+        Copy the committed state of the db to the file path, replaced once complete.
+        The copy reads from its own connection in one transaction, see `copy_database`,
+        so outside WAL mode the writers wait for it. An in-memory db is committed first.
+        """
+        tmp = path + '.tmp'
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        if self.dbpath == ':memory:':
+            conn, src, dst = self.conn or self.get_connection(), 'main', 'snapshot'
+            conn.execute('attach database ? as snapshot', (tmp,))
+        else:
+            conn, src, dst = sqlite3.connect(tmp), 'source', 'main'
+            conn.execute('attach database ? as source', (attach_path(self.dbpath),))
+        try:
+            try:
+                stats = copy_database(conn, src, dst, step=step, progress=progress)
+            finally:
+                if conn is self.conn:
+                    conn.execute('detach database snapshot')
+                else:
+                    conn.close()
+        except:
+            os.remove(tmp)
+            raise
+
+        if IS_WINDOWS and os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp, path)
+        return stats
+
     def get_url(self):
         return unicode(self.url)
 
@@ -79,6 +435,31 @@ class Sqlite3Backend(BackendBase):
         conn.commit()
         self.conn = conn
 
+    def create_hashes(self):
+        """Keep the hashes of the nodes from now on, see `jsondb.digest`."""
+        for sql in SQL_CREATE_HASHES:
+            self.conn.execute(sql)
+        self.conn.commit()
+        self.hashes = True
+        self.conn.execute('PRAGMA recursive_triggers = ON')
+
+    def create_changelog(self):
+        """Log the changes from now on, see `iter_changes`."""
+        for sql in SQL_CREATE_CHANGELOG:
+            self.conn.execute(sql)
+        self.conn.commit()
+        self.changelog = True
+
+    def detect_tables(self):
+        """Find whether the db keeps the hashes and the change log."""
+        c = self.conn.execute("select name from sqlite_master where type = 'table' and name in ('jsonhash', 'jsonchanges')")
+        names = set(row[0] for row in c.fetchall())
+        self.hashes = 'jsonhash' in names
+        self.changelog = 'jsonchanges' in names
+        if self.hashes:
+            # Needed by jsonhash_propagate.
+            self.conn.execute('PRAGMA recursive_triggers = ON')
+
     def get_connection(self, force=False):
         if force or not self.conn:
             try:
@@ -86,21 +467,20 @@ class Sqlite3Backend(BackendBase):
             except:
                 pass
 
-            self.conn = sqlite3.connect(self.dbpath)
+            self.conn = self.connect()
+            self.conn.set_tracers(self.tracers)
             self.conn.row_factory = sqlite3.Row
             self.conn.text_factory = str
-            self.conn.execute('PRAGMA encoding = "UTF-8";')
-            self.conn.execute('PRAGMA foreign_keys = ON;')
-            self.conn.execute('PRAGMA synchronous = OFF;')
-            self.conn.execute('PRAGMA page_size = 8192;')
-            self.conn.execute('PRAGMA automatic_index = 1;')
-            self.conn.execute('PRAGMA temp_store = MEMORY;')
-            self.conn.execute('PRAGMA journal_mode = MEMORY;')
+            for name, value in self.pragmas:
+                self.conn.execute('PRAGMA %s = %s;' % (name, value))
+            if self.hashes:
+                self.conn.execute('PRAGMA recursive_triggers = ON')
 
             def ancestors_in(id, candicates):
                 # FIXME: Find a better way to do this.
                 candicates = eval(candicates)
                 while id > -2:
+                    self.rows_examined += 1
                     if id in candicates:
                         return True
                     row = self.conn.execute('select parent from jsondata where id = ?', (id,)).fetchone()
@@ -111,6 +491,25 @@ class Sqlite3Backend(BackendBase):
 
         return self.conn
 
+    def connect(self):
+        if not self.readonly:
+            return sqlite3.connect(self.dbpath, check_same_thread=self.check_same_thread, factory=TracingConnection)
+
+        # Open through a SQLite URI so that the file is never locked for writing.
+        # With immutable=1 SQLite does not even take read locks,
+        # which is only safe when nobody writes the file.
+        uri = 'file:%s?mode=ro%s' % (urllib.quote(os.path.abspath(self.dbpath)),
+                                     '&immutable=1' if self.immutable else '')
+        try:
+            return sqlite3.connect(uri, uri=True, check_same_thread=self.check_same_thread, factory=TracingConnection)
+        except TypeError:
+            # No uri parameter before Python 3.4
+            pass
+        if uri_supported():
+            return sqlite3.connect(uri, check_same_thread=self.check_same_thread, factory=TracingConnection)
+        # query_only still rejects the writes.
+        return sqlite3.connect(self.dbpath, check_same_thread=self.check_same_thread, factory=TracingConnection)
+
     def get_cursor(self):
         if not self.cursor or not self.conn:
             conn = self.conn or self.get_connection()
@@ -122,28 +521,89 @@ class Sqlite3Backend(BackendBase):
         return self.cursor
 
     def commit(self):
+        if self.readonly:
+            return
+        if self.writer:
+            # Only the writer thread writes.
+            if self.hash_roots:
+                roots, self.hash_roots = self.hash_roots, set()
+                self.writer.submit(lambda backend: backend.digests(roots, store=True))
+            self.writer.flush()
+        else:
+            self.prepare_commit()
         self.conn.commit()
+        if self.watchers:
+            self.notify()
 
     def rollback(self):
         self.conn.rollback()
 
+    def savepoint(self):
+        """
+        Start a savepoint, so that `release_savepoint(rollback=True)` undoes the
+        writes made since, and only them. The sqlite3 module of Python 2 commits
+        before a SAVEPOINT, so the writes not committed yet are committed first.
+        """
+        conn = self.conn or self.get_connection()
+        self.savepoint_level = conn.isolation_level
+        if self.savepoint_level is not None:
+            self.commit()
+            # The transaction is managed here until the savepoint is released.
+            conn.isolation_level = None
+            conn.execute('begin %s' % self.savepoint_level)
+        conn.execute('savepoint jsondb_savepoint')
+
+    def release_savepoint(self, rollback=False):
+        """End the savepoint, undoing its writes if rollback. The transaction goes on."""
+        try:
+            if rollback:
+                self.conn.execute('rollback to jsondb_savepoint')
+            self.conn.execute('release jsondb_savepoint')
+        finally:
+            if self.savepoint_level is not None:
+                self.conn.isolation_level = self.savepoint_level
+
     def close(self):
+        if self.writer:
+            self.writer.stop()
+        if self.conn and not self.readonly:
+            self.prepare_commit()
         if self.cursor:
             self.cursor.close()
         if self.conn:
-            self.conn.commit()
+            if not self.readonly:
+                self.conn.commit()
             self.conn.close()
 
+    def add_tracer(self, tracer):
+        super(Sqlite3Backend, self).add_tracer(tracer)
+        self.update_tracing()
+
+    def remove_tracer(self, tracer):
+        super(Sqlite3Backend, self).remove_tracer(tracer)
+        self.update_tracing()
+
+    def update_tracing(self):
+        if self.conn:
+            self.conn.set_tracers(self.tracers)
+        # Get a new cursor of the right kind next time.
+        self.cursor = None
+
+    def submit(self, func, *args, **kws):
+        if self.writer:
+            return self.writer.submit(func, *args, **kws)
+        return super(Sqlite3Backend, self).submit(func, *args, **kws)
+
     def update_settings(self, key, value):
         conn = self.conn or self.get_connection()
-        conn.execute('update settings set value = ? where key = ?', (key, value))
+        conn.execute('insert or replace into settings(key, value) values(?, ?)', (key, value))
         conn.commit()
 
     def get_settings(self, key):
         c = self.cursor or self.get_cursor()
         c.execute('select value from settings where key = ?', (key,))
         rslt = c.fetchone()
-        return rslt['value']
+        return rslt['value'] if rslt else None
 
     def get_root_type(self):
         c = self.cursor or self.get_cursor()
@@ -196,15 +656,306 @@ class Sqlite3Backend(BackendBase):
             value_id = row['id']
             yield key, Result.from_row(row)
 
+    def get_members(self, parent_id):
+        """The members of a dict in one statement, as rows of key_id, key and the id, type, value, link of the value."""
+        return self.select('select k.id as key_id, k.value as key, v.id as id, v.type as type, v.value as value, v.link as link'
+                           ' from jsondata k join jsondata v on v.parent = k.id'
+                           ' where k.parent = ? and k.type = ? order by k.id', (parent_id, KEY))
+
+    def iter_members(self, parent_id, type, sort_keys=False):
+        """
+        Stream the elements of a list, or the members of a dict, sorted by key if sort_keys,
+        as rows of key, id, type, value and the kept hash, null if there is none.
+        Read on a cursor of their own, so that several can be iterated together.
+        """
+        columns = 'v.id as id, v.type as type, v.value as value, %s as digest' % ('h.digest' if self.hashes else 'null')
+        join = ' left join jsonhash h on h.id = v.id' if self.hashes else ''
+        if type == DICT:
+            sql = ('select k.value as key, %s from jsondata k join jsondata v on v.parent = k.id%s'
+                   ' where k.parent = ? and k.type = %d order by %s' % (columns, join, KEY, 'k.value' if sort_keys else 'k.id'))
+        else:
+            sql = 'select null as key, %s from jsondata v%s where v.parent = ? order by v.id' % (columns, join)
+        c = (self.conn or self.get_connection()).cursor()
+        try:
+            c.execute(sql, (parent_id,))
+            while True:
+                rows = c.fetchmany(100)
+                if not rows:
+                    break
+                self.rows_examined += len(rows)
+                for row in rows:
+                    yield row
+        finally:
+            c.close()
+
     def remove(self, id, recursive=True, include_self=False):
         c = self.cursor or self.get_cursor()
         if recursive:
-            c.execute('delete from jsondata where ancestors_in(parent, ?)', (repr((id,)),))
+            c.execute(SQL_DELETE_TREES % 'select id from jsondata where parent = ?', (id,))
         else:
             c.execute('delete from jsondata where parent = ?', (id,))
         if include_self:
             c.execute('delete from jsondata where id = ?', (id,))
 
+    def remove_trees(self, ids):
+        """
+        Delete the rows of ids with all their descendants, in one statement.
+        The key of a dict member is deleted with its value.
+        The root is never deleted, only its children.
+        Returns the number of rows deleted.
+        """
+        ids = set(ids)
+        if -1 in ids:
+            ids.discard(-1)
+            ids.update(row['id'] for row in self.select('select id from jsondata where parent = -1'))
+        if not ids:
+            return 0
+        keys = self.select('select k.id from jsondata j join jsondata k on k.id = j.parent'
+                           ' where j.id in (%s) and k.type = %s' % (id_list(ids), KEY))
+        ids.update(row['id'] for row in keys)
+
+        c = self.cursor or self.get_cursor()
+        c.execute(SQL_DELETE_TREES % ('select id from jsondata where id in (%s)' % id_list(ids)))
+        return c.rowcount
+
+    def get_rows(self, ids):
+        """The rows of ids, in one statement."""
+        ids = list(ids)
+        if not ids:
+            return []
+        return self.select('select * from jsondata where id in (%s) order by id' % id_list(ids))
+
+    def update_values(self, ids, type, value):
+        """
+        Set the type and value of the rows of ids in one statement.
+        The descendants of the rows are deleted.
+        Returns the number of rows updated.
+        """
+        ids = list(ids)
+        if not ids:
+            return 0
+        c = self.cursor or self.get_cursor()
+        c.execute(SQL_DELETE_TREES % ('select id from jsondata where parent in (%s)' % id_list(ids)))
+        c.execute('update jsondata set type = ?, value = ? where id in (%s)' % id_list(ids), (type, value))
+        return c.rowcount
+
+    def increase_values(self, ids, increase_by):
+        """
+        Add increase_by to the numbers among the rows of ids, in one statement.
+        The other rows are left alone. Returns the number of rows updated.
+        """
+        ids = list(ids)
+        if not ids:
+            return 0
+        # An int plus a float is a float.
+        retype = ', type = %s' % FLOAT if isinstance(increase_by, float) else ''
+        c = self.cursor or self.get_cursor()
+        c.execute('update jsondata set value = value + ?%s where id in (%s) and type in (%s, %s)'
+                  % (retype, id_list(ids), INT, FLOAT), (increase_by,))
+        return c.rowcount
+
+    def set_rows(self, rows):
+        """
+        Set the type and value of each (id, type, value) of rows.
+        The descendants of the rows are deleted.
+        """
+        rows = list(rows)
+        if not rows:
+            return
+        c = self.cursor or self.get_cursor()
+        c.execute(SQL_DELETE_TREES % ('select id from jsondata where parent in (%s)' % id_list(row[0] for row in rows)))
+        c.executemany('update jsondata set type = ?, value = ? where id = ?',
+                      [(type, value, id) for id, type, value in rows])
+
+    def select_tree(self, id):
+        """The rows of id and all its descendants, in document order."""
+        return self.select(SQL_SELECT_TREE, (id,))
+
+    def digests(self, ids, store=False):
+        """
+        The hashes of the nodes of ids, as a dict, see `jsondb.digest`.
+        With the jsonhash table, only the nodes without a hash are read.
+        Reading does not write: the new hashes are stored with store=True,
+        which `prepare_commit` does for the nodes read since the last commit.
+        The ids of the nodes gone are left out.
+        """
+        ids = list(set(ids))
+        if not ids:
+            return {}
+        if self.hashes:
+            rows = self.select(SQL_SELECT_UNHASHED % {'ids': id_list(ids), 'types': id_list((LIST, DICT, KEY))})
+        else:
+            rows = self.select(SQL_SELECT_HASHED_TREES % ('select id from jsondata where id in (%s)' % id_list(ids)))
+        digests, computed = tree_digests(rows, ids)
+        if computed and self.hashes and not self.readonly:
+            if store:
+                c = self.cursor or self.get_cursor()
+                c.executemany('insert into jsonhash (id, parent, digest) values (?, ?, ?)', computed)
+            else:
+                self.hash_roots.update(ids)
+        return dict((id, digests[id]) for id in ids if id in digests)
+
+    def get_change_seq(self):
+        """The sequence number of the last change logged, 0 if none. Still counts the changes trimmed."""
+        c = self.cursor or self.get_cursor()
+        c.execute("select seq from sqlite_sequence where name = 'jsonchanges'")
+        row = c.fetchone()
+        return row[0] if row else 0
+
+    def iter_changes(self, since=0):
+        """Stream the changes logged after the sequence number since, as dicts of seq, id, parent, op and commit_seq."""
+        c = (self.conn or self.get_connection()).cursor()
+        try:
+            c.execute('select seq, id, parent, op, commit_seq from jsonchanges where seq > ? order by seq', (since,))
+            while True:
+                rows = c.fetchmany(100)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(zip(row.keys(), row))
+        finally:
+            c.close()
+
+    def prepare_commit(self):
+        """
+        Write what is written on commit into the transaction about to be committed:
+        the hashes of the nodes read since the last commit, and the commit_seq of the changes.
+        """
+        if self.hash_roots:
+            roots, self.hash_roots = self.hash_roots, set()
+            self.digests(roots, store=True)
+        if self.changelog:
+            self.stamp_changes()
+
+    def stamp_changes(self):
+        """
+        Give the changes of the transaction the sequence number of its last change,
+        as commit_seq, just before it is committed. The changes committed by others
+        than jsondb get the commit_seq of the next commit through jsondb.
+        """
+        conn = self.conn or self.get_connection()
+        conn.execute('update jsonchanges set commit_seq = (select max(seq) from jsonchanges) where commit_seq is null')
+
+    def trim_changes(self, until):
+        """Forget the changes up to the sequence number until."""
+        c = self.cursor or self.get_cursor()
+        c.execute('delete from jsonchanges where seq <= ?', (until,))
+
+    def ids_under(self, ids, targets):
+        """The ids among ids which are any of targets or below them, in one statement."""
+        ids, targets = set(ids), set(targets)
+        if not ids or not targets:
+            return set()
+        return set(row[0] for row in self.select(SQL_SELECT_UNDER % (id_list(ids), id_list(targets))))
+
+    def watch(self, ast, callback, parent=-1):
+        """
+        Call callback with the changes under the nodes matching the path ast
+        after every commit with any of them. Needs the change log.
+        Returns a handle for `unwatch`.
+        """
+        if not self.changelog:
+            raise UnsupportedOperation('Open the db with changelog=True to watch it')
+        if not self.watchers:
+            self.watch_seq = self.get_change_seq()
+        # Resolved now, so that the nodes deleted before the next commit are still known.
+        watcher = {'ast': ast, 'callback': callback, 'parent': parent,
+                   'targets': set(row.id for row in self.jsonpath(ast=ast, parent=parent))}
+        self.watchers.append(watcher)
+        return watcher
+
+    def unwatch(self, watcher):
+        self.watchers = [other for other in self.watchers if other is not watcher]
+
+    def notify(self):
+        """Call the watchers of the changes committed since the last time."""
+        changes = list(self.iter_changes(self.watch_seq))
+        if not changes:
+            return
+        self.watch_seq = changes[-1]['seq']
+        deleted = dict((change['id'], change['parent']) for change in changes if change['op'] == 'delete')
+        for watcher in list(self.watchers):
+            # The nodes matching before the commit, and the ones matching now.
+            targets = watcher['targets']
+            watcher['targets'] = set(row.id for row in self.jsonpath(ast=watcher['ast'], parent=watcher['parent']))
+            targets |= watcher['targets']
+
+            # A row deleted is under whatever its closest remaining ancestor is under.
+            nodes = []
+            for change in changes:
+                node = change['id']
+                while node in deleted and node not in targets:
+                    node = deleted[node]
+                nodes.append(node)
+            under = targets.intersection(nodes) | self.ids_under(nodes, targets)
+            matched = [dict(change) for change, node in zip(changes, nodes) if node in under]
+            if matched:
+                watcher['callback'](matched)
+
+    def top_ids(self, ids):
+        """The ids among ids which are not below another one of them, in one statement."""
+        ids = set(ids)
+        if len(ids) < 2:
+            return ids
+        return set(row[0] for row in self.select(SQL_SELECT_TOP % {'ids': id_list(ids)}))
+
+    def copy_trees(self, ids, parent):
+        """
+        Copy the rows of ids with all their descendants under parent, in one statement.
+        The copies get new ids after all the others, in the order of ids.
+        The ids below another one of ids are copied with it only, and stay below its copy.
+        Returns the new ids of ids.
+        """
+        ids = sorted(set(ids))
+        if not ids:
+            return []
+        roots = SQL_SELECT_TOP % {'ids': id_list(ids)}
+        tree = SQL_TREE % roots
+        c = self.cursor or self.get_cursor()
+        c.execute('select (select max(id) from jsondata) as last, min(id) as first from jsondata where id in (%s)' % tree)
+        row = c.fetchone()
+        offset = row['last'] + 1 - row['first']
+        c.execute(SQL_COPY_TREES % (roots, roots),
+                  {'offset': offset, 'parent': parent})
+        return [id + offset for id in ids]
+
+    def set_parent(self, id, parent):
+        """Move the row id with its descendants under parent. Returns the id of the moved row."""
+        c = self.cursor or self.get_cursor()
+        c.execute('update jsondata set parent = ? where id = ?', (parent, id))
+        return id
+
+    def tree_ids(self, ids):
+        """The ids of the rows of the subtrees of ids in document order, a list per id of ids."""
+        trees = dict((id, []) for id in ids)
+        if trees:
+            for id, root in sorted(self.select(SQL_SELECT_TREE_ROOTS % id_list(trees))):
+                trees[root].append(id)
+        return [trees[id] for id in ids]
+
+    def renumber(self, ids):
+        """
+        Give the rows of ids new ids after all the others, in the order of ids,
+        so that they come last among their siblings. Their descendants follow
+        them, so that the document order stays the order of the ids.
+        One statement reads the subtrees, then each of their rows is updated.
+        Returns the new ids.
+        """
+        start = self.get_max_id() + 1
+        pairs = []
+        new_ids = []
+        for tree in self.tree_ids(ids):
+            new_ids.append(start + len(pairs))
+            pairs += [(start + len(pairs) + i, id) for i, id in enumerate(tree)]
+        self.change_ids(pairs)
+        return new_ids
+
+    def change_ids(self, pairs):
+        """Change the ids of rows, given as (new id, id) pairs. Their children follow them."""
+        c = self.cursor or self.get_cursor()
+        c.executemany('update jsondata set id = ? where id = ?', pairs)
+        c.executemany('update jsondata set parent = ? where parent = ?', pairs)
+
     def set_link_key(self, key):
         self.update_settings('link_key', key)
 
@@ -213,15 +964,13 @@ class Sqlite3Backend(BackendBase):
 
     def insert_root(self, (root_type, value)):
         c = self.cursor or self.get_cursor()
-        conn = self.conn or self.get_connection()
         c.execute(SQL_INSERT_ROOT, (root_type, value))
-        conn.commit()
+        self.commit()
 
     def set_row(self, id, type, value):
         c = self.cursor or self.get_cursor()
-        conn = self.conn or self.get_connection()
         c.execute('update jsondata set type = ?, value = ? where id = ?', (type, value, id))
-        conn.commit()
+        self.commit()
 
     def insert(self, *args, **kws):
         c = self.cursor or self.get_cursor()
@@ -232,6 +981,28 @@ class Sqlite3Backend(BackendBase):
         c = self.cursor or self.get_cursor()
         c.executemany(SQL_INSERT, pending_list)
 
+    def insert_rows(self, rows):
+        """Insert (id, parent, type, value, link) rows with their ids given."""
+        c = self.cursor or self.get_cursor()
+        c.executemany(SQL_INSERT_ROWS, rows)
+
+    def replace_rows(self, rows):
+        """Insert (id, parent, type, value, link) rows, replacing the rows of the same ids."""
+        c = self.cursor or self.get_cursor()
+        c.executemany('insert or replace into jsondata (id, parent, type, value, link) values(?, ?, ?, ?, ?)', rows)
+
+    def delete_rows(self, ids):
+        """Delete the rows of ids only, not their descendants."""
+        ids = list(ids)
+        if ids:
+            c = self.cursor or self.get_cursor()
+            c.execute('delete from jsondata where id in (%s)' % id_list(ids))
+
+    def get_max_id(self):
+        c = self.cursor or self.get_cursor()
+        c.execute('select max(id) as max_id from jsondata')
+        return c.fetchone()['max_id']
+
     def iter_children(self, parent_id, value=None, only_one=False):
         c = self.cursor or self.get_cursor()
         sql = SQL_SELECT_CHILDREN
@@ -290,14 +1061,114 @@ class Sqlite3Backend(BackendBase):
         c = self.cursor or self.get_cursor()
         c.execute("update jsondata set value = value + ? where id = ?", (increase_by, id))
 
+    def apply_value(self, id, op, operand):
+        """
+        Set the value of a row to `value op operand` in one statement,
+        so that concurrent writers do not lose updates. See INPLACE_OPS.
+        Returns the updated row (type, value), or None if op does not apply to the row.
+        """
+        types = INPLACE_OPS[op]
+        if op == '||':
+            new_type = UNICODE if isinstance(operand, unicode) else 'type'
+            variables = (operand, id)
+        else:
+            new_type = "case typeof(value %s ?) when 'real' then %s else %s end" % (op, FLOAT, INT)
+            variables = (operand, operand, id)
+        sql = 'update jsondata set value = value %s ?, type = %s where id = ? and type in (%s)' % (
+            op, new_type, ','.join(str(t) for t in types))
+
+        c = self.cursor or self.get_cursor()
+        if RETURNING_SUPPORTED:
+            c.execute(sql + ' returning type, value', variables)
+            return c.fetchone()
+        # The row stays locked by the update until the commit.
+        c.execute(sql, variables)
+        if c.rowcount < 1:
+            return None
+        c.execute('select type, value from jsondata where id = ?', (id,))
+        return c.fetchone()
+
     def select(self, stmt, variables=()):
         c = self.cursor or self.get_cursor()
         c.execute(stmt, variables)
         result = c.fetchall()
+        self.rows_examined += len(result)
         return result
 
-    def jsonpath(self, ast, parent=-1, one=False):
-        parent_ids = [parent]
+    def explain(self, stmt, variables=()):
+        """
+        Return a dict of
+          plan: The lines of the EXPLAIN QUERY PLAN of the statement.
+          full_scan: The tables scanned through, instead of searched by an index.
+          temp_btree: Whether a temporary b-tree is built for sorting or distinct.
+        """
+        conn = self.conn or self.get_connection()
+        plan = [row[3] for row in conn.execute('explain query plan %s' % stmt, variables)]
+
+        # Subqueries are scanned too, but they are explained by their own lines.
+        subqueries = set(m.group(2) for m in (RE_SUBQUERY.match(line) for line in plan) if m)
+        subqueries.update(('CONSTANT', 'SUBQUERY'))
+        scans = [m.group(1) for m in (RE_SCAN.match(line) for line in plan) if m]
+        return {
+            'plan': plan,
+            'full_scan': [name for name in scans if name not in subqueries],
+            'temp_btree': any('TEMP B-TREE' in line for line in plan),
+        }
+
+    def jsonpath(self, ast, parent=-1, one=False, timeout=None, cancel=None, progress=None):
+        """
+        Evaluate the parsed JSONPath and yield the matched rows.
+
+        :param timeout: Seconds from now after which the query is aborted with `TimeoutError`.
+
+        :param cancel: A `CancelToken`. The query is aborted with `CancelledError` once it is cancelled.
+
+        :param progress: Called as progress(steps, rows) while the query runs,
+                         with the number of SQLite VM steps and rows examined so far.
+        """
+        seq = self._jsonpath(ast, parent, one)
+        if timeout is None and cancel is None and progress is None:
+            return seq
+        deadline = time.time() + timeout if timeout is not None else None
+        return self._guard(seq, deadline, cancel, progress)
+
+    def _guard(self, seq, deadline, cancel, progress):
+        """Run seq with a progress handler which aborts it on timeout or cancellation."""
+        state = {'steps': 0, 'rows': self.rows_examined}
+
+        def check():
+            if cancel is not None and cancel.cancelled:
+                raise CancelledError
+            if deadline is not None and time.time() > deadline:
+                raise TimeoutError
+
+        def handler():
+            state['steps'] += PROGRESS_STEPS
+            if progress is not None:
+                progress(state['steps'], self.rows_examined - state['rows'])
+            if cancel is not None and cancel.cancelled:
+                return 1
+            if deadline is not None and time.time() > deadline:
+                return 1
+            return 0
+
+        conn = self.conn or self.get_connection()
+        while True:
+            check()
+            conn.set_progress_handler(handler, PROGRESS_STEPS)
+            try:
+                row = next(seq)
+            except StopIteration:
+                break
+            except sqlite3.OperationalError:
+                check()
+                raise
+            finally:
+                conn.set_progress_handler(None, PROGRESS_STEPS)
+            yield row
+
+    def _jsonpath(self, ast, parent=-1, one=False):
+        parent_ids = list(parent) if isinstance(parent, (list, tuple)) else [parent]
         parent_types = [self.get_row_type(id) for id in parent_ids]
         funcs = {
             'predicate' : self.parse_predicate,
@@ -410,7 +1281,7 @@ class Sqlite3Backend(BackendBase):
         # when DICT, applies to itself
 
         result = rowids
-        parse_atom.children = {}
+        PARSE_STATE.children = {}
         expr = _filter['expr']
         _type, condition = parse_expr(expr)
         if _type == 'child':
@@ -418,7 +1289,7 @@ class Sqlite3Backend(BackendBase):
 
         stmt = ''
         tables = {}
-        for key, childnodes in parse_atom.children.items():
+        for key, childnodes in PARSE_STATE.children.items():
             # TODO: Check the child exists and passes the condition
             condition = re.sub(key, '%s.type >= 0 and %s.value' % (key, key), condition)
             subquery = ''
@@ -475,6 +1346,11 @@ class Sqlite3Backend(BackendBase):
         return result
 
 
+def id_list(ids):
+    """Format ids to be inlined in an IN clause."""
+    return ','.join(str(int(id)) for id in ids)
+
+
 def parse_atom(atom):
     _type = atom.get('type')
     _value = atom.get('value')
@@ -483,8 +1359,8 @@ def parse_atom(atom):
     elif _type == 'boolean':
         return _type, _value == 'True' and 1 or 0
     elif _type == 'child':
-        key = '__t%s__' % len(parse_atom.children)
-        parse_atom.children[key] = _value
+        key = '__t%s__' % len(PARSE_STATE.children)
+        PARSE_STATE.children[key] = _value
         return _type, key
 
     elif _type == 'func':
@@ -495,7 +1371,8 @@ def parse_atom(atom):
     else:
         raise 'impossible'
 
-parse_atom.children = {}
+# Child paths found while parsing a predicate, per thread.
+PARSE_STATE = threading.local()
 
 
 def parse_expr(expr):
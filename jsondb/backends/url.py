@@ -1,6 +1,7 @@
 # coding: utf8
 
-from urlparse import urlparse, urlunsplit
+import urllib
+from urlparse import urlparse, urlunsplit, parse_qsl
 from jsondb.util import IS_WINDOWS
 
 
@@ -10,13 +11,14 @@ class Error(Exception):
 
 class URL(object):
     def __init__(self, driver, username=None, password=None,
-                 host=None, port=None, database=None):
+                 host=None, port=None, database=None, query=None):
         self.driver = driver
         self.username = username
         self.password = password
         self.host = host
         self.port = int(port) if port else None
         self.database = database
+        self.query = query or {}
 
     def __unicode__(self):
         auth = '%s%s%s' % (self.username or '', ':' if (self.username or self.password) else '', self.password or '')
@@ -24,7 +26,8 @@ class URL(object):
         netloc = '%s%s%s' % (auth, '@' if auth else '', host)
         database = ('/' if (self.driver == 'sqlite3' and IS_WINDOWS and not self.database.startswith('/')) else '') + self.database
         database = '%s%s' % ('' if netloc else '//', database)
-        parts = (self.driver, netloc, database, '', '')
+        query = urllib.urlencode(sorted(self.query.items()))
+        parts = (self.driver, netloc, database, query, '')
         return urlunsplit(parts)
 
     def __str__(self):
@@ -40,5 +43,6 @@ class URL(object):
         if IS_WINDOWS and database.startswith('/'):
             database = database[1:]
         self = cls(driver=url.scheme, username=url.username, password=url.password,
-                   host=url.hostname, port=url.port, database=database)
+                   host=url.hostname, port=url.port, database=database,
+                   query=dict(parse_qsl(url.query)))
         return self
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.backends.writer
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Group commit for concurrent writers.
+
+    Write operations from many callers are put into a queue.
+    A single thread applies them in batches, each batch in one transaction,
+    and resolves the futures of the callers once the batch is committed.
+
+"""
+
+import threading
+import sqlite3
+import Queue
+
+from jsondb.util import Future
+
+import logging
+logger = logging.getLogger(__file__)
+
+
+STOP = object()
+
+
+class GroupCommitWriter(object):
+    def __init__(self, factory, batch_size=1000):
+        """
+        :param factory: Called in the writer thread to create the backend the
+                        operations are applied to.
+
+        :param batch_size: Max number of operations committed together.
+        """
+        self.factory = factory
+        self.batch_size = batch_size
+        self.queue = Queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='jsondb-writer')
+                self.thread.daemon = True
+                self.thread.start()
+
+    def submit(self, func, *args, **kws):
+        """
+        Schedule func(backend, *args, **kws) and return a `Future`,
+        which is resolved after the transaction containing it is committed.
+        """
+        self.start()
+        future = Future()
+        self.queue.put((func, args, kws, future))
+        return future
+
+    def flush(self):
+        """Block until every operation submitted so far is committed."""
+        if self.thread is not None:
+            self.submit(lambda backend: None).result()
+
+    def stop(self):
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            self.queue.put(STOP)
+            thread.join()
+
+    def run(self):
+        try:
+            backend = self.factory()
+            # Transactions are managed here, not by the sqlite3 module.
+            backend.conn.isolation_level = None
+            try:
+                self.loop(backend)
+            finally:
+                backend.close()
+        finally:
+            # So that a writer which died is started again by the next submit.
+            with self.lock:
+                if self.thread is threading.current_thread():
+                    self.thread = None
+
+    def loop(self, backend):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size and batch[-1] is not STOP:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except Queue.Empty:
+                    break
+            stop = batch[-1] is STOP
+            if stop:
+                batch.pop()
+            if batch:
+                self.apply(backend, batch)
+            if stop:
+                break
+
+    def apply(self, backend, batch):
+        conn = backend.conn
+        results = []
+        try:
+            conn.execute('begin')
+            for func, args, kws, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                # A failing operation must not take down the rest of the batch.
+                conn.execute('savepoint jsondb_op')
+                try:
+                    result = func(backend, *args, **kws)
+                except Exception as e:
+                    results.append((future, None, e))
+                    try:
+                        conn.execute('rollback to jsondb_op')
+                    except sqlite3.OperationalError:
+                        # The error rolled back the whole transaction, e.g. SQLITE_FULL,
+                        # and the operations before it with it.
+                        raise e
+                    conn.execute('release jsondb_op')
+                else:
+                    conn.execute('release jsondb_op')
+                    results.append((future, result, None))
+            backend.prepare_commit()
+            conn.execute('commit')
+        except Exception as e:
+            logger.exception('group commit failed')
+            try:
+                conn.execute('rollback')
+            except Exception:
+                pass
+            for future, result, exception in results:
+                future.set_exception(exception or e)
+            # The operations not run yet fail too.
+            for func, args, kws, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, result, exception in results:
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.compare
+    ~~~~~~~~~~~~~~
+
+    The differences between two nodes, as a JSON Patch (RFC 6902).
+
+        for op in jsondb.diff('yesterday.db', 'today.db'):
+            print op['op'], op['path']
+
+    The members of the dicts are read sorted by key, and the elements of
+    the lists in order, from a cursor per container on each side, so only
+    the containers being compared are held at a time. The lists and dicts
+    whose kept hashes are equal are skipped, see `jsondb.digest`.
+
+"""
+
+from itertools import izip_longest
+
+from jsondb.datatypes import *
+from jsondb.digest import scalar_digest
+
+
+def escape(token):
+    """A reference token of a JSON Pointer."""
+    if isinstance(token, str):
+        token = token.decode('utf-8')
+    return token.replace('~', '~0').replace('/', '~1')
+
+
+def same(row_a, row_b):
+    """Whether two rows are known to be equal: equal scalars, or equal hashes."""
+    if row_a['type'] in (LIST, DICT) or row_b['type'] in (LIST, DICT):
+        return row_a['digest'] is not None and row_a['digest'] == row_b['digest']
+    return scalar_digest(row_a['type'], row_a['value']) == scalar_digest(row_b['type'], row_b['value'])
+
+
+def diff(a, b):
+    """Generate the operations turning the node a into the node b."""
+    for op in changes(a, b, a.backend.get_row(a.root), b.backend.get_row(b.root), u''):
+        yield op
+
+
+def changes(a, b, row_a, row_b, pointer):
+    """The operations turning row_a of a into row_b of b."""
+    if row_a['type'] == row_b['type'] == DICT:
+        members_a = a.backend.iter_members(row_a['id'], DICT, sort_keys=True)
+        members_b = b.backend.iter_members(row_b['id'], DICT, sort_keys=True)
+        member_a, member_b = next(members_a, None), next(members_b, None)
+        while member_a is not None or member_b is not None:
+            if member_b is None or (member_a is not None and member_a['key'] < member_b['key']):
+                yield {'op': 'remove', 'path': pointer + '/' + escape(member_a['key'])}
+                member_a = next(members_a, None)
+            elif member_a is None or member_b['key'] < member_a['key']:
+                yield {'op': 'add', 'path': pointer + '/' + escape(member_b['key']), 'value': b.build_node(member_b)}
+                member_b = next(members_b, None)
+            else:
+                if not same(member_a, member_b):
+                    for op in changes(a, b, member_a, member_b, pointer + '/' + escape(member_b['key'])):
+                        yield op
+                member_a, member_b = next(members_a, None), next(members_b, None)
+
+    elif row_a['type'] == row_b['type'] == LIST:
+        end = None
+        elements = izip_longest(a.backend.iter_members(row_a['id'], LIST), b.backend.iter_members(row_b['id'], LIST))
+        for index, (element_a, element_b) in enumerate(elements):
+            if element_a is None:
+                yield {'op': 'add', 'path': pointer + '/-', 'value': b.build_node(element_b)}
+            elif element_b is None:
+                # The extra elements are removed one after another from the end of b.
+                end = index if end is None else end
+                yield {'op': 'remove', 'path': u'%s/%d' % (pointer, end)}
+            elif not same(element_a, element_b):
+                for op in changes(a, b, element_a, element_b, u'%s/%d' % (pointer, index)):
+                    yield op
+
+    elif row_a['type'] in (LIST, DICT) or row_b['type'] in (LIST, DICT) or not same(row_a, row_b):
+        yield {'op': 'replace', 'path': pointer, 'value': b.build_node(row_b)}
@@ -12,6 +12,7 @@ import os
 import tempfile
 import re
 import weakref
+import contextlib
 
 import logging
 logger = logging.getLogger(__file__)
@@ -26,12 +27,31 @@ import backends
 import jsonquery
 
 from error import *
+from tracing import Tracer, operation, normalize
+from slowlog import timed
+from patch import Patcher, Merger, relocate
+import compare
+
+
+def log_slow_call(record):
+    """The default sink of `SlowLog`."""
+    lines = ['slow %(operation)s: %(time).3fs, path=%(path)s, parent=%(parent)s, rows=%(rows)s, %(statements)s statements' % record]
+    lines += ['    %s' % sql for sql in record['sql']]
+    if record['statements'] > len(record['sql']):
+        lines.append('    ...')
+    if record['suppressed']:
+        lines.append('(%s slow calls not reported before this one)' % record['suppressed'])
+    logger.warning('\n'.join(lines))
 
 
 class Nothing:
     pass
 
 
+# The operands of the in-place arithmetic done in the db.
+NUMBER_TYPES = (int, long, float)
+
+
 def get_type_class(datatype):
     if datatype == DICT:
         cls = DictQueryable
@@ -49,11 +69,52 @@ def get_type_class(datatype):
     return cls
 
 
+def feed_rows(backend, link_key, root, data, parent):
+    """Feed data into backend. Used as a write operation of `backend.submit`."""
+    node = Queryable(backend, link_key=link_key, root=root)
+    id_list, pending_list = node._feed(data, parent)
+    backend.batch_insert(pending_list)
+    return id_list
+
+
+def patch_nodes(backend, link_key, root, ops):
+    """Apply a JSON Patch. Used as a write operation of `backend.submit`."""
+    node = Queryable(backend, link_key=link_key, root=root)
+    Patcher(node).apply(ops)
+
+
+def merge_nodes(backend, link_key, root, data):
+    """Apply a JSON Merge Patch. Used as a write operation of `backend.submit`."""
+    node = Queryable(backend, link_key=link_key, root=root)
+    return Merger(node).apply(data)
+
+
+def update_nodes(backend, link_key, ids, value=Nothing, incr=None, func=None):
+    """Update the nodes of ids. Used as a write operation of `backend.submit`."""
+    node = Queryable(backend, link_key=link_key)
+    return node._update_nodes(ids, value, incr, func)
+
+
+def call_node(backend, link_key, root, datatype, name, *args):
+    """Call the method name of the node root. Used as a write operation of `backend.submit`."""
+    data = backend.get_row(root)['value'] if datatype in (LIST, DICT) else Nothing()
+    node = get_type_class(datatype)(backend, link_key=link_key, root=root, datatype=datatype, data=data)
+    return getattr(node, name)(*args)
+
+
+def relocate_nodes(backend, ids, parent, key=None, copy=False):
+    """Move or copy the nodes of ids into parent. Used as a write operation of `backend.submit`."""
+    row = backend.get_row(parent)
+    return [relocate(backend, id, row, key, copy=copy) for id in ids]
+
+
 class QueryResult(object):
     def __init__(self, seq, queryset):
         self.seq = seq
         self.queryset = weakref.proxy(queryset)
+        self.backend = queryset.backend
 
+    @operation('query', call=False)
     def getone(self):
         try:
             row = next(self.seq)
@@ -61,13 +122,16 @@ class QueryResult(object):
         except StopIteration:
             return None
 
+    @operation('query', call=False)
     def itervalues(self):
         for row in self.seq:
             yield self.queryset._make(row.id, row.type).data()
 
+    @operation('query', call=False)
     def values(self):
         return list(self.itervalues())
 
+    @operation('query', call=False)
     def __iter__(self):
         for row in self.seq:
             yield self.queryset._make(row.id, row.type)
@@ -101,6 +165,8 @@ class Queryable(object):
         if isinstance(other, Queryable):
             if other.datatype != self.datatype:
                 return -1
+            if self.backend.hashes and other.backend.hashes and self.digest() == other.digest():
+                return 0
             other_data = other.data()
         else:
             other_data = other
@@ -126,6 +192,7 @@ class Queryable(object):
         result = cls(backend=self.backend, link_key=self.backend.get_link_key(), root=id, datatype=type, data=data)
         return result
 
+    @operation()
     def __getitem__(self, key):
         """
         Same with query, but mainly for direct access.
@@ -160,6 +227,8 @@ class Queryable(object):
 
         f.close()
 
+    @operation()
+    @timed('feed')
     def feed(self, data, parent=None):
         """Append data to the specified parent.
 
@@ -171,11 +240,22 @@ class Queryable(object):
         """
         if parent is None:
             parent = self.root
+        if self.backend.writer:
+            return self.feed_async(data, parent).result()
         # TODO: should be in a transaction
         id_list, pending_list = self._feed(data, parent)
         self.backend.batch_insert(pending_list)
         return id_list
 
+    def feed_async(self, data, parent=None):
+        """Same with feed, but returns a `Future` of the list of ids.
+
+        With group commit enabled, the future is resolved once the data is committed.
+        """
+        if parent is None:
+            parent = self.root
+        return self.backend.submit(feed_rows, self.link_key, self.root, data, parent)
+
     def _feed(self, data, parent_id, real_parent_id=None):
         parent = self.backend.get_row(parent_id)
         parent_type = parent['type']
@@ -215,7 +295,15 @@ class Queryable(object):
             #       now we always assume it's appending
             hash_id = self.backend.insert((parent_id, _type, 0,))
             id_list.append(hash_id)
+            scalars_pending = False
             for x in data:
+                if TYPE_MAP.get(type(x)) not in (LIST, DICT):
+                    scalars_pending = True
+                elif scalars_pending:
+                    # Containers are inserted at once: insert the elements before them first.
+                    self.backend.batch_insert(pending_list)
+                    pending_list = []
+                    scalars_pending = False
                 _ids, _pendings = self._feed(x, hash_id)
                 id_list += _ids
                 pending_list += _pendings
@@ -224,9 +312,16 @@ class Queryable(object):
 
         return id_list, pending_list
 
-    def query(self, path, parent=None, one=False):
+    @operation()
+    def query(self, path, parent=None, one=False, timeout=None, cancel=None, progress=None):
         """
         Query the data.
+
+        :param timeout: Seconds after which the query is aborted with `TimeoutError`.
+
+        :param cancel: A `CancelToken` to abort the query with `CancelledError`.
+
+        :param progress: Called as progress(steps, rows) while the query runs.
         """
         if parent is None:
             parent = self.root
@@ -237,11 +332,305 @@ class Queryable(object):
         else:
             ast = jsonquery.parse(path)
             self.query_path_cache[path] = json.dumps(ast)
-        rslt = self.backend.jsonpath(ast=ast, parent=parent, one=one)
+        rslt = self.backend.jsonpath(ast=ast, parent=parent, one=one,
+                                     timeout=timeout, cancel=cancel, progress=progress)
+        slowlog = self.backend.slowlog
+        if slowlog is not None and slowlog.current is None:
+            rslt = slowlog.watch(slowlog.start('query', path=path, parent=parent), rslt)
         return QueryResult(rslt, self)
 
     xpath = query
 
+    @operation()
+    def delete(self, path, parent=None):
+        """
+        Delete the nodes matching the path, with all their descendants.
+
+        The matches are removed in one statement: dict members with their keys,
+        list elements from their lists. Matching the root clears it.
+        Returns the number of nodes matched.
+        """
+        if parent is None:
+            parent = self.root
+        ast = jsonquery.parse(path)
+        ids = [row.id for row in self.backend.jsonpath(ast=ast, parent=parent)]
+        if ids:
+            if self.backend.writer:
+                self.backend.submit(lambda backend: backend.remove_trees(ids)).result()
+            else:
+                self.backend.remove_trees(ids)
+        return len(ids)
+
+    @operation()
+    def update(self, path, set=Nothing, incr=None, func=None, parent=None):
+        """
+        Update the nodes matching the path. Give one of:
+
+        :param set: The new value of every node.
+
+        :param incr: A number added to every number node. The other nodes are left alone.
+
+        :param func: Called with the data of each node, returns its new value.
+
+        Assigning a scalar and adding a number take one statement for all the nodes.
+        The values from func are written in one batch. With set and func, a node
+        below another matching one is replaced with it, and not updated on its own.
+        Returns the number of nodes updated.
+        """
+        if [set is not Nothing, incr is not None, func is not None].count(True) != 1:
+            raise ValueError('Give exactly one of set, incr and func.')
+        if set is not Nothing and type(set) not in TYPE_MAP:
+            raise UnsupportedTypeError(type(set))
+        if incr is not None and type(incr) not in (int, long, float):
+            raise UnsupportedTypeError(type(incr))
+
+        if parent is None:
+            parent = self.root
+        ast = jsonquery.parse(path)
+        ids = [row.id for row in self.backend.jsonpath(ast=ast, parent=parent)]
+        if not ids:
+            return 0
+        if self.backend.writer:
+            return self.backend.submit(update_nodes, self.link_key, ids, set, incr, func).result()
+        return self._update_nodes(ids, set, incr, func)
+
+    def _update_nodes(self, ids, value, incr, func):
+        if incr is not None:
+            return self.backend.increase_values(ids, incr)
+
+        if func is None and TYPE_MAP[type(value)] not in (LIST, DICT):
+            # The nodes inside another one are deleted before the update, and not counted.
+            return self.backend.update_values(ids, TYPE_MAP[type(value)], value)
+
+        # The nodes inside another one are gone once it is written.
+        if len(ids) > 1:
+            top = self.backend.top_ids(ids)
+            ids = [id for id in ids if id in top]
+
+        if func is None:
+            self.backend.update_values(ids, TYPE_MAP[type(value)], 0)
+            for id in ids:
+                self._fill(id, value)
+            return len(ids)
+
+        values = [(row['id'], func(self.build_node(row))) for row in self.backend.get_rows(ids)]
+        rows = []
+        for id, data in values:
+            _type = TYPE_MAP.get(type(data))
+            if _type is None:
+                raise UnsupportedTypeError(type(data))
+            rows.append((id, _type, 0 if _type in (LIST, DICT) else data))
+        self.backend.set_rows(rows)
+        for id, data in values:
+            if isinstance(data, (list, tuple, dict)):
+                self._fill(id, data)
+        return len(values)
+
+    def _fill(self, id, data):
+        """Feed the items of a list or dict as the children of the container row id."""
+        pending_list = []
+        for item in (data if isinstance(data, (list, tuple)) else [data]):
+            pending_list += self._feed(item, id)[1]
+        self.backend.batch_insert(pending_list)
+
+    @operation()
+    def patch(self, ops):
+        """
+        Apply a JSON Patch (RFC 6902), a list of operations or its json text.
+        The JSON Pointers are relative to this node.
+
+        Raises `PatchError` for an invalid operation or path, and `PatchTestFailed`
+        for a failed test. The patch runs in a savepoint, rolled back on failure,
+        so that it is either applied entirely or not at all. The writes made before
+        and not committed yet are committed first, see `backend.savepoint`.
+        """
+        if isinstance(ops, basestring):
+            ops = json.loads(ops)
+        if self.backend.writer:
+            # Run in a savepoint of its own by the writer.
+            return self.backend.submit(patch_nodes, self.link_key, self.root, ops).result()
+        self.backend.savepoint()
+        try:
+            patch_nodes(self.backend, self.link_key, self.root, ops)
+        except Exception:
+            self.backend.release_savepoint(rollback=True)
+            raise
+        self.backend.release_savepoint()
+
+    @operation()
+    def merge(self, data):
+        """
+        Apply a JSON Merge Patch (RFC 7386) to this node: the members of data
+        are merged into the dicts recursively, a null member removes the key,
+        and any other value replaces the stored one.
+
+        The data is compared with what is stored and only the differences are
+        written, so feeding a fresh copy of the whole document is cheap.
+        Returns the number of values added, changed or removed.
+        """
+        if self.backend.writer:
+            return self.backend.submit(merge_nodes, self.link_key, self.root, data).result()
+        return merge_nodes(self.backend, self.link_key, self.root, data)
+
+    @operation()
+    def copy(self, path, dest, key=None, parent=None):
+        """
+        Copy the nodes matching path into the list or dict matching dest.
+
+        :param key: The key of the copy in a dict. By default a dict member
+                    keeps its own key, and a list element can not be copied into a dict.
+
+        The copies are appended to a list. An existing member of the same key is replaced,
+        but two of the nodes with the same key raise `UnsupportedOperation`.
+        A node inside another one matching is only copied with it.
+        The rows are copied by SQLite, one statement per node, with new ids.
+        Returns the number of nodes copied.
+        """
+        return self._relocate(path, dest, key, parent, copy=True)
+
+    @operation()
+    def move(self, path, dest, key=None, parent=None):
+        """
+        Move the nodes matching path into the list or dict matching dest,
+        like `copy`. The nodes are re-parented, their descendants are left untouched.
+        Returns the number of nodes moved.
+        """
+        return self._relocate(path, dest, key, parent, copy=False)
+
+    def _relocate(self, path, dest, key, parent, copy):
+        if parent is None:
+            parent = self.root
+        ids = [row.id for row in self.backend.jsonpath(ast=jsonquery.parse(path), parent=parent)]
+        targets = list(self.backend.jsonpath(ast=jsonquery.parse(dest), parent=parent))
+        if len(targets) != 1:
+            raise UnsupportedOperation('%s matches %s nodes, not one' % (dest, len(targets)))
+        target = targets[0]
+        if target.type not in (LIST, DICT):
+            raise IllegalTypeError('%s is not a list or dict' % dest)
+        if key is not None and len(ids) > 1:
+            raise UnsupportedOperation('%s matches %s nodes, which can not have the same key' % (path, len(ids)))
+        if len(ids) > 1:
+            # The nodes inside another one go with it.
+            top = self.backend.top_ids(ids)
+            ids = [id for id in ids if id in top]
+        if target.type == DICT and key is None and len(ids) > 1:
+            # The members keep their keys, and would replace each other.
+            parents = [row['parent'] for row in self.backend.get_rows(ids)]
+            keys = [row['value'] for row in self.backend.get_rows(parents) if row['type'] == KEY]
+            if len(set(keys)) < len(keys):
+                raise UnsupportedOperation('%s matches several members of the same key' % path)
+        if not copy:
+            # The target must not be inside any of the nodes moved.
+            ancestors = set()
+            id = target.id
+            while id != -2:
+                ancestors.add(id)
+                id = self.backend.get_row(id)['parent']
+            if ancestors.intersection(ids):
+                raise UnsupportedOperation('Can not move a node into itself')
+        if not ids:
+            return 0
+        if self.backend.writer:
+            return len(self.backend.submit(relocate_nodes, ids, target.id, key, copy).result())
+        return len(relocate_nodes(self.backend, ids, target.id, key, copy))
+
+    @operation()
+    def digest(self):
+        """
+        A hash of the data of this node, e.g. for an ETag: equal for equal data,
+        and different as soon as anything in it changes. See `jsondb.digest`.
+
+        With hashes=True the hashes are kept in the db, stored on the next
+        commit, and only the nodes changed since are read. Otherwise the whole
+        subtree is. Reading a hash never writes.
+        """
+        return self.backend.digests([self.root])[self.root]
+
+    @operation()
+    def diff(self, other):
+        """
+        Generate the JSON Patch operations turning this node into the node other,
+        possibly of another db. See `jsondb.compare`.
+        When both dbs keep hashes, they are brought up to date first,
+        and only the members with different hashes are compared further.
+        """
+        if self.backend.hashes and other.backend.hashes and self.digest() == other.digest():
+            return
+        for op in compare.diff(self, other):
+            yield op
+
+    @operation()
+    def changes(self, since=0):
+        """
+        Generate the changes logged after the sequence number since, for a db
+        opened with changelog=True. A change is a dict of seq, the id and parent
+        of the row, op: 'insert', 'update' or 'delete', and commit_seq, the seq
+        of the last change of the same commit.
+        """
+        if not self.backend.changelog:
+            raise UnsupportedOperation('Open the db with changelog=True to log the changes')
+        for change in self.backend.iter_changes(since):
+            yield change
+
+    def watch(self, path, callback):
+        """
+        After every commit with changes under the nodes matching path,
+        call callback with the list of these changes, see `changes`.
+        The path is evaluated when watching and again after each commit, from
+        this node, and the nodes it matched before a commit count too, so that
+        deleting a watched node is reported.
+        Returns a handle for `unwatch`.
+        """
+        return self.backend.watch(jsonquery.parse(path), callback, parent=self.root)
+
+    def unwatch(self, watcher):
+        self.backend.unwatch(watcher)
+
+    def explain(self, path, parent=None):
+        """
+        Show how the JSONPath is evaluated.
+
+        The path is evaluated step by step, and the statements of a step
+        depend on the results of the previous one, so the query is run
+        and the statements it ran are explained.
+
+        Returns a dict of
+          path, ast: The path and how it is parsed.
+          rows: Number of rows matched.
+          statements: A list of dicts for each distinct statement, in the order they first ran:
+            sql, params: The first run of the statement.
+            count, rows, time: Totals of all the runs.
+            plan: The lines of EXPLAIN QUERY PLAN.
+            full_scan: The tables scanned through, instead of searched by an index.
+            temp_btree: Whether a temporary b-tree is built for sorting or distinct.
+        """
+        if parent is None:
+            parent = self.root
+
+        ast = jsonquery.parse(path)
+        with self.capture(keep=True) as tracer:
+            rows = list(self.backend.jsonpath(ast=ast, parent=parent))
+
+        statements = []
+        seen = set()
+        for sql, params in tracer.log:
+            key = normalize(sql)
+            if key in seen:
+                continue
+            seen.add(key)
+            query = tracer.queries[key]
+            statement = {
+                'sql': sql,
+                'params': params,
+                'count': query['count'],
+                'rows': query['rows'],
+                'time': query['time'],
+            }
+            statement.update(self.backend.explain(sql, params))
+            statements.append(statement)
+
+        return {'path': path, 'ast': ast, 'rows': len(rows), 'statements': statements}
+
     def build_node(self, row):
         node = get_initial_data(row['type'])
         _type = row['type']
@@ -283,6 +672,8 @@ class Queryable(object):
     def get_datatype(self):
         return get_datatype_class(self.datatype)
 
+    @operation()
+    @timed('data')
     def data(self, update=False):
         if not self.datatype in (LIST, DICT):
             if not update and not isinstance(self._data, Nothing):
@@ -303,8 +694,16 @@ class Queryable(object):
             return TYPE_MAP.get(type(data)) == self.datatype
         return True
 
+    @operation('assign')
     def _update(self, data):
         new_type = TYPE_MAP.get(type(data))
+        if self.backend.writer:
+            self.backend.submit(call_node, self.link_key, self.root, self.datatype, '_update', data).result()
+            self._data = len(data) if new_type in (LIST, DICT) else data
+            self.datatype = new_type
+            self._set_class(new_type)
+            return
+
         if self.datatype in (LIST, DICT):
             self.backend.remove(self.root)
 
@@ -328,6 +727,9 @@ class Queryable(object):
         else:
             self.backend.set_value(self.root, data)
 
+        self._set_class(new_type)
+
+    def _set_class(self, new_type):
         import jsondb
         cls = get_type_class(new_type)
         if isinstance(self, jsondb.BaseDB):
@@ -337,10 +739,12 @@ class Queryable(object):
 
     _ = property(data, _update)
 
+    @operation()
     def dumps(self):
         """Dump the json data"""
         return json.dumps(self.data())
 
+    @operation()
     def dump(self, filepath):
         """Dump the json data to a file"""
         with open(filepath, 'wb') as f:
@@ -351,18 +755,78 @@ class Queryable(object):
     def commit(self):
         self.backend.commit()
 
+    def stats(self, reset=False):
+        """
+        Statement counts, rows and time per public call, see `Tracer.stats`.
+        The db must have been created or loaded with trace=True.
+        """
+        tracer = self.backend.tracer
+        if tracer is None:
+            raise UnsupportedOperation('Open the db with trace=True to collect stats.')
+        result = tracer.stats()
+        if reset:
+            tracer.reset()
+        return result
+
+    @contextlib.contextmanager
+    def capture(self, keep=False):
+        """
+        Trace the statements run inside the with block.
+
+            with db.capture() as tracer:
+                db.query('$..name').values()
+            print tracer.stats()['statements']
+
+        :param keep: Also keep every statement in tracer.log.
+        """
+        tracer = Tracer(keep)
+        self.backend.add_tracer(tracer)
+        try:
+            yield tracer
+        finally:
+            self.backend.remove_tracer(tracer)
+
     def close(self):
         self.backend.close()
 
+    @operation()
+    def snapshot(self, url, step=1000, progress=None):
+        """
+        Copy the committed state of the db to a new sqlite3 file, in one read
+        transaction. Readers are not blocked. Writers are, unless the db is in
+        WAL mode (the durable and concurrent profiles): until the copy is done,
+        a commit waits for the busy timeout, then fails with "database is locked".
+
+        :param url: The URL or path of the copy, replaced once complete.
+
+        :param step: Rows copied per statement.
+
+        :param progress: Called with the number of pages copied so far.
+
+        Returns a dict of the pages copied, the seconds and the pages_per_sec.
+        """
+        if self.backend.url.driver != 'sqlite3':
+            raise UnsupportedOperation('Only sqlite3 dbs can be copied')
+        path = backends.URL.parse(url).database if '://' in url else url
+        return self.backend.snapshot(path, step=step, progress=progress)
+
+    @operation()
     def set_value(self, id, value):
+        if self.backend.writer:
+            return self.set_value_async(id, value).result()
         self.backend.set_value(id, value)
 
+    def set_value_async(self, id, value):
+        return self.backend.submit(lambda backend: backend.set_value(id, value))
+
     def _get_value(self):
         row = self.backend.get_row(self.root)
         data = row['value']
         return data
 
     def update_link(self, rowid, link=None):
+        if self.backend.writer:
+            return self.backend.submit(lambda backend: backend.update_link(rowid, link)).result()
         self.backend.update_link(rowid, link)
 
     def get_row(self, rowid):
@@ -379,15 +843,18 @@ class Queryable(object):
 
 
 class SequenceQueryable(Queryable):
+    @operation()
     def __len__(self):
         return self.backend.get_children_count(self.root)
 
+    @operation()
     def __getitem__(self, key):
         if isinstance(key, slice):
             rslt = self.backend.iter_slice(self.root, key.start, key.stop, key.step)
             return QueryResult(rslt, self)
         return super(SequenceQueryable, self).__getitem__(key)
 
+    @operation()
     def __setitem__(self, key, value):
         """
         If the value associated to the key already exists, it will be override by value.
@@ -399,6 +866,8 @@ class SequenceQueryable(Queryable):
 
         if isinstance(value, Queryable):
             return
+        if self.backend.writer:
+            return self.backend.submit(call_node, self.link_key, self.root, self.datatype, '__setitem__', key, value).result()
 
         node = self[key]
         if node:
@@ -414,7 +883,10 @@ class SequenceQueryable(Queryable):
         else:
             node._update(value)
 
+    @operation()
     def __delitem__(self, key):
+        if self.backend.writer:
+            return self.backend.submit(call_node, self.link_key, self.root, self.datatype, '__delitem__', key).result()
         if self.datatype in (DICT, KEY):
             key_id, _ = self.backend.find_key(key, self.root)
             if key_id is not None:
@@ -425,19 +897,21 @@ class SequenceQueryable(Queryable):
                 if node:
                     self.backend.remove(node.root, include_self=True)
             elif isinstance(key, slice):
-                for node in self.backend.iter_slice(self.root, key.start, key.stop, key.step):
-                    self.backend.remove(node)
+                self.backend.remove_trees(self.backend.iter_slice(self.root, key.start, key.stop, key.step))
         else:
             raise UnsupportedTypeError
 
+    @operation()
     def __iter__(self):
         for x in self.backend.iter_slice(self.root):
             yield self._make(x)
 
+    @operation()
     def __reversed__(self):
         for x in self.backend.iter_slice(self.root, None, None, -1):
             yield self._make(x)
 
+    @operation()
     def __contains__(self, item):
         # FIXME: This would be very slow
         return item in self.data()
@@ -448,19 +922,23 @@ class SequenceQueryable(Queryable):
     def __radd__(self, other):
         return other + self.data()
 
+    @operation()
     def max(self):
         ids = (x for x in self.backend.iter_slice(self.root))
         return max(self.backend.get_row(id)['value'] for id in ids)
 
+    @operation()
     def min(self):
         ids = (x for x in self.backend.iter_slice(self.root))
         return min(self.backend.get_row(id)['value'] for id in ids)
 
 
 class ListQueryable(SequenceQueryable):
+    @operation()
     def append(self, data):
         self.feed(data)
 
+    @operation()
     def __getitem__(self, key):
         if isinstance(key, (int, long)):
             if abs(key) >= len(self):
@@ -474,47 +952,87 @@ class ListQueryable(SequenceQueryable):
 
     __rmul__ = __mul__
 
+    @operation()
     def __iadd__(self, other):
         for data in other:
             self.feed(data)
         return self
 
+    @operation()
     def __imul__(self, times):
         if times <= 0:
-            self.backend.remove(self.root)
-        else:
-            data = self.data()
-            for i in range(times - 1):
-                for item in data:
-                    self.feed(item)
+            if self.backend.writer:
+                self.backend.submit(lambda backend: backend.remove(self.root)).result()
+            else:
+                self.backend.remove(self.root)
+        elif times > 1:
+            # The elements are copied by SQLite, without reading them.
+            ids = list(self.backend.iter_slice(self.root))
+            copy = lambda backend: [backend.copy_trees(ids, self.root) for i in range(times - 1)]
+            if self.backend.writer:
+                self.backend.submit(copy).result()
+            else:
+                copy(self.backend)
 
         return self
 
 
 class DictQueryable(SequenceQueryable):
-    def update(self, data):
+    @operation()
+    def update(self, data, **kws):
+        """
+        Merge the dict data into this one.
+        With a JSONPath instead, update the nodes matching it, see `Queryable.update`.
+        """
+        if isinstance(data, basestring):
+            return Queryable.update(self, data, **kws)
         self.feed(data)
 
+    @operation()
     def clear(self):
+        if self.backend.writer:
+            return self.backend.submit(lambda backend: backend.remove(self.root)).result()
         self.backend.remove(self.root)
 
+    @operation()
     def get(self, key, default=None):
         result = self[key]
         return result.data() if result else default
 
+    @operation()
     def items(self):
         return self.data().items()
 
+    @operation()
     def iteritems(self):
         for key, value_row in self.backend.iter_dict(self.root):
             yield key, self._make(value_row.id, value_row.type).data()
 
+    @operation()
     def __contains__(self, item):
         key_id, _ = self.backend.find_key(item, self.root)
         return key_id is not None
 
 
 class PlainQueryable(Queryable):
+    @operation('assign')
+    def _apply(self, op, other):
+        """
+        Apply the in-place operator op in the db, by one atomic statement.
+        Returns False if the value there is not of a type op applies to.
+        """
+        if self.backend.writer:
+            row = self.backend.submit(lambda backend: backend.apply_value(self.root, op, other)).result()
+        else:
+            row = self.backend.apply_value(self.root, op, other)
+        if row is None:
+            return False
+        self._data = self.build_node(row)
+        if row['type'] != self.datatype:
+            self.datatype = row['type']
+            self._set_class(self.datatype)
+        return True
+
     def __iadd__(self, other):
         data = self.__add__(other)
         self._update(data)
@@ -580,6 +1098,11 @@ class PlainQueryable(Queryable):
 
 
 class StringQueryable(PlainQueryable, SequenceQueryable):
+    def __iadd__(self, other):
+        if isinstance(other, basestring) and self._apply('||', other):
+            return self
+        return PlainQueryable.__iadd__(self, other)
+
     def __len__(self):
         return len(self.data())
 
@@ -627,6 +1150,21 @@ class StringQueryable(PlainQueryable, SequenceQueryable):
 
 
 class NumberQueryable(PlainQueryable):
+    def __iadd__(self, other):
+        if isinstance(other, NUMBER_TYPES) and self._apply('+', other):
+            return self
+        return PlainQueryable.__iadd__(self, other)
+
+    def __isub__(self, other):
+        if isinstance(other, NUMBER_TYPES) and self._apply('-', other):
+            return self
+        return PlainQueryable.__isub__(self, other)
+
+    def __imul__(self, other):
+        if isinstance(other, NUMBER_TYPES) and self._apply('*', other):
+            return self
+        return PlainQueryable.__imul__(self, other)
+
     def __nonzero__(self):
         return self.data()
 
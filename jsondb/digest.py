@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.digest
+    ~~~~~~~~~~~~~
+
+    Content hashes of the nodes, equal for equal JSON values.
+
+    A scalar is hashed from its value, a list from the hashes of its elements
+    in order, and a dict from the hashes of its members in any order.
+    Numbers are equal by value and strings whatever their encoding, but
+    true is not 1.
+
+    With hashes=True the hashes of the lists, dicts and keys are kept in the
+    jsonhash table. SQLite triggers drop the hash of a changed row and of all
+    its ancestors, so that only the nodes changed since are hashed again.
+    Reading a hash does not write: the hashes computed are stored on commit.
+
+"""
+
+import hashlib
+from collections import defaultdict
+
+from jsondb.datatypes import *
+
+
+def scalar_digest(_type, value):
+    if _type == INT or (_type == FLOAT and value.is_integer()):
+        text = 'n%d' % value
+    elif _type == FLOAT:
+        text = 'n%r' % value
+    elif _type == BOOL:
+        text = 'b%d' % bool(value)
+    elif _type == NIL:
+        text = 'z'
+    else:
+        text = 's' + (value.encode('utf-8') if isinstance(value, unicode) else str(value))
+    return hashlib.sha1(text).hexdigest()
+
+
+def node_digest(_type, value, children):
+    """The hash of a row from the hashes of its children, in order."""
+    if _type == LIST:
+        text = 'l' + ''.join(children)
+    elif _type == DICT:
+        text = 'd' + ''.join(sorted(children))
+    elif _type == KEY:
+        key = value.encode('utf-8') if isinstance(value, unicode) else str(value)
+        text = 'k%d:%s%s' % (len(key), key, ''.join(children))
+    else:
+        return scalar_digest(_type, value)
+    return hashlib.sha1(text).hexdigest()
+
+
+def tree_digests(rows, ids):
+    """
+    Hash the nodes ids from rows of id, parent, type, value and digest, ordered by id.
+    rows has the rows of ids, and the children of every list, dict or key without a digest.
+
+    Returns the hashes of all the rows, and the (id, parent, digest) of the
+    lists, dicts and keys hashed.
+    """
+    by_id = {}
+    children = defaultdict(list)
+    for row in rows:
+        by_id[row['id']] = row
+        children[row['parent']].append(row)
+
+    digests = {}
+    computed = []
+    stack = [(by_id[id], False) for id in ids if id in by_id]
+    while stack:
+        row, ready = stack.pop()
+        id = row['id']
+        if id in digests:
+            continue
+        if row['digest'] is not None:
+            digests[id] = row['digest']
+        elif row['type'] not in (LIST, DICT, KEY):
+            digests[id] = scalar_digest(row['type'], row['value'])
+        elif not ready:
+            stack.append((row, True))
+            stack.extend((child, False) for child in children[id])
+        else:
+            digests[id] = node_digest(row['type'], row['value'], [digests[child['id']] for child in children[id]])
+            computed.append((id, row['parent'], digests[id]))
+    return digests, computed
@@ -21,3 +21,19 @@ class IllegalTypeError(Error):
 
 class UnsupportedOperation(Error):
     pass
+
+
+class CancelledError(Error):
+    pass
+
+
+class TimeoutError(Error):
+    pass
+
+
+class PatchError(Error):
+    pass
+
+
+class PatchTestFailed(PatchError):
+    pass
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.federation
+    ~~~~~~~~~~~~~~~~~
+
+    Run queries across several dbs at once.
+
+"""
+
+import core
+import jsonquery
+from backends.federation import FederatedBackend
+
+
+class Federation(object):
+    """
+    Several dbs attached to one connection.
+
+        with jsondb.federate(['mon.db', 'tue.db']) as dbs:
+            for source, node in dbs.query('$.events[?(@.level = "error")]'):
+                print source, node.data()
+    """
+
+    def __init__(self, urls, **kws):
+        """
+        :param urls: URLs or paths of the dbs, at most 10.
+
+        :param kws: Additional parameters to parse to the engine.
+        """
+        self.backend = FederatedBackend(urls, **kws)
+        self.node = core.Queryable(self.backend, link_key=self.backend.get_link_key())
+
+    def query(self, path, **kws):
+        """
+        Query all the dbs. Yields (url of the db, node) pairs,
+        ordered by the dbs then by their document order.
+
+        Accepts the timeout, cancel and progress parameters of `Queryable.query`.
+        """
+        ast = jsonquery.parse(path)
+        rows = self.backend.jsonpath(ast, **kws)
+        size = self.backend.size
+        for row in sorted(rows, key=lambda row: (row.id % size, row.id)):
+            yield self.backend.get_source(row.id), self.node._make(row.id, row.type)
+
+    def values(self, path, **kws):
+        """Return (url of the db, value) pairs of all the results."""
+        return [(source, node.data()) for source, node in self.query(path, **kws)]
+
+    def close(self):
+        self.backend.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.importer
+    ~~~~~~~~~~~~~~~
+
+    Parallel import of large json files.
+
+    The input is split at the boundaries of the top-level elements without
+    parsing it. Groups of elements are parsed and flattened into rows by
+    worker processes, and the rows are written by the calling process,
+    which assigns each group a contiguous range of ids.
+
+"""
+
+import re
+import collections
+import multiprocessing
+
+try:
+    import simplejson as json
+except:
+    import json
+
+from datatypes import *
+from error import *
+
+
+BLOCK_SIZE = 1 << 20
+
+# Approximate size of the text handed to a worker at a time.
+GROUP_SIZE = 1 << 20
+
+# A whole string, a lone quote of a string not complete yet, or a delimiter.
+RE_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|["\[\]{},]')
+
+
+def split(fileobj, blocksize=BLOCK_SIZE):
+    """
+    Split the json text into the texts of its top-level elements.
+
+    Yields the root type (LIST or DICT) first, then the text of each element.
+    For a dict, an element is a `"key": value` member.
+    Yields None first if the root is not a container.
+    """
+    pending = ''
+    pos = start = 0
+    depth = 0
+
+    while True:
+        block = fileobj.read(blocksize)
+        if not block:
+            break
+        text = pending + block
+        while True:
+            m = RE_TOKEN.search(text, pos)
+            if not m:
+                pos = len(text)
+                break
+            token = m.group()
+            if token == '"':
+                # Wait for the rest of the string.
+                pos = m.start()
+                break
+            pos = m.end()
+            if token in '[{':
+                depth += 1
+                if depth == 1:
+                    if text[:m.start()].strip():
+                        yield None
+                        return
+                    yield LIST if token == '[' else DICT
+                    start = pos
+            elif token in ']}':
+                depth -= 1
+                if depth == 0:
+                    element = text[start:m.start()]
+                    if element.strip():
+                        yield element
+                    return
+            elif token == ',' and depth == 1:
+                yield text[start:m.start()]
+                start = pos
+            elif depth == 0:
+                # A string at the top-level.
+                yield None
+                return
+
+        if depth == 0:
+            if text.strip():
+                # A scalar root.
+                yield None
+                return
+            pending, pos, start = '', 0, 0
+        else:
+            pending = text[start:]
+            pos -= start
+            start = 0
+
+    if depth == 0 and pending.strip():
+        yield None
+
+
+def group(elements, size=GROUP_SIZE):
+    """Pack the element texts into lists of about size chars."""
+    result = []
+    length = 0
+    for element in elements:
+        result.append(element)
+        length += len(element)
+        if length >= size:
+            yield result
+            result = []
+            length = 0
+    if result:
+        yield result
+
+
+def flatten(data, parent, rows, link_key):
+    """
+    Append the rows of data to rows, in document order.
+
+    Rows are [id, parent, type, value, link] lists, where id is the index in rows.
+    """
+    _type = TYPE_MAP.get(type(data))
+    if _type == DICT:
+        hash_id = len(rows)
+        rows.append([hash_id, parent, DICT, 0, None])
+        flatten_members(data, hash_id, rows, link_key)
+    elif _type == LIST:
+        hash_id = len(rows)
+        rows.append([hash_id, parent, LIST, 0, None])
+        for x in data:
+            flatten(x, hash_id, rows, link_key)
+    else:
+        rows.append([len(rows), parent, _type, data, None])
+
+
+def flatten_members(data, parent, rows, link_key):
+    """Append the rows of the members of dict data, whose own row is parent."""
+    for key, value in data.iteritems():
+        if key == link_key:
+            if parent is not None:
+                rows[parent][4] = value
+            continue
+        key_id = len(rows)
+        rows.append([key_id, parent, KEY, key, None])
+        flatten(value, key_id, rows, link_key)
+
+
+def parse_group(args):
+    """
+    Parse and flatten a group of element texts. Runs in the workers.
+
+    Top-level rows have None as parent. Returns the rows and the root link if any.
+    """
+    root_type, texts, link_key = args
+    rows = []
+    link = None
+    for text in texts:
+        if root_type == LIST:
+            flatten(json.loads(text), None, rows, link_key)
+        else:
+            member = json.loads('{%s}' % text)
+            if link_key in member:
+                link = member.pop(link_key)
+            flatten_members(member, None, rows, link_key)
+    return rows, link
+
+
+def import_file(fileobj, create, processes=None):
+    """
+    Create a db from the top-level list or dict in fileobj.
+
+    :param create: Called as create(initial_data) to create the empty db.
+
+    :param processes: Number of worker processes. The number of CPUs if None.
+    """
+    elements = split(fileobj)
+    root_type = next(elements, None)
+    if root_type not in (LIST, DICT):
+        raise IllegalTypeError('The top-level should be either a list or a dict.')
+
+    db = create([] if root_type == LIST else {})
+    backend = db.backend
+    root = db.root
+    base = [backend.get_max_id() + 1]
+
+    def write((rows, link)):
+        for row in rows:
+            row[0] += base[0]
+            row[1] = root if row[1] is None else row[1] + base[0]
+        backend.insert_rows(rows)
+        base[0] += len(rows)
+        if link is not None:
+            backend.update_link(root, link)
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        # Keep a few groups per worker in flight, so that memory stays bounded.
+        limit = 2 * (processes or multiprocessing.cpu_count())
+        pending = collections.deque()
+        for texts in group(elements):
+            pending.append(pool.apply_async(parse_group, ((root_type, texts, db.link_key),)))
+            if len(pending) >= limit:
+                write(pending.popleft().get())
+        while pending:
+            write(pending.popleft().get())
+    except:
+        backend.rollback()
+        raise
+    else:
+        db.commit()
+    finally:
+        pool.terminate()
+        pool.join()
+
+    return db
@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.patch
+    ~~~~~~~~~~~~
+
+    Applying JSON Patch (RFC 6902) documents to the rows in place.
+
+        db.patch([
+            {'op': 'replace', 'path': '/store/bicycle/color', 'value': 'blue'},
+            {'op': 'add', 'path': '/store/book/0', 'value': {'title': 'new'}},
+            {'op': 'move', 'from': '/store/book/3', 'path': '/archive/-'},
+        ])
+
+    Each operation only touches the rows of the nodes it adds, removes or
+    replaces. A moved node is re-parented rather than rewritten, a copied one
+    is copied by SQLite, and inserting into a list renumbers the rows of the
+    following elements only.
+
+    The elements of a list are ordered by their ids, which leave no room in
+    between, so that inserting anywhere but at the end costs O(n) for the n
+    elements after it: their rows, with the ones of their descendants, get new
+    ids in document order, which the queries return the elements in.
+    Appending with '-' renumbers nothing but the moved node, if any.
+
+    JSON Merge Patch (RFC 7386) documents are compared with the stored data
+    instead, and only the values which differ are written:
+
+        db.merge({'store': {'bicycle': {'color': 'blue', 'price': None}}})
+
+"""
+
+from jsondb.datatypes import *
+from jsondb.error import PatchError, PatchTestFailed, UnsupportedTypeError, UnsupportedOperation
+
+
+def parse_pointer(pointer):
+    """The reference tokens of a JSON Pointer (RFC 6901)."""
+    if pointer == '':
+        return []
+    if not isinstance(pointer, basestring) or not pointer.startswith('/'):
+        raise PatchError('Invalid JSON pointer: %r' % (pointer,))
+    return [token.replace('~1', '/').replace('~0', '~') for token in pointer[1:].split('/')]
+
+
+def parent_pointer(pointer):
+    return pointer[:pointer.rindex('/')]
+
+
+def parse_index(token):
+    if not token.isdigit() or (token != '0' and token.startswith('0')):
+        raise PatchError('Invalid list index: %r' % token)
+    return int(token)
+
+
+def equal(a, b):
+    """Whether two JSON values are equal: numbers by value, strings whatever their encoding."""
+    if isinstance(a, str):
+        a = a.decode('utf-8')
+    if isinstance(b, str):
+        b = b.decode('utf-8')
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    if isinstance(a, (int, long, float)) and isinstance(b, (int, long, float)):
+        return a == b
+    if isinstance(a, dict) and isinstance(b, dict):
+        a = dict((equal_key(k), v) for k, v in a.iteritems())
+        b = dict((equal_key(k), v) for k, v in b.iteritems())
+        return set(a) == set(b) and all(equal(a[k], b[k]) for k in a)
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return len(a) == len(b) and all(equal(x, y) for x, y in zip(a, b))
+    return type(a) is type(b) and a == b
+
+
+def equal_key(key):
+    return key.decode('utf-8') if isinstance(key, str) else key
+
+
+def relocate(backend, id, parent, token=None, copy=False):
+    """
+    Move, or copy, the node id with its descendants into the row parent, a list or dict.
+
+    token is the key in a dict, the index or '-' in a list. By default the
+    member keeps its key in a dict and is appended to a list.
+    The rows are re-parented, or copied by SQLite, never built into objects.
+    In a list, the elements after the index are renumbered, at O(n) cost.
+    Returns the id of the moved or copied node.
+    """
+    row = backend.get_row(id)
+    old_parent = backend.get_row(row['parent'])
+    if parent['type'] == DICT:
+        if token is None:
+            if old_parent['type'] != KEY:
+                raise UnsupportedOperation('A key is needed to put a list element into a dict')
+            token = old_parent['value']
+        key_id, value_id = backend.find_key(token, parent['id'])
+        if value_id == id:
+            return id
+        key_id = backend.insert((parent['id'], KEY, token))
+        new_id = backend.copy_trees([id], key_id)[0] if copy else backend.set_parent(id, key_id)
+        if value_id is not None:
+            # Removed with its key after the node is out, as it may contain the node.
+            backend.remove_trees([value_id])
+    elif parent['type'] == LIST:
+        ids = [child for child in backend.iter_slice(parent['id']) if copy or child != id]
+        index = len(ids) if token in (None, '-') else parse_index(token)
+        if index > len(ids):
+            raise PatchError('List index out of range: %s' % token)
+        tail = ids[index:]
+        if copy:
+            new_id = backend.copy_trees([id], parent['id'])[0]
+            if tail:
+                backend.renumber(tail)
+        else:
+            new_id = backend.renumber([backend.set_parent(id, parent['id'])] + tail)[0]
+    else:
+        raise PatchError('Not a list or dict: %s' % parent['id'])
+    if not copy and old_parent['type'] == KEY:
+        backend.remove(old_parent['id'], include_self=True)
+    return new_id
+
+
+class Patcher(object):
+    """Applies the operations of a patch to the subtree of node."""
+
+    def __init__(self, node):
+        self.node = node
+        self.backend = node.backend
+        self.ops = {
+            'add'     : self.add,
+            'remove'  : self.remove,
+            'replace' : self.replace,
+            'move'    : self.move,
+            'copy'    : self.copy,
+            'test'    : self.test,
+        }
+
+    def apply(self, patch):
+        for op in patch:
+            if not isinstance(op, dict) or op.get('op') not in self.ops:
+                raise PatchError('Invalid operation: %r' % (op,))
+            self.ops[op['op']](op)
+
+    def member(self, op, name):
+        if name not in op:
+            raise PatchError('Missing "%s" in %r' % (name, op))
+        return op[name]
+
+    def child(self, row, token):
+        """The id of the child of row at token, None if there is none."""
+        if row['type'] == DICT:
+            key_id, value_id = self.backend.find_key(token, row['id'])
+            return value_id
+        if row['type'] == LIST:
+            index = parse_index(token)
+            if index >= self.backend.get_children_count(row['id']):
+                return None
+            return self.backend.get_nth_child(row['id'], index).id
+        return None
+
+    def locate(self, pointer):
+        """The row at pointer."""
+        row = self.backend.get_row(self.node.root)
+        for token in parse_pointer(pointer):
+            id = self.child(row, token)
+            if id is None:
+                raise PatchError('No such path: %s' % pointer)
+            row = self.backend.get_row(id)
+        return row
+
+    def locate_parent(self, pointer):
+        """The row of the container of pointer and the last token of pointer, (None, None) for the root."""
+        tokens = parse_pointer(pointer)
+        if not tokens:
+            return None, None
+        parent = self.locate(parent_pointer(pointer))
+        if parent['type'] not in (LIST, DICT):
+            raise PatchError('Not a list or dict: %s' % parent_pointer(pointer))
+        return parent, tokens[-1]
+
+    def position(self, parent, token):
+        """The index of token in the list parent, and the ids of the elements from there on."""
+        ids = list(self.backend.iter_slice(parent['id']))
+        index = len(ids) if token == '-' else parse_index(token)
+        if index > len(ids):
+            raise PatchError('List index out of range: %s' % token)
+        return index, ids[index:]
+
+    def feed(self, data, parent_id):
+        id_list, pending_list = self.node._feed(data, parent_id)
+        self.backend.batch_insert(pending_list)
+
+    def set(self, id, value):
+        self.node._update_nodes([id], value, None, None)
+
+    def add(self, op):
+        """Add the value, in a list before the element at the index, renumbering the ones after in O(n)."""
+        value = self.member(op, 'value')
+        parent, token = self.locate_parent(self.member(op, 'path'))
+        if parent is None:
+            self.set(self.node.root, value)
+        elif parent['type'] == DICT:
+            key_id, value_id = self.backend.find_key(token, parent['id'])
+            if value_id is not None:
+                self.set(value_id, value)
+            else:
+                self.feed({token: value}, parent['id'])
+        else:
+            index, tail = self.position(parent, token)
+            self.feed(value, parent['id'])
+            if tail:
+                self.backend.renumber(tail)
+
+    def remove(self, op):
+        row = self.locate(self.member(op, 'path'))
+        if row['id'] == self.node.root:
+            raise PatchError('Can not remove the root')
+        self.backend.remove_trees([row['id']])
+
+    def replace(self, op):
+        value = self.member(op, 'value')
+        row = self.locate(self.member(op, 'path'))
+        self.set(row['id'], value)
+
+    def move(self, op):
+        source, path = self.member(op, 'from'), self.member(op, 'path')
+        if source == path:
+            return
+        if path.startswith(source + '/'):
+            raise PatchError('Can not move %s into itself' % source)
+        row = self.locate(source)
+        if row['id'] == self.node.root:
+            raise PatchError('Can not move the root')
+        parent, token = self.locate_parent(path)
+        if parent is None:
+            value = self.node.build_node(row)
+            self.backend.remove_trees([row['id']])
+            self.set(self.node.root, value)
+        else:
+            relocate(self.backend, row['id'], parent, token)
+
+    def copy(self, op):
+        row = self.locate(self.member(op, 'from'))
+        parent, token = self.locate_parent(self.member(op, 'path'))
+        if parent is None:
+            self.set(self.node.root, self.node.build_node(row))
+        else:
+            relocate(self.backend, row['id'], parent, token, copy=True)
+
+    def test(self, op):
+        value = self.member(op, 'value')
+        path = self.member(op, 'path')
+        try:
+            row = self.locate(path)
+        except PatchError:
+            raise PatchTestFailed('No such path: %s' % path)
+        if not equal(self.node.build_node(row), value):
+            raise PatchTestFailed('Not equal to %r: %s' % (value, path))
+
+
+class Merger(object):
+    """
+    Applies a merge patch to the subtree of node, writing only what differs.
+
+    The members of a dict, or the elements of a list, are read in one statement.
+    The changed values, the removed nodes and the new rows are written in
+    one batch each by `flush`.
+    """
+
+    def __init__(self, node):
+        self.node = node
+        self.backend = node.backend
+        self.rows = []
+        self.removed = []
+        self.pending_list = []
+        # The lists with new elements in pending_list.
+        self.scalars_pending = set()
+        self.changes = 0
+
+    def apply(self, data):
+        """Returns the number of values added, changed or removed."""
+        self.merge(self.backend.get_row(self.node.root), data)
+        self.flush()
+        return self.changes
+
+    def flush(self):
+        self.backend.set_rows(self.rows)
+        self.backend.remove_trees(self.removed)
+        if self.pending_list:
+            self.backend.batch_insert(self.pending_list)
+        self.rows, self.removed, self.pending_list = [], [], []
+        self.scalars_pending.clear()
+
+    def members(self, row):
+        return dict((equal_key(member['key']), member) for member in self.backend.get_members(row['id']))
+
+    def merge(self, row, data):
+        """Merge the dict data into row, set row to data for anything else."""
+        if not isinstance(data, dict):
+            self.sync(row, data)
+            return
+        if row['type'] != DICT:
+            self.replace(row, {})
+            members = {}
+        else:
+            members = self.members(row)
+        for key, value in data.iteritems():
+            if key == self.node.link_key:
+                self.link(row, value)
+                continue
+            member = members.get(equal_key(key))
+            if value is None:
+                if member is not None:
+                    self.remove(member['id'])
+            elif member is None:
+                self.add(row['id'], {key: value})
+            else:
+                self.merge(member, value)
+
+    def sync(self, row, data):
+        """Make row equal to data."""
+        _type = TYPE_MAP.get(type(data))
+        if _type is None:
+            raise UnsupportedTypeError(type(data))
+
+        if _type == DICT and row['type'] == DICT:
+            members = self.members(row)
+            for key, value in data.iteritems():
+                if key == self.node.link_key:
+                    self.link(row, value)
+                    continue
+                member = members.pop(equal_key(key), None)
+                if member is None:
+                    self.add(row['id'], {key: value})
+                else:
+                    self.sync(member, value)
+            for member in members.itervalues():
+                self.remove(member['id'])
+
+        elif _type == LIST and row['type'] == LIST:
+            children = list(self.backend.iter_children(row['id']))
+            for child, value in zip(children, data):
+                self.sync(child, value)
+            for child in children[len(data):]:
+                self.remove(child['id'])
+            for value in data[len(children):]:
+                self.add(row['id'], value)
+
+        elif _type in (LIST, DICT):
+            self.replace(row, data)
+
+        elif row['type'] in (LIST, DICT) or not equal(self.node.build_node(row), data):
+            # The descendants of a container are dropped by set_rows.
+            self.rows.append((row['id'], _type, data))
+            self.changes += 1
+
+    def replace(self, row, data):
+        self.node._update_nodes([row['id']], data, None, None)
+        self.changes += 1
+
+    def add(self, parent_id, data):
+        if TYPE_MAP.get(type(data)) not in (LIST, DICT):
+            self.scalars_pending.add(parent_id)
+        elif parent_id in self.scalars_pending:
+            # Keep the order of a list: containers are inserted at once.
+            self.backend.batch_insert(self.pending_list)
+            self.pending_list = []
+            self.scalars_pending.clear()
+        id_list, pending_list = self.node._feed(data, parent_id)
+        self.pending_list += pending_list
+        self.changes += 1
+
+    def remove(self, id):
+        self.removed.append(id)
+        self.changes += 1
+
+    def link(self, row, value):
+        if row['link'] != value:
+            self.backend.update_link(row['id'], value)
+            self.changes += 1
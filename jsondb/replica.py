@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.replica
+    ~~~~~~~~~~~~~~
+
+    Read replicas of a db kept with changelog=True.
+
+        jsondb.replicate('primary.db', '/mnt/replica.db')
+
+    The replica remembers the sequence number of the last change applied.
+    Each call ships only the rows changed since, read from the primary as
+    they are now, in one transaction per batch_size changes. Applying the
+    current rows again is harmless, so an interrupted call simply resumes.
+
+    A new replica, or one behind changes already trimmed from the log of
+    the primary, is copied in full, to a new file replacing it once complete.
+
+"""
+
+import os
+from itertools import islice
+
+import jsondb.backends as backends
+from jsondb.error import UnsupportedOperation
+
+
+SEQ_KEY = 'replica_seq'
+
+
+def replicate(src, dst, batch_size=1000, **kws):
+    """
+    Bring the replica dst up to date with the db src.
+
+    Returns a dict of the sequence number reached, the number of changes
+    and rows shipped, and whether the replica was copied in full.
+    """
+    source = backends.create(src, overwrite=False, readonly=True, **kws)
+    try:
+        if not source.changelog:
+            raise UnsupportedOperation('%s keeps no change log, see changelog=True' % src)
+        path = backends.URL.parse(dst).database if '://' in dst else dst
+        if os.path.exists(path):
+            replica = backends.create(dst, overwrite=False, **kws)
+            try:
+                seq = replica.get_settings(SEQ_KEY)
+                if seq is not None and not missed(source, seq):
+                    return ship_changes(source, replica, seq, batch_size)
+            finally:
+                replica.close()
+        return copy_all(source, path, batch_size, **kws)
+    finally:
+        source.close()
+
+
+def missed(source, seq):
+    """Whether the changes after seq are no longer all in the log of source."""
+    last = source.get_change_seq()
+    if seq > last:
+        # Another db since
+        return True
+    changes = source.iter_changes(seq)
+    first = next(changes, None)
+    changes.close()
+    return first['seq'] > seq + 1 if first else last > seq
+
+
+def ship_changes(source, replica, seq, batch_size):
+    stats = {'seq': seq, 'changes': 0, 'rows': 0, 'full': False}
+    changes = source.iter_changes(seq)
+    while True:
+        batch = list(islice(changes, batch_size))
+        if not batch:
+            break
+        ids = set(change['id'] for change in batch)
+        rows = [tuple(row) for row in source.get_rows(ids)]
+        replica.delete_rows(ids - set(row[0] for row in rows))
+        replica.replace_rows(rows)
+        stats['seq'] = batch[-1]['seq']
+        # Commits the batch
+        replica.update_settings(SEQ_KEY, stats['seq'])
+        stats['changes'] += len(batch)
+        stats['rows'] += len(rows)
+    return stats
+
+
+def copy_all(source, path, batch_size, **kws):
+    # A snapshot replaces the file once complete, so that the readers of the
+    # replica never see it empty. Its change seq is the one of the copy.
+    source.snapshot(path, step=batch_size)
+    replica = backends.create(path, overwrite=False, **kws)
+    try:
+        stats = {'seq': replica.get_change_seq(), 'changes': 0, 'full': True,
+                 'rows': replica.select('select count(*) from jsondata')[0][0]}
+        replica.update_settings(SEQ_KEY, stats['seq'])
+    finally:
+        replica.close()
+    return stats
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.slowlog
+    ~~~~~~~~~~~~~~
+
+    Logging the calls slower than a threshold.
+
+    The calls of `query` (including the iteration of its result), `feed`
+    and `data` are timed. A call which takes longer than the threshold is
+    reported with its path, parent id, number of rows returned and the SQL
+    statements it ran. Only the statements of the running call are kept,
+    up to a limit, so the overhead stays low under live load.
+
+"""
+
+import functools
+import threading
+import timeit
+
+
+timer = timeit.default_timer
+
+
+class Call(object):
+    """A call being timed."""
+
+    def __init__(self, name, path=None, parent=None):
+        self.name = name
+        self.path = path
+        self.parent = parent
+        self.rows = None
+        self.elapsed = 0.0
+        self.count = 0
+        self.statements = []
+
+
+class SlowLog(object):
+    """
+    Reports the slow calls of a backend.
+
+    :param threshold: Seconds above which a call is reported.
+
+    :param sink: Called with a dict for each slow call. Logged as a warning
+                 through the logger of `jsondb.core` if None.
+
+    :param rate: Number of reports per second allowed in the long run.
+
+    :param burst: Number of reports allowed at once. Reports above the rate
+                  are dropped, and counted in the next one.
+
+    :param max_statements: Number of statements kept for a report.
+    """
+
+    def __init__(self, threshold=1.0, sink=None, rate=1.0, burst=10, max_statements=20):
+        self.threshold = threshold
+        self.sink = sink
+        self.rate = rate
+        self.burst = burst
+        self.max_statements = max_statements
+        # The call running in each thread
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.tokens = burst
+        self.last = timer()
+        self.suppressed = 0
+
+    @property
+    def current(self):
+        return getattr(self.local, 'call', None)
+
+    @current.setter
+    def current(self, call):
+        self.local.call = call
+
+    # The tracer interface, see `jsondb.tracing.Tracer`.
+
+    def begin(self, name):
+        pass
+
+    def end(self, name, elapsed, calls=1):
+        pass
+
+    def statement(self, sql, params, elapsed, rows=0):
+        call = self.current
+        if call is None:
+            return
+        call.count += 1
+        if len(call.statements) < self.max_statements:
+            call.statements.append(sql)
+
+    def fetched(self, sql, rows, elapsed):
+        pass
+
+    def start(self, name, path=None, parent=None):
+        return Call(name, path, parent)
+
+    def run(self, call, func, *args, **kws):
+        """Run func as a part of call."""
+        previous, self.current = self.current, call
+        start = timer()
+        try:
+            return func(*args, **kws)
+        finally:
+            call.elapsed += timer() - start
+            self.current = previous
+
+    def watch(self, call, seq):
+        """Iterate seq as a part of call, counting the rows. The call is finished with the iteration."""
+        call.rows = 0
+        try:
+            while True:
+                try:
+                    item = self.run(call, next, seq)
+                except StopIteration:
+                    return
+                call.rows += 1
+                yield item
+        finally:
+            self.finish(call)
+
+    def finish(self, call):
+        if call.elapsed < self.threshold or not self.allow():
+            return
+        record = {
+            'operation': call.name,
+            'path': call.path,
+            'parent': call.parent,
+            'rows': call.rows,
+            'time': call.elapsed,
+            'statements': call.count,
+            'sql': call.statements,
+            'suppressed': self.suppressed,
+        }
+        self.suppressed = 0
+        if self.sink is not None:
+            self.sink(record)
+        else:
+            from jsondb.core import log_slow_call
+            log_slow_call(record)
+
+    def allow(self):
+        """Whether a report is allowed now, by a token bucket."""
+        with self.lock:
+            now = timer()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            self.suppressed += 1
+            return False
+
+
+def timed(name):
+    """Decorate a method of a `Queryable` to be reported by the slow log of its backend."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kws):
+            slowlog = self.backend.slowlog
+            if slowlog is None or slowlog.current is not None:
+                # Nested calls are a part of the outer one.
+                return func(self, *args, **kws)
+            call = slowlog.start(name, parent=self.root)
+            try:
+                return slowlog.run(call, func, self, *args, **kws)
+            finally:
+                slowlog.finish(call)
+        return wrapper
+    return decorator
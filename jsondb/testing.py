@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.testing
+    ~~~~~~~~~~~~~~
+
+    Helpers for tests.
+
+"""
+
+import contextlib
+
+from tracing import Tracer, add_global_tracer, remove_global_tracer
+
+
+# Number of statements listed when a budget is exceeded.
+REPORT_SIZE = 10
+
+
+@contextlib.contextmanager
+def assert_max_queries(n, db=None):
+    """
+    Fail with AssertionError if the block runs more than n SQL statements.
+
+        with assert_max_queries(3):
+            db['store']['book'][0]
+
+    :param db: Only count the statements of db. Those of all the dbs if None.
+    """
+    tracer = Tracer()
+    if db is None:
+        add_global_tracer(tracer)
+    else:
+        db.backend.add_tracer(tracer)
+    try:
+        yield tracer
+    finally:
+        if db is None:
+            remove_global_tracer(tracer)
+        else:
+            db.backend.remove_tracer(tracer)
+
+    if tracer.count > n:
+        raise AssertionError(format_report(tracer, n))
+
+
+def format_report(tracer, n):
+    stats = tracer.stats()
+    lines = ['%s SQL statements, expected at most %s.' % (stats['statements'], n)]
+    for name, op in sorted(stats['operations'].items(), key=lambda item: -item[1]['statements']):
+        lines.append('  %6d  %s' % (op['statements'], name))
+    lines.append('Most frequent:')
+    queries = sorted(stats['queries'].items(), key=lambda item: -item[1]['count'])
+    for sql, query in queries[:REPORT_SIZE]:
+        lines.append('  %6d  %s' % (query['count'], sql))
+    return '\n'.join(lines)
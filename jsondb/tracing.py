@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.tracing
+    ~~~~~~~~~~~~~~
+
+    Counting the SQL statements behind each call.
+
+    Every statement run on a backend connection is reported to the tracers
+    of the backend, together with the rows it returned or changed and the
+    time it took. Statements are attributed to the outermost public call
+    (`query`, `data`, `__getitem__`, ...) running at the time, so that a call
+    issuing a statement per row stands out.
+
+    Nothing is recorded, and nothing is paid, while no tracer is attached.
+
+"""
+
+import re
+import copy
+import weakref
+import inspect
+import sqlite3
+import threading
+import functools
+import timeit
+
+
+timer = timeit.default_timer
+
+# Operation name of the statements run outside any public call.
+OTHER = 'other'
+
+# Tracers of all the backends, see `add_global_tracer`.
+global_tracers = []
+
+# The backends which can be traced.
+backends = weakref.WeakSet()
+
+RE_STRING = re.compile(r"'(?:[^']|'')*'")
+RE_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?')
+RE_LIST = re.compile(r'\bin\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.I)
+
+
+def normalize(sql):
+    """Replace the literals in sql with ?, so that the same statement with other values counts as one."""
+    sql = RE_STRING.sub('?', sql)
+    sql = RE_NUMBER.sub('?', sql)
+    sql = RE_LIST.sub('in (...)', sql)
+    return ' '.join(sql.split())
+
+
+def register(backend):
+    """Make backend follow the global tracers. Its `update_tracing` is called when they change."""
+    backends.add(backend)
+
+
+def add_global_tracer(tracer):
+    """Report the statements of all the backends to tracer."""
+    global_tracers.append(tracer)
+    for backend in list(backends):
+        backend.update_tracing()
+
+
+def remove_global_tracer(tracer):
+    global_tracers.remove(tracer)
+    for backend in list(backends):
+        backend.update_tracing()
+
+
+def active(tracers):
+    """The tracers to report to, the given ones and the global ones."""
+    if global_tracers:
+        return list(tracers) + global_tracers
+    return tracers
+
+
+class Tracer(object):
+    """
+    Collects the statements of a backend.
+
+    :param keep: Also keep every statement with its parameters in `log`.
+    """
+
+    def __init__(self, keep=False):
+        self.keep = keep
+        self.lock = threading.Lock()
+        # The calls running in each thread
+        self.local = threading.local()
+        self.reset()
+
+    def reset(self):
+        self.operations = {}
+        self.queries = {}
+        self.log = []
+
+    @property
+    def stack(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    @property
+    def operation(self):
+        return self.stack[0] if self.stack else OTHER
+
+    def _operation(self, name):
+        op = self.operations.get(name)
+        if op is None:
+            op = self.operations[name] = {'calls': 0, 'statements': 0, 'rows': 0, 'time': 0.0, 'sql_time': 0.0}
+        return op
+
+    def _query(self, sql):
+        key = normalize(sql)
+        query = self.queries.get(key)
+        if query is None:
+            query = self.queries[key] = {'count': 0, 'rows': 0, 'time': 0.0}
+        return query
+
+    def begin(self, name):
+        self.stack.append(name)
+
+    def end(self, name, elapsed, calls=1):
+        stack = self.stack
+        stack.pop()
+        if stack:
+            return
+        with self.lock:
+            op = self._operation(name)
+            op['calls'] += calls
+            op['time'] += elapsed
+
+    def statement(self, sql, params, elapsed, rows=0):
+        """Record a statement which has been executed."""
+        with self.lock:
+            op = self._operation(self.operation)
+            op['statements'] += 1
+            op['rows'] += rows
+            op['sql_time'] += elapsed
+            query = self._query(sql)
+            query['count'] += 1
+            query['rows'] += rows
+            query['time'] += elapsed
+            if self.keep:
+                self.log.append((sql, params))
+
+    def fetched(self, sql, rows, elapsed):
+        """Record rows fetched from a statement executed before."""
+        with self.lock:
+            op = self._operation(self.operation)
+            op['rows'] += rows
+            op['sql_time'] += elapsed
+            query = self._query(sql)
+            query['rows'] += rows
+            query['time'] += elapsed
+
+    @property
+    def count(self):
+        """Number of statements so far."""
+        return sum(op['statements'] for op in self.operations.values())
+
+    def stats(self):
+        """
+        Return a dict of
+          statements, rows, time: Totals of all the statements.
+          operations: {name: {calls, statements, rows, time, sql_time}} per public call.
+          queries: {normalized sql: {count, rows, time}} per statement.
+        """
+        with self.lock:
+            operations = copy.deepcopy(self.operations)
+            queries = copy.deepcopy(self.queries)
+        return {
+            'statements': sum(op['statements'] for op in operations.values()),
+            'rows': sum(op['rows'] for op in operations.values()),
+            'time': sum(op['sql_time'] for op in operations.values()),
+            'operations': operations,
+            'queries': queries,
+        }
+
+
+class TracingCursor(sqlite3.Cursor):
+    sql = None
+
+    def execute(self, sql, *args):
+        return self._run(sqlite3.Cursor.execute, sql, args)
+
+    def executemany(self, sql, *args):
+        return self._run(sqlite3.Cursor.executemany, sql, args)
+
+    def _run(self, method, sql, args):
+        tracers = active(self.connection.tracers)
+        if not tracers:
+            return method(self, sql, *args)
+        start = timer()
+        try:
+            return method(self, sql, *args)
+        finally:
+            elapsed = timer() - start
+            self.sql = sql
+            rows = max(self.rowcount, 0)
+            params = args[0] if args else ()
+            for tracer in list(tracers):
+                tracer.statement(sql, params, elapsed, rows)
+
+    def _fetch(self, method, *args):
+        tracers = active(self.connection.tracers)
+        if not tracers or self.sql is None:
+            return method(self, *args)
+        start = timer()
+        result = method(self, *args)
+        elapsed = timer() - start
+        if result is None:
+            rows = 0
+        elif isinstance(result, list):
+            rows = len(result)
+        else:
+            rows = 1
+        for tracer in list(tracers):
+            tracer.fetched(self.sql, rows, elapsed)
+        return result
+
+    def fetchone(self):
+        return self._fetch(sqlite3.Cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._fetch(sqlite3.Cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._fetch(sqlite3.Cursor.fetchall)
+
+    def next(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    __next__ = next
+
+
+class TracingConnection(sqlite3.Connection):
+    """
+    A connection whose cursors report to its tracers.
+
+    Cursors are plain ones while there are no tracers,
+    so that an untraced connection runs at full speed.
+    """
+
+    tracers = ()
+
+    def set_tracers(self, tracers):
+        """Trace the cursors created from now on if tracers is not empty. The list is shared, not copied."""
+        self.tracers = tracers
+        if tracers or global_tracers:
+            # Found before the method of the class, also by execute().
+            self.cursor = self.traced_cursor
+        elif 'cursor' in self.__dict__:
+            del self.cursor
+
+    def traced_cursor(self, factory=TracingCursor):
+        return sqlite3.Connection.cursor(self, factory)
+
+
+def trace_steps(tracers, name, seq, calls=1):
+    """Attribute the statements run while iterating seq to the operation name."""
+    while True:
+        for tracer in tracers:
+            tracer.begin(name)
+        start = timer()
+        try:
+            item = next(seq)
+        except StopIteration:
+            return
+        finally:
+            elapsed = timer() - start
+            for tracer in tracers:
+                tracer.end(name, elapsed, calls)
+            calls = 0
+        yield item
+
+
+def operation(name=None, call=True):
+    """
+    Decorate a public method of objects with a backend,
+    so that the statements it runs are attributed to it.
+    Generator methods are traced while they are iterated.
+
+    :param call: Whether to count a call of the operation,
+                 False for the methods which continue an operation,
+                 like fetching the results of a query.
+    """
+    calls = int(call)
+
+    def decorator(func):
+        opname = name or func.__name__
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def wrapper(self, *args, **kws):
+                tracers = active(self.backend.tracers)
+                if not tracers:
+                    return func(self, *args, **kws)
+                return trace_steps(list(tracers), opname, func(self, *args, **kws), calls)
+            return wrapper
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kws):
+            tracers = active(self.backend.tracers)
+            if not tracers:
+                return func(self, *args, **kws)
+            tracers = list(tracers)
+            for tracer in tracers:
+                tracer.begin(opname)
+            start = timer()
+            try:
+                return func(self, *args, **kws)
+            finally:
+                elapsed = timer() - start
+                for tracer in tracers:
+                    tracer.end(opname, elapsed, calls)
+        return wrapper
+
+    return decorator
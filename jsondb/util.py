@@ -1,6 +1,110 @@
 # coding: utf-8
 
 import os
+import threading
+
+from jsondb.error import CancelledError, TimeoutError
 
 
 IS_WINDOWS = (os.name == 'nt')
+
+
+(PENDING, RUNNING, CANCELLED, FINISHED) = range(4)
+
+
+class Future(object):
+    """
+    The result of an operation executed in another thread.
+
+    A small subset of `concurrent.futures.Future`.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._state = PENDING
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def cancel(self):
+        with self._condition:
+            if self._state != PENDING:
+                return self._state == CANCELLED
+            self._state = CANCELLED
+            self._condition.notify_all()
+        self._invoke_callbacks()
+        return True
+
+    def cancelled(self):
+        return self._state == CANCELLED
+
+    def running(self):
+        return self._state == RUNNING
+
+    def done(self):
+        return self._state in (CANCELLED, FINISHED)
+
+    def set_running_or_notify_cancel(self):
+        """Mark the future as running. Returns False if it has been cancelled."""
+        with self._condition:
+            if self._state == CANCELLED:
+                return False
+            self._state = RUNNING
+            return True
+
+    def set_result(self, result):
+        with self._condition:
+            self._result = result
+            self._state = FINISHED
+            self._condition.notify_all()
+        self._invoke_callbacks()
+
+    def set_exception(self, exception):
+        with self._condition:
+            self._exception = exception
+            self._state = FINISHED
+            self._condition.notify_all()
+        self._invoke_callbacks()
+
+    def add_done_callback(self, fn):
+        with self._condition:
+            if not self.done():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _invoke_callbacks(self):
+        for fn in self._callbacks:
+            try:
+                fn(self)
+            except Exception:
+                pass
+
+    def _wait(self, timeout):
+        with self._condition:
+            if not self.done():
+                self._condition.wait(timeout)
+            if self._state == CANCELLED:
+                raise CancelledError
+            if self._state != FINISHED:
+                raise TimeoutError
+
+    def result(self, timeout=None):
+        self._wait(timeout)
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self, timeout=None):
+        self._wait(timeout)
+        return self._exception
+
+
+class CancelToken(object):
+    """Cancels the queries it is passed to, from any thread."""
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
@@ -101,6 +101,143 @@ class TestDict(TestAccess):
         del data['title']
         eq_(g.data(), data)
 
+    def test_delete_path(self):
+        eq_(self.db.delete('$..title'), 2)
+        data = self.obj['glossary']
+        del data['title']
+        del data['GlossDiv']['title']
+        eq_(self.db.data(), self.obj)
+
+        eq_(self.db.delete('$.glossary.persons[?(@.name == "foo")]'), 1)
+        eq_(self.db['glossary']['persons'].data(), data['persons'][1:])
+
+        eq_(self.db.delete('$.notexists'), 0)
+
+    def test_delete_all(self):
+        eq_(self.db.delete('$.*'), 1)
+        eq_(self.db.data(), {})
+        self.db['glossary'] = 1
+        eq_(self.db.data(), {'glossary': 1})
+
+    def test_update_path(self):
+        data = self.obj['glossary']
+        persons = self.db['glossary']['persons']
+        eq_(self.db.update('$.glossary.persons.name', set='x'), 2)
+        eq_(persons.query('$.name').values(), ['x', 'x'])
+
+        eq_(self.db.update('$.glossary.persons.name', set=1), 2)
+        eq_(self.db.update('$.glossary.persons.name', incr=1), 2)
+        eq_(self.db.update('$.glossary.persons.tag', incr=1), 0)
+        eq_(persons[1].data(), {'name': 2, 'tag': ['b', 'B', 2]})
+
+        eq_(self.db.update('$.glossary.persons.name', incr=0.5), 2)
+        eq_(persons[0]['name'].data(), 2.5)
+
+        eq_(self.db.update('$.glossary.GlossDiv', set={'title': 'T'}), 1)
+        eq_(self.db['glossary']['GlossDiv'].data(), {'title': 'T'})
+
+        self.db['glossary'].update('$.title', func=lambda s: s.upper())
+        eq_(self.db['glossary']['title'].data(), data['title'].upper())
+
+        self.db.update('$.glossary.persons.tag', func=lambda tag: tag[:1])
+        eq_(persons.data(), [{'name': 2.5, 'tag': ['a']}, {'name': 2.5, 'tag': ['b']}])
+
+    def test_update_nested(self):
+        # The inner a is replaced with the outer one
+        self.db['r'] = {'a': {'a': 1}}
+        eq_(self.db.update('$..a', set={'b': 1}), 1)
+        eq_(self.db['r'].data(), {'a': {'b': 1}})
+
+        self.db['r'] = {'a': {'a': 1}}
+        eq_(self.db.update('$..a', set=2), 1)
+        eq_(self.db['r'].data(), {'a': 2})
+
+        self.db['r'] = {'a': {'a': 1}}
+        eq_(self.db.update('$..a', func=lambda a: [a]), 1)
+        eq_(self.db['r'].data(), {'a': [{'a': 1}]})
+
+    def test_update_args(self):
+        for kws in ({}, {'set': 1, 'incr': 1}):
+            try:
+                self.db.update('$.glossary.title', **kws)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(kws)
+        try:
+            self.db.update('$.glossary.title', incr='1')
+        except jsondb.UnsupportedTypeError:
+            pass
+        else:
+            raise AssertionError
+
+    def test_copy_path(self):
+        data = self.obj['glossary']
+        eq_(self.db.copy('$.glossary.persons[?(@.name == "bar")]', '$.glossary.persons'), 1)
+        eq_(self.db['glossary']['persons'].data(), data['persons'] + data['persons'][1:])
+
+        eq_(self.db.copy('$.glossary.GlossDiv.GlossList', '$.glossary'), 1)
+        eq_(self.db.copy('$.glossary.persons[0]', '$.glossary', key='first'), 1)
+        glossary = self.db['glossary']
+        eq_(glossary['GlossList'].data(), data['GlossDiv']['GlossList'])
+        eq_(glossary['first'].data(), data['persons'][0])
+        eq_(glossary['GlossDiv'].data(), data['GlossDiv'])
+
+        eq_(self.db.copy('$.glossary.notexists', '$.glossary'), 0)
+
+    def test_move_path(self):
+        data = self.obj['glossary']
+        eq_(self.db.move('$.glossary.GlossDiv.GlossList.GlossEntry.GlossDef', '$.glossary'), 1)
+        eq_(self.db.move('$.glossary.title', '$.glossary.persons'), 1)
+        data['GlossDef'] = data['GlossDiv']['GlossList']['GlossEntry'].pop('GlossDef')
+        data['persons'].append(data.pop('title'))
+        eq_(self.db.data(), self.obj)
+
+        # Replaces the member of the same key, even when it contains the node
+        eq_(self.db.move('$.glossary.GlossDiv.title', '$.glossary', key='GlossDiv'), 1)
+        eq_(self.db['glossary']['GlossDiv'].data(), 'S')
+
+    def test_copy_nested(self):
+        glossary = self.db['glossary']
+        outer, inner = glossary['GlossDiv'].root, glossary['GlossDiv']['GlossList'].root
+        glossary['archive'] = []
+        archive = glossary['archive']
+        new_outer, new_inner = self.db.backend.copy_trees([inner, outer], archive.root)
+        eq_(archive.data(), [self.obj['glossary']['GlossDiv']])
+        # Still inside the copy of its parent
+        key = self.db.backend.get_row(new_inner)['parent']
+        eq_(self.db.backend.get_row(key)['parent'], new_outer)
+
+        glossary['nest'] = {'a': {'x': 1, 'a': {'y': 2}}}
+        eq_(len(self.db.query('$.glossary..a').values()), 2)
+        eq_(self.db.copy('$.glossary..a', '$.glossary.archive'), 1)
+        eq_(archive.data()[1:], [{'x': 1, 'a': {'y': 2}}])
+
+    def test_copy_same_key(self):
+        try:
+            self.db.copy('$..title', '$.glossary.persons[0]')
+        except jsondb.UnsupportedOperation:
+            pass
+        else:
+            raise AssertionError('not raised')
+        eq_(self.db.data(), self.obj)
+
+        eq_(self.db.copy('$..title', '$.glossary.persons[0].tag'), 2)
+        eq_(sorted(self.db['glossary']['persons'][0]['tag'].data()[3:]), ['S', 'example glossary'])
+
+    def test_move_errors(self):
+        for args, kws, error in ((('$.glossary', '$.glossary.persons'), {}, jsondb.UnsupportedOperation),
+                                 (('$.glossary.persons', '$.glossary.title'), {}, jsondb.IllegalTypeError),
+                                 (('$.glossary.persons[0]', '$.glossary'), {}, jsondb.UnsupportedOperation),
+                                 (('$.glossary.persons.name', '$.glossary'), {'key': 'name'}, jsondb.UnsupportedOperation)):
+            try:
+                self.db.move(*args, **kws)
+            except error:
+                pass
+            else:
+                raise AssertionError(args)
+        eq_(self.db.data(), self.obj)
+
     def test_dict_set(self):
         self.db['glossary']['count'] = 1
         eq_(self.db['glossary']['count'].data(), 1)
@@ -180,6 +317,15 @@ class TestList(TestAccess):
         eq_(max(self.db['glossary']['numbers']).data(), 9)
         eq_(min(self.db['glossary']['numbers']).data(), 0)
 
+    def test_list_imul(self):
+        persons = self.db['glossary']['persons']
+        persons *= 3
+        eq_(persons.data(), self.obj['glossary']['persons'] * 3)
+        persons.append('last')
+        eq_(persons[-1].data(), 'last')
+        persons *= 0
+        eq_(persons.data(), [])
+
     def test_list_delete(self):
         persons = self.db['glossary']['persons']
         del persons[0]
@@ -188,7 +334,9 @@ class TestList(TestAccess):
     def test_list_delete_range(self):
         tags = self.db['glossary']['persons'][-1]['tag']
         del tags[1:-1]
-        eq_(tags.data(), self.obj['glossary']['persons'][-1]['tag'][::1])
+        obj_tags = self.obj['glossary']['persons'][-1]['tag'][:]
+        del obj_tags[1:-1]
+        eq_(tags.data(), obj_tags)
 
     def test_list_contains(self):
         tags = self.db['glossary']['persons'][-1]['tag']
@@ -247,6 +395,27 @@ class TestInteger(TestAccess):
         self.vl += i
         eq_(self.num, self.vl)
 
+    def test_int_iadd_float(self):
+        self.num += 0.5
+        self.vl += 0.5
+        eq_(self.num, self.vl)
+        eq_(self.db['glossary']['persons'][0]['tag'][-1].data(), self.vl)
+
+    def test_int_iadd_concurrent(self):
+        # Two handles on the same file, both with the value cached.
+        self.db.commit()
+        other = jsondb.load(self.db.get_path())
+        try:
+            num = other['glossary']['persons'][0]['tag'][-1]
+            eq_(num.data(), self.vl)
+            self.num += 1
+            self.db.commit()
+            num += 1
+            other.commit()
+            eq_(num, self.vl + 2)
+        finally:
+            other.close()
+
     def test_int_isub(self):
         i = 2
         self.num -= i
@@ -353,6 +522,11 @@ class TestString(TestAccess):
         self.v += 'foo'
         eq_(self.s, self.v)
 
+    def test_iadd_unicode(self):
+        self.s += u'\xe9'
+        self.v += u'\xe9'
+        eq_(self.s.data().decode('utf-8'), self.v)
+
     def test_imul(self):
         self.s *= 3
         self.v *= 3
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.tests
+    ~~~~~~~~~~~~
+
+    Tests for AsyncJsonDB.
+"""
+
+import os
+import tempfile
+import threading
+
+import jsondb
+from jsondb import AsyncJsonDB
+from nose.tools import eq_
+
+
+class TestAsync:
+    def setup(self):
+        fd, self.path = tempfile.mkstemp(suffix='.jsondb')
+        os.close(fd)
+        self.obj = {'items': [{'id': i, 'name': 'item%s' % i} for i in range(25)]}
+        db = jsondb.create(self.obj, url=self.path)
+        db.close()
+        self.db = AsyncJsonDB(self.path, chunk_size=10)
+
+    def teardown(self):
+        self.db.close()
+        os.remove(self.path)
+
+    def test_query(self):
+        result = self.db.query('$.items.name').result()
+        chunks = []
+        while True:
+            chunk = result.fetch().result()
+            if not chunk:
+                break
+            chunks.append(chunk)
+        eq_([len(x) for x in chunks], [10, 10, 5])
+        eq_(sum(chunks, []), [x['name'] for x in self.obj['items']])
+
+    def test_values(self):
+        result = self.db.query('$.items[?(@.id < 3)].id').result()
+        eq_(result.values().result(), [0, 1, 2])
+        eq_(list(self.db.query('$.items.id').result()), range(25))
+
+    def test_get(self):
+        eq_(self.db.get('items').result(), self.obj['items'])
+        eq_(self.db.get('nonexists', 'notfound').result(), 'notfound')
+
+    def test_feed(self):
+        self.db.feed({'name': 'foo'}).result()
+        self.db.commit().result()
+        eq_(self.db.get('name').result(), 'foo')
+
+        db = jsondb.load(self.path)
+        eq_(db['name'].data(), 'foo')
+        db.close()
+
+    def test_cancel(self):
+        result = self.db.query('$.items.name').result()
+        eq_(len(result.fetch().result()), 10)
+        result.cancel()
+        eq_(result.fetch().cancelled(), True)
+
+    def test_callback(self):
+        done = []
+        event = threading.Event()
+
+        def callback(future):
+            done.append(future.result())
+            event.set()
+
+        self.db.get('items').add_done_callback(callback)
+        event.wait(5)
+        eq_(done, [self.obj['items']])
@@ -0,0 +1,448 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.tests
+    ~~~~~~~~~~~~
+
+    Tests for the sqlite3 backend options.
+"""
+
+import os
+import tempfile
+import sqlite3
+import threading
+
+import jsondb
+from nose.tools import eq_, raises
+
+
+def get_tempurl():
+    fd, path = tempfile.mkstemp(suffix='.jsondb')
+    os.close(fd)
+    return path
+
+
+def pragma(db, name):
+    return db.backend.conn.execute('PRAGMA %s' % name).fetchone()[0]
+
+
+class TestProfile:
+    def setup(self):
+        self.path = get_tempurl()
+
+    def teardown(self):
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+    def test_default(self):
+        db = jsondb.create({'a': 1}, url=self.path)
+        eq_(pragma(db, 'journal_mode'), 'memory')
+        eq_(pragma(db, 'synchronous'), 0)
+        db.close()
+
+    def test_durable(self):
+        db = jsondb.create({'a': 1}, url=self.path, profile='durable')
+        eq_(pragma(db, 'journal_mode'), 'wal')
+        eq_(pragma(db, 'synchronous'), 2)
+        db.close()
+
+        db = jsondb.load(self.path, profile='durable')
+        eq_(db.data(), {'a': 1})
+        db.close()
+
+    def test_pragmas(self):
+        db = jsondb.create({'a': 1}, url=self.path, profile='concurrent', pragmas={'cache_size': -1000})
+        eq_(pragma(db, 'journal_mode'), 'wal')
+        eq_(pragma(db, 'cache_size'), -1000)
+        db.close()
+
+    @raises(ValueError)
+    def test_unknown(self):
+        jsondb.create({}, url=self.path, profile='nonexists')
+
+
+class TestReadonly:
+    def setup(self):
+        self.path = get_tempurl()
+        self.obj = {'a': 1, 'b': [1, 2], 'c': {'d': 'foo'}}
+        db = jsondb.create(self.obj, url=self.path)
+        db.close()
+
+    def teardown(self):
+        os.remove(self.path)
+
+    def test_read(self):
+        db = jsondb.load(self.path, readonly=True)
+        eq_(db.data(), self.obj)
+        eq_(db.query('$.c.d').values(), ['foo'])
+        eq_(pragma(db, 'query_only'), 1)
+        db.close()
+
+    def test_shared(self):
+        dbs = [jsondb.load(self.path, readonly=True, immutable=True) for i in range(3)]
+        for db in dbs:
+            eq_(db['a'].data(), 1)
+        for db in dbs:
+            db.close()
+
+    @raises(sqlite3.OperationalError)
+    def test_write(self):
+        db = jsondb.load(self.path, readonly=True)
+        try:
+            db['a'] = 2
+        finally:
+            db.close()
+
+
+class TestGroupCommit:
+    def setup(self):
+        self.path = get_tempurl()
+        self.db = jsondb.create({'items': []}, url=self.path, group_commit=True)
+        self.items = self.db['items']
+
+    def teardown(self):
+        self.db.close()
+        os.remove(self.path)
+
+    def test_threads(self):
+        def work(n):
+            for i in range(20):
+                self.items.feed({'thread': n, 'i': i})
+
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        eq_(len(self.items), 100)
+        for n in range(5):
+            eq_(self.db.query('$.items[?(@.thread = %s)].i' % n).values(), range(20))
+
+    def test_futures(self):
+        futures = [self.items.feed_async({'i': i}) for i in range(10)]
+        for future in futures:
+            future.result()
+        eq_(self.items.data(), [{'i': i} for i in range(10)])
+
+    def test_error(self):
+        future = self.items.feed_async('x', parent=12345)
+        eq_(isinstance(future.exception(), TypeError), True)
+        self.items.feed({'i': 1})
+        eq_(self.items.data(), [{'i': 1}])
+
+    def test_mixed(self):
+        def work(n):
+            for i in range(20):
+                self.items.feed({'thread': n, 'i': i})
+
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(3)]
+        for t in threads:
+            t.start()
+        for i in range(20):
+            self.db['count'] = i
+            self.db['tags'] = {'a': [i]}
+            self.db['tags']['a'][0] = 'x'
+            del self.db['tags']['a']
+        self.db['flag'] = 1
+        self.db['flag'] = 'on'
+        for t in threads:
+            t.join()
+
+        eq_(len(self.items), 60)
+        eq_((self.db['count'].data(), self.db['tags'].data(), self.db['flag'].data()), (19, {}, 'on'))
+        self.items *= 0
+        eq_(self.items.data(), [])
+
+    def test_abort(self):
+        # An error rolling back the whole transaction fails its batch, not the writer
+        def abort(backend):
+            backend.conn.execute('insert or rollback into jsondata (id, parent, type) values (-1, -2, 0)')
+        future = self.db.backend.writer.submit(abort)
+        eq_(isinstance(future.exception(5), sqlite3.IntegrityError), True)
+        eq_(self.db.backend.writer.thread.is_alive(), True)
+        self.items.feed({'i': 1})
+        eq_(self.items.data(), [{'i': 1}])
+
+    def test_restart(self):
+        # A writer which died is started again by the next submit
+        from jsondb.backends.writer import GroupCommitWriter
+        go, failed = threading.Event(), threading.Event()
+        def factory():
+            if not failed.is_set():
+                go.wait()
+                failed.set()
+                raise IOError('first start')
+            return jsondb.backends.create(self.path, overwrite=False)
+        writer = GroupCommitWriter(factory)
+        first = writer.submit(lambda backend: 1)
+        thread = writer.thread
+        go.set()
+        thread.join()
+        eq_(writer.thread, None)
+        eq_(writer.submit(lambda backend: 2).result(5), 2)
+        eq_(first.result(), 1)
+        writer.stop()
+
+
+class TestQueryControl:
+    def setup(self):
+        self.db = jsondb.create({'items': [{'name': 'item%s' % i, 'tags': {'name': i}} for i in range(200)]})
+
+    def teardown(self):
+        self.db.close()
+
+    def test_progress(self):
+        calls = []
+        rslt = self.db.query('$..name', progress=lambda steps, rows: calls.append((steps, rows)))
+        eq_(len(rslt.values()), 400)
+        eq_(len(calls) > 0, True)
+        eq_(calls[-1][0] > calls[0][0], True)
+
+    @raises(jsondb.CancelledError)
+    def test_cancel(self):
+        token = jsondb.CancelToken()
+        self.db.query('$..name', progress=lambda steps, rows: token.cancel(), cancel=token).values()
+
+    @raises(jsondb.TimeoutError)
+    def test_timeout(self):
+        self.db.query('$..name', timeout=0).values()
+
+    def test_no_timeout(self):
+        eq_(len(self.db.query('$..name', timeout=60).values()), 400)
+
+
+class TestTrace:
+    def setup(self):
+        self.db = jsondb.create({'items': [{'name': 'item%s' % i} for i in range(10)]}, trace=True)
+        self.db.stats(reset=True)
+
+    def teardown(self):
+        self.db.close()
+
+    def test_stats(self):
+        eq_(len(self.db['items']), 10)
+        self.db.query('$.items.name').values()
+        stats = self.db.stats()
+        eq_(sorted(stats['operations']), ['__getitem__', '__len__', 'query'])
+        eq_(stats['operations']['__len__']['statements'], 1)
+        eq_(stats['operations']['query']['calls'], 1)
+        eq_(stats['statements'], sum(op['statements'] for op in stats['operations'].values()))
+        eq_(stats['queries']['select count(id) as count from jsondata where parent = ?']['rows'], 1)
+
+    def test_reset(self):
+        self.db['items']
+        eq_(self.db.stats(reset=True)['statements'] > 0, True)
+        eq_(self.db.stats()['statements'], 0)
+
+    def test_lazy(self):
+        rslt = self.db.query('$.items.name')
+        for node in rslt:
+            node.data()
+        stats = self.db.stats()
+        eq_(sorted(stats['operations']), ['data', 'query'])
+        eq_(stats['operations']['data']['calls'], 10)
+        eq_(stats['operations']['query']['calls'], 1)
+
+    def test_capture(self):
+        with self.db.capture(keep=True) as tracer:
+            self.db['items'][0]
+        eq_(tracer.count, len(tracer.log))
+        eq_(tracer.count > 0, True)
+        self.db['items']
+        eq_(tracer.count, len(tracer.log))
+
+    @raises(jsondb.UnsupportedOperation)
+    def test_not_traced(self):
+        db = jsondb.create({})
+        try:
+            db.stats()
+        finally:
+            db.close()
+
+    def test_threads(self):
+        # A call in one thread does not take over the statements of another
+        started, done = threading.Event(), threading.Event()
+        def work():
+            tracer.begin('work')
+            started.set()
+            done.wait()
+            tracer.end('work', 0)
+        tracer = self.db.backend.tracers[0]
+        thread = threading.Thread(target=work)
+        thread.start()
+        started.wait()
+        try:
+            eq_(tracer.operation, 'other')
+            self.db['items']
+        finally:
+            done.set()
+            thread.join()
+        stats = self.db.stats()
+        eq_(stats['operations']['__getitem__']['statements'] > 0, True)
+        eq_(stats['operations']['work']['statements'], 0)
+
+    def test_normalize(self):
+        from jsondb.tracing import normalize
+        eq_(normalize("select id from jsondata where parent in (1, 2) and value = 'it''s'"),
+            'select id from jsondata where parent in (...) and value = ?')
+
+
+class TestExplain:
+    def setup(self):
+        fpath = os.path.join(os.path.dirname(__file__), 'bookstore.json')
+        self.db = jsondb.from_file(fpath)
+
+    def teardown(self):
+        self.db.close()
+
+    def test_explain(self):
+        rslt = self.db.explain('$.store.book[?(@.price < 10)].title')
+        eq_(rslt['path'], '$.store.book[?(@.price < 10)].title')
+        eq_(rslt['rows'], 2)
+        eq_(len(rslt['ast']['jsonpath']), 3)
+        sqls = [x['sql'] for x in rslt['statements']]
+        eq_(len(sqls), len(set(sqls)))
+        for statement in rslt['statements']:
+            eq_(len(statement['plan']) > 0, True)
+            eq_(statement['full_scan'], [])
+
+    def test_full_scan(self):
+        rslt = self.db.explain('$..price')
+        eq_(rslt['rows'], 5)
+        eq_(any(x['full_scan'] for x in rslt['statements']), True)
+        # The ancestors of each candidate are looked up one by one.
+        counts = [x['count'] for x in rslt['statements'] if x['sql'].startswith('select parent')]
+        eq_(counts[0] > 1, True)
+
+    def test_temp_btree(self):
+        plan = self.db.backend.explain('select * from jsondata order by value')
+        eq_(plan['full_scan'], ['jsondata'])
+        eq_(plan['temp_btree'], True)
+        plan = self.db.backend.explain('select * from jsondata where id = ?', (1,))
+        eq_(plan['full_scan'], [])
+        eq_(plan['temp_btree'], False)
+
+
+class TestSlowLog:
+    def setup(self):
+        self.records = []
+        self.db = jsondb.create({'items': [{'name': 'item%s' % i} for i in range(10)]})
+
+    def teardown(self):
+        self.db.close()
+
+    def set_slowlog(self, threshold=0, **kws):
+        from jsondb.slowlog import SlowLog
+        self.db.backend.set_slowlog(SlowLog(threshold, sink=self.records.append, **kws))
+
+    def test_query(self):
+        self.set_slowlog()
+        rslt = self.db.query('$.items.name')
+        eq_(self.records, [])
+        for node in rslt:
+            pass
+        eq_(len(self.records), 1)
+        record = self.records[0]
+        eq_(record['operation'], 'query')
+        eq_(record['path'], '$.items.name')
+        eq_(record['parent'], -1)
+        eq_(record['rows'], 10)
+        eq_(record['statements'] > 0, True)
+        eq_(len(record['sql']), record['statements'])
+
+    def test_feed_data(self):
+        self.set_slowlog()
+        self.db.feed({'foo': [1, 2]})
+        self.db.data()
+        eq_([x['operation'] for x in self.records], ['feed', 'data'])
+
+    def test_threshold(self):
+        self.set_slowlog(60)
+        self.db.query('$.items.name').values()
+        self.db.data()
+        eq_(self.records, [])
+
+    def test_rate_limit(self):
+        self.set_slowlog(burst=2, rate=0.001, max_statements=1)
+        for i in range(5):
+            self.db.data()
+        eq_(len(self.records), 2)
+        eq_([len(x['sql']) for x in self.records], [1, 1])
+        self.db.backend.slowlog.tokens = 1
+        self.db.data()
+        eq_(self.records[-1]['suppressed'], 3)
+
+    def test_threads(self):
+        # A call in one thread does not take over the statements of another
+        self.set_slowlog()
+        slowlog = self.db.backend.slowlog
+        started, done = threading.Event(), threading.Event()
+        def work():
+            started.set()
+            done.wait()
+        call = slowlog.start('work')
+        thread = threading.Thread(target=slowlog.run, args=(call, work))
+        thread.start()
+        started.wait()
+        try:
+            eq_(slowlog.current, None)
+            self.db.data()
+        finally:
+            done.set()
+            thread.join()
+        eq_(call.count, 0)
+        eq_([x['operation'] for x in self.records], ['data'])
+
+    def test_option(self):
+        db = jsondb.create({}, slow_log=0.5)
+        eq_(db.backend.slowlog.threshold, 0.5)
+        db.backend.set_slowlog(None)
+        eq_(db.backend.tracers, [])
+        db.close()
+
+
+class TestHooks:
+    def setup(self):
+        self.db = jsondb.create({'items': [{'name': 'item%s' % i} for i in range(10)]})
+        self.calls = []
+
+    def teardown(self):
+        self.db.close()
+
+    def test_hooks(self):
+        befores = []
+        hook = self.db.backend.add_hook(before=lambda call: befores.append(call.name),
+                                        after=self.calls.append)
+        self.db['items'][0]['name'].data()
+        eq_(sorted(befores), sorted(call.name for call in self.calls))
+        eq_('get_row' in befores, True)
+        for call in self.calls:
+            eq_(call.error, None)
+            eq_(call.elapsed >= 0, True)
+
+        self.db.backend.remove_hook(hook)
+        eq_([name for name in ('get_row', 'jsonpath') if name in self.db.backend.__dict__], [])
+        del self.calls[:]
+        self.db['items']
+        eq_(self.calls, [])
+
+    def test_methods(self):
+        self.db.backend.add_hook(after=self.calls.append, methods=['jsonpath'])
+        self.db.query('$.items.name').values()
+        eq_([call.name for call in self.calls], ['jsonpath'])
+        eq_(self.calls[0].result, 10)
+
+    def test_error(self):
+        self.db.backend.add_hook(after=self.calls.append, methods=['set_row'])
+        try:
+            self.db.backend.set_row(-1, 'no such type', [])
+        except Exception as e:
+            eq_(self.calls[0].error, e)
+        else:
+            raise Exception('not raised')
+
+    @raises(ValueError)
+    def test_unknown(self):
+        self.db.backend.add_hook(after=self.calls.append, methods=['nonexists'])
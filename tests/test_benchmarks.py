@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.tests
+    ~~~~~~~~~~~~
+
+    Tests for the benchmark suite.
+"""
+
+import shutil
+import tempfile
+
+from benchmarks import generate, suite, compare
+from nose.tools import eq_
+
+
+def test_generate():
+    eq_(generate.bookstore(10), generate.bookstore(10))
+    eq_(len(generate.bookstore(10)['store']['book']), 10)
+    eq_(len(generate.many_keys(50)), 50)
+    eq_(sorted(generate.shapes(0.01)), ['bookstore', 'deep', 'long_list', 'many_keys', 'wide'])
+
+
+def test_run():
+    workdir = tempfile.mkdtemp()
+    try:
+        results = suite.run(workdir, scale=0.01, repeat=2, match='query/')
+    finally:
+        shutil.rmtree(workdir)
+    eq_(sorted(results['results']), sorted('query/%s/%s' % (shape, name) for shape, name, path in suite.QUERIES))
+    for summary in results['results'].values():
+        eq_(len(summary['runs']), 2)
+        assert summary['min'] <= summary['median']
+
+
+def test_compare():
+    before = {'results': {'a': {'min': 1.0}, 'b': {'min': 1.0}, 'c': {'error': 'failed'}}}
+    after = {'results': {'a': {'min': 1.05}, 'b': {'min': 1.5}, 'c': {'min': 1.0}}}
+    rows = compare.compare(before, after, threshold=0.1)
+    eq_([(row[0], row[-1]) for row in rows], [('a', False), ('b', True)])
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.tests
+    ~~~~~~~~~~~~
+
+    Tests for the change log and the watchers.
+"""
+
+import os
+import tempfile
+from itertools import groupby
+
+import jsondb
+from nose.tools import eq_, raises
+
+
+class TestChanges:
+    def setup(self):
+        fd, self.path = tempfile.mkstemp(suffix='.jsondb')
+        os.close(fd)
+        self.obj = {'store': {'book': [{'title': 'a'}, {'title': 'b'}], 'bicycle': {'color': 'red'}}, 'tags': []}
+        self.db = jsondb.create(self.obj, url=self.path, changelog=True)
+        self.seq = max(change['seq'] for change in self.db.changes())
+
+    def teardown(self):
+        self.db.close()
+        os.remove(self.path)
+
+    def ops(self, since=None):
+        return [(change['op'], change['id']) for change in self.db.changes(self.seq if since is None else since)]
+
+    def test_changes(self):
+        eq_(len(list(self.db.changes())), 17)
+
+        color = self.db['store']['bicycle']['color']
+        color.set_value(color.root, 'blue')
+        eq_(self.ops(), [('update', color.root)])
+
+        book = self.db['store']['book']
+        first = book[0].root
+        del book[0]
+        # The element, its key and the title
+        deleted = self.ops()[1:]
+        eq_([op for op, id in deleted], ['delete'] * 3)
+        eq_(first in [id for op, id in deleted], True)
+
+        seq = max(change['seq'] for change in self.db.changes())
+        self.db['tags'].append('x')
+        changes = list(self.db.changes(seq))
+        eq_(len(changes), 1)
+        eq_(changes[0]['op'], 'insert')
+        eq_(changes[0]['parent'], self.db['tags'].root)
+
+    def test_commit_seq(self):
+        # The root, then the rest of the data
+        eq_(sorted(set(change['commit_seq'] for change in self.db.changes())), [1, self.seq])
+
+        self.db['tags'].append('x')
+        self.db['store']['bicycle']['color'] = 'blue'
+        self.db.commit()
+        first = self.db.backend.get_change_seq()
+        self.db['tags'].append('y')
+        self.db.commit()
+
+        groups = [(commit_seq, len(list(changes)))
+                  for commit_seq, changes in groupby(self.db.changes(self.seq), lambda change: change['commit_seq'])]
+        eq_([commit_seq for commit_seq, count in groups], [first, self.db.backend.get_change_seq()])
+        eq_(groups[1][1], 1)
+
+    def test_kept(self):
+        self.db.close()
+        self.db = jsondb.load(self.path)
+        self.db['tags'].append(1)
+        eq_([op for op, id in self.ops()], ['insert'])
+
+        self.db.backend.trim_changes(self.seq + 1)
+        eq_(list(self.db.changes()), [])
+
+    @raises(jsondb.UnsupportedOperation)
+    def test_no_changelog(self):
+        self.db.close()
+        self.db = jsondb.create({}, url=self.path)
+        list(self.db.changes())
+
+    def test_watch(self):
+        calls = []
+        watcher = self.db.watch('$.store.book', calls.append)
+        tags = []
+        self.db['tags'].watch('$.*', tags.append)
+
+        self.db['store']['bicycle']['color'] = 'blue'
+        self.db['tags'].append('x')
+        self.db.commit()
+        eq_(calls, [])
+        eq_(len(tags), 1)
+
+        book = self.db['store']['book']
+        book[1]['title'] = 'B'
+        del book[0]
+        self.db.commit()
+        eq_(len(calls), 1)
+        eq_(set(change['op'] for change in calls[0]), set(['insert', 'delete']))
+
+        self.db.commit()
+        eq_(len(calls), 1)
+
+        self.db.unwatch(watcher)
+        book.append({'title': 'c'})
+        self.db.commit()
+        eq_(len(calls), 1)
+
+    def test_watch_deleted(self):
+        books, bicycle = [], []
+        self.db.watch('$.store.book', books.append)
+        self.db.watch('$.store.bicycle', bicycle.append)
+
+        del self.db['store']['book']
+        self.db.commit()
+        eq_(len(books), 1)
+        eq_(set(change['op'] for change in books[0]), set(['delete']))
+        eq_(bicycle, [])
+
+        self.db.delete('$.store.bicycle')
+        self.db.commit()
+        eq_(len(bicycle), 1)
+        eq_(len(books), 1)
+
+        # Matched again once added back
+        self.db['store']['book'] = []
+        self.db.commit()
+        eq_(len(books), 2)
+        self.db['store']['book'].append({'title': 'c'})
+        self.db.commit()
+        eq_(len(books), 3)
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.tests
+    ~~~~~~~~~~~~
+
+    Tests for the hashes of the nodes and diff.
+"""
+
+import os
+import glob
+import tempfile
+
+import jsondb
+import jsondb.testing
+from nose.tools import eq_
+
+
+class TestDigest:
+    def setup(self):
+        self.paths = []
+        self.obj = {
+            'store': {
+                'book': [{'title': 'a', 'price': 8.95}, {'title': u'b\xe9', 'price': 12}],
+                'bicycle': {'color': 'red', 'price': 19.95, 'sold': False},
+            },
+            'tags': ['x', None, 1.5],
+        }
+
+    def teardown(self):
+        for path in self.paths:
+            for name in glob.glob(path + '*'):
+                os.remove(name)
+
+    def create(self, data, sharded=False, **kws):
+        fd, path = tempfile.mkstemp(suffix='.jsondb')
+        os.close(fd)
+        self.paths.append(path)
+        if sharded:
+            os.remove(path)
+            path = 'sharded://%s?shards=3&range=1' % path
+        return jsondb.create(data, url=path, **kws)
+
+    def test_equal(self):
+        digest = self.create(self.obj, hashes=True).digest()
+        eq_(self.create(self.obj).digest(), digest)
+        eq_(self.create(self.obj, sharded=True, hashes=True).digest(), digest)
+
+        other = dict(self.obj, tags=['x', None, 1.5])
+        other['store'] = {'bicycle': self.obj['store']['bicycle'], 'book': self.obj['store']['book']}
+        eq_(self.create(other, hashes=True).digest(), digest)
+
+        eq_(self.create([1, u'\xe9']).digest(), self.create([1.0, '\xc3\xa9']).digest())
+        for a, b in (([1], [True]), ([0], [None]), (['1'], [1]), ([1, 2], [2, 1]), ({'a': [1]}, {'a': 1})):
+            eq_(self.create(a).digest() != self.create(b).digest(), True)
+
+    def test_changes(self):
+        for sharded in (False, True):
+            db = self.create(self.obj, sharded=sharded, hashes=True)
+            digest = db.digest()
+            bicycle = db['store']['bicycle']
+            color = bicycle.digest()
+            book = db['store']['book'].digest()
+
+            bicycle['color'] = 'blue'
+            eq_(db.digest() != digest, True)
+            eq_(bicycle.digest() != color, True)
+            eq_(db['store']['book'].digest(), book)
+
+            bicycle['color'] = 'red'
+            eq_(db.digest(), digest)
+
+            db['tags'].append(2)
+            eq_(db.digest() != digest, True)
+            del db['tags'][3]
+            eq_(db.digest(), digest)
+
+            db.update('$..price', incr=1)
+            db.move('$.store.bicycle', '$.tags')
+            eq_(db.digest(), self.create(db.data()).digest())
+
+    def test_incremental(self):
+        db = self.create(self.obj, hashes=True)
+        db.digest()
+        db.commit()
+        db['store']['book'][1]['price'] = 13
+        db.commit()
+        # Only the 7 ancestors of the price are hashed again: one statement
+        # reads them with their 5 other children. Nothing is written.
+        changes = db.backend.conn.total_changes
+        with db.capture() as tracer:
+            db.digest()
+        eq_(tracer.count, 1)
+        eq_(tracer.stats()['operations']['digest']['rows'], 12)
+        eq_(db.backend.conn.total_changes, changes)
+
+        # The hashes are stored on commit
+        db.commit()
+        with db.capture() as tracer:
+            db.digest()
+        eq_(tracer.stats()['operations']['digest']['rows'], 1)
+
+    def test_readonly(self):
+        db = self.create(self.obj, hashes=True)
+        digest = db.digest()
+        db['tags'].append(1)
+        db.commit()
+        other = jsondb.load(db.get_path(), readonly=True)
+        eq_(other.digest() != digest, True)
+        eq_(other['store'] == db['store'], True)
+        # The writer is not blocked by the reader
+        db['tags'].append(2)
+        db.commit()
+        other.close()
+
+    def test_kept(self):
+        db = self.create(self.obj, hashes=True)
+        path = db.get_path()
+        digest = db.digest()
+        db['tags'] = []
+        db.close()
+
+        db = jsondb.load(path)
+        eq_(db.backend.hashes, True)
+        eq_(db.digest() != digest, True)
+        db['tags'] = self.obj['tags']
+        eq_(db.digest(), digest)
+        db.close()
+
+        db = jsondb.create({}, url=path)
+        eq_(db.backend.hashes, False)
+        db.close()
+
+    def test_cmp(self):
+        a = self.create(self.obj, hashes=True)
+        b = self.create(self.obj, hashes=True)
+        eq_(a['store'], b['store'])
+        with a.capture() as tracer:
+            eq_(a['store'] == b['store'], True)
+        eq_('data' in tracer.stats()['operations'], False)
+        eq_(a['tags'] == b['store']['book'], False)
+
+    def test_diff(self):
+        for hashes in (False, True):
+            a = self.create(self.obj, hashes=hashes)
+            eq_(list(a.diff(self.create(self.obj, hashes=hashes))), [])
+
+            obj = {
+                'store': {
+                    'book': [{'title': 'a', 'price': 9.95}, {'title': u'b\xe9', 'price': 12}, {'title': 'c'}],
+                    'bicycle': {'color': 'red', 'price': 19.95, 'sold': True, 'new': [1]},
+                },
+                'tags': 'x',
+                'a/b': 1,
+            }
+            ops = list(a.diff(self.create(obj, hashes=hashes)))
+            eq_(sorted(op['path'] for op in ops),
+                ['/a~1b', '/store/bicycle/new', '/store/bicycle/sold', '/store/book/-', '/store/book/0/price', '/tags'])
+            a.patch(ops)
+            eq_(a.data(), self.create(obj).data())
+
+            ops = list(a['store']['book'].diff(self.create([{'title': 'a'}])))
+            eq_(ops, [{'op': 'remove', 'path': '/0/price'},
+                      {'op': 'remove', 'path': '/1'}, {'op': 'remove', 'path': '/1'}])
+
+    def test_diff_files(self):
+        a = self.create(self.obj)
+        b = self.create(self.obj, sharded=True)
+        b['store']['book'][0]['title'] = 'A'
+        b['store']['bicycle']['color'] = 'red'
+        b['store']['bicycle']['gears'] = 7
+        b['tags'] = {'x': None}
+        a.close()
+        b.close()
+
+        ops = list(jsondb.diff(a.get_path(), b.get_url()))
+        eq_(ops, [{'op': 'add', 'path': '/store/bicycle/gears', 'value': 7},
+                  {'op': 'replace', 'path': '/store/book/0/title', 'value': 'A'},
+                  {'op': 'replace', 'path': '/tags', 'value': {'x': None}}])
+
+        eq_(list(jsondb.diff(a.get_path(), a.get_path())), [])
+
+        # A cursor per list or dict compared on each side, a statement per shard for the root
+        a, b = jsondb.load(a.get_path()), jsondb.load(b.get_url())
+        with jsondb.testing.assert_max_queries(17):
+            eq_(len(list(jsondb.diff(b, a))), 3)
+        a.close()
+        b.close()
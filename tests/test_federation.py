@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.tests
+    ~~~~~~~~~~~~
+
+    Tests for queries across several dbs.
+"""
+
+import os
+import tempfile
+
+import jsondb
+from jsondb.tracing import Tracer
+from nose.tools import eq_
+
+
+class TestFederation:
+    def setup(self):
+        self.paths = []
+        for day in range(3):
+            fd, path = tempfile.mkstemp(suffix='.jsondb')
+            os.close(fd)
+            db = jsondb.create({'day': day, 'events': [
+                {'level': 'error' if i % 2 else 'info', 'msg': 'day%s-%s' % (day, i), 'tags': {'name': i}}
+                for i in range(4)]}, url=path)
+            db.close()
+            self.paths.append(path)
+        self.dbs = jsondb.federate(self.paths)
+
+    def teardown(self):
+        self.dbs.close()
+        for path in self.paths:
+            os.remove(path)
+
+    def test_query(self):
+        rslt = self.dbs.values('$.day')
+        eq_([value for source, value in rslt], [0, 1, 2])
+        eq_([source for source, value in rslt], ['sqlite3://%s' % path for path in self.paths])
+
+    def test_predicate(self):
+        rslt = self.dbs.values('$.events[?(@.level = "error")].msg')
+        eq_([value for source, value in rslt], ['day0-1', 'day0-3', 'day1-1', 'day1-3', 'day2-1', 'day2-3'])
+
+    def test_descendant(self):
+        rslt = self.dbs.values('$..name')
+        eq_([value for source, value in rslt], range(4) * 3)
+
+    def test_nodes(self):
+        rslt = list(self.dbs.query('$.events[0]'))
+        eq_([source for source, node in rslt], ['sqlite3://%s' % path for path in self.paths])
+        for source, node in rslt:
+            eq_(node['level'].data(), 'info')
+            eq_(len(node), 3)
+
+    def test_index(self):
+        rslt = self.dbs.values('$.events[-1].msg')
+        eq_([value for source, value in rslt], ['day0-3', 'day1-3', 'day2-3'])
+        rslt = self.dbs.values('$.events[1:3].msg')
+        eq_([value for source, value in rslt], ['day0-1', 'day0-2', 'day1-1', 'day1-2', 'day2-1', 'day2-2'])
+        rslt = self.dbs.values('$.events[0,2].tags.name')
+        eq_([value for source, value in rslt], [0, 2] * 3)
+
+    def test_plan(self):
+        # Every step is a statement on the table of one db, searched by its indexes
+        tracer = Tracer(keep=True)
+        for db in self.dbs.backend.dbs:
+            db.add_tracer(tracer)
+        self.dbs.values('$.events[?(@.level = "error")].msg')
+        eq_(tracer.count > 0, True)
+        for sql, params in list(tracer.log):
+            eq_(self.dbs.backend.dbs[0].explain(sql, params)['full_scan'], [])
+
+    def test_timeout(self):
+        rslt = self.dbs.values('$.events.msg', timeout=60)
+        eq_(len(rslt), 12)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.tests
+    ~~~~~~~~~~~~
+
+    Tests for the parallel import.
+"""
+
+import os
+import json
+from StringIO import StringIO
+
+import jsondb
+from jsondb import importer
+from jsondb.datatypes import *
+from jsondb.error import IllegalTypeError
+from nose.tools import eq_, raises
+
+
+class TestSplit:
+    def split(self, text, blocksize):
+        return list(importer.split(StringIO(text), blocksize=blocksize))
+
+    def test_list(self):
+        obj = [1, "a,b", {"x": [1, 2, "]"]}, [], 'q"uote', None, '\\', 'tail\\']
+        text = json.dumps(obj)
+        for blocksize in (1, 2, 3, 7, 100):
+            rslt = self.split(text, blocksize)
+            eq_(rslt[0], LIST)
+            eq_([json.loads(x) for x in rslt[1:]], obj)
+
+    def test_dict(self):
+        obj = {"a": 1, "b,": [1, {"c": "}"}], "d": {}}
+        text = json.dumps(obj)
+        for blocksize in (1, 5, 100):
+            rslt = self.split(text, blocksize)
+            eq_(rslt[0], DICT)
+            eq_(json.loads('{%s}' % ','.join(rslt[1:])), obj)
+
+    def test_empty(self):
+        eq_(self.split('  [ ] ', 2), [LIST])
+
+    def test_scalar(self):
+        eq_(self.split('"abc"', 2), [None])
+        eq_(self.split('12', 1), [None])
+
+
+class TestImport:
+    def setup(self):
+        self.path = 'import.json'
+
+    def teardown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def from_file(self, obj):
+        with open(self.path, 'wb') as f:
+            json.dump(obj, f)
+        return jsondb.from_file(self.path, processes=2)
+
+    def test_list(self):
+        obj = [{'id': i, 'name': 'item%s' % i, 'tags': ['a', 1, {'b': None}]} for i in range(500)] + [1, 'x']
+        db = self.from_file(obj)
+        eq_(db.data(), obj)
+        eq_(db[10]['name'].data(), 'item10')
+        db.feed({'id': 'new'})
+        eq_(db.data()[-1], {'id': 'new'})
+        db.close()
+
+    def test_dict(self):
+        fpath = os.path.join(os.path.dirname(__file__), 'bookstore.json')
+        obj = json.load(open(fpath))
+        db = jsondb.from_file(fpath, processes=2)
+        eq_(db.data(), obj)
+        eq_(db.query('$.store.book.author').values(), [x['author'] for x in obj['store']['book']])
+        db.close()
+
+    def test_link(self):
+        db = self.from_file({'@__link__': 'root', 'a': {'@__link__': 'child', 'b': 1}})
+        eq_(db.link(), 'root')
+        eq_(db['a'].link(), 'child')
+        eq_(db.data(), {'a': {'b': 1}})
+        db.close()
+
+    @raises(IllegalTypeError)
+    def test_scalar(self):
+        self.from_file(1)
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.tests
+    ~~~~~~~~~~~~
+
+    Tests for JSON Patch.
+"""
+
+import os
+import glob
+import tempfile
+
+import jsondb
+from jsondb.patch import parse_pointer
+from nose.tools import eq_, raises
+
+
+class PatchBase:
+    url = None
+
+    def setup(self):
+        fd, self.path = tempfile.mkstemp(suffix='.jsondb')
+        os.close(fd)
+        self.obj = {
+            'foo': {'bar': 'baz', 'waldo': 'fred'},
+            'qux': {'corge': 'grault'},
+            'list': ['a', 'b', 'c', 'd'],
+            'a/b': 1,
+            'm~n': 2,
+        }
+        self.db = jsondb.create(self.obj, url=self.url or self.path)
+        self.db.commit()
+
+    def teardown(self):
+        self.db.close()
+        for path in glob.glob(self.path + '*'):
+            os.remove(path)
+
+
+class TestPatch(PatchBase):
+    def patch(self, *ops):
+        self.db.patch(list(ops))
+        return self.db.data()
+
+    def test_pointer(self):
+        eq_(parse_pointer(''), [])
+        eq_(parse_pointer('/a~1b/m~0n/0'), ['a/b', 'm~n', '0'])
+
+    def test_add(self):
+        eq_(self.patch({'op': 'add', 'path': '/baz', 'value': 'qux'})['baz'], 'qux')
+        eq_(self.patch({'op': 'add', 'path': '/list/1', 'value': 'x'})['list'], ['a', 'x', 'b', 'c', 'd'])
+        eq_(self.patch({'op': 'add', 'path': '/list/-', 'value': {'e': 1}})['list'][-1], {'e': 1})
+        eq_(self.patch({'op': 'add', 'path': '/list/0', 'value': ['y']})['list'][:2], [['y'], 'a'])
+        eq_(self.patch({'op': 'add', 'path': '/foo/bar', 'value': [1]})['foo'], {'bar': [1], 'waldo': 'fred'})
+        eq_(self.patch({'op': 'add', 'path': '/a~1b', 'value': 3})['a/b'], 3)
+
+    def test_add_root(self):
+        eq_(self.patch({'op': 'add', 'path': '', 'value': {'x': [1, 2]}}), {'x': [1, 2]})
+
+    def test_remove(self):
+        data = self.patch({'op': 'remove', 'path': '/foo/bar'}, {'op': 'remove', 'path': '/list/1'})
+        eq_(data['foo'], {'waldo': 'fred'})
+        eq_(data['list'], ['a', 'c', 'd'])
+        eq_('qux' in self.patch({'op': 'remove', 'path': '/qux'}), False)
+
+    def test_replace(self):
+        data = self.patch({'op': 'replace', 'path': '/foo', 'value': 'x'},
+                          {'op': 'replace', 'path': '/list/0', 'value': {'z': None}},
+                          {'op': 'replace', 'path': '/m~0n', 'value': True})
+        eq_(data['foo'], 'x')
+        eq_(data['list'], [{'z': None}, 'b', 'c', 'd'])
+        eq_(data['m~n'], True)
+
+    def test_move(self):
+        data = self.patch({'op': 'move', 'from': '/foo/waldo', 'path': '/qux/thud'})
+        eq_(data['foo'], {'bar': 'baz'})
+        eq_(data['qux'], {'corge': 'grault', 'thud': 'fred'})
+
+        eq_(self.patch({'op': 'move', 'from': '/list/1', 'path': '/list/3'})['list'], ['a', 'c', 'd', 'b'])
+        eq_(self.patch({'op': 'move', 'from': '/list/3', 'path': '/list/0'})['list'], ['b', 'a', 'c', 'd'])
+
+        data = self.patch({'op': 'move', 'from': '/qux', 'path': '/list/1'})
+        eq_(data['list'], ['b', {'corge': 'grault', 'thud': 'fred'}, 'a', 'c', 'd'])
+        eq_('qux' in data, False)
+
+        data = self.patch({'op': 'move', 'from': '/list/1', 'path': '/foo'})
+        eq_(data['foo'], {'corge': 'grault', 'thud': 'fred'})
+        eq_(data['list'], ['b', 'a', 'c', 'd'])
+
+    def test_move_up(self):
+        eq_(self.patch({'op': 'move', 'from': '/foo/bar', 'path': '/foo'})['foo'], 'baz')
+
+    def test_query_order(self):
+        # The queries return the elements in their new order
+        self.db['list'] = [{'n': 1}, {'n': 2}, {'n': 3}]
+        data = self.patch({'op': 'move', 'from': '/list/2', 'path': '/list/0'},
+                          {'op': 'add', 'path': '/list/1', 'value': {'n': 4}},
+                          {'op': 'copy', 'from': '/list/3', 'path': '/list/0'})
+        eq_(data['list'], [{'n': 2}, {'n': 3}, {'n': 4}, {'n': 1}, {'n': 2}])
+        eq_(self.db.query('$.list[*].n').values(), [2, 3, 4, 1, 2])
+        eq_(self.db.query('$..n').values(), [2, 3, 4, 1, 2])
+
+    def test_copy(self):
+        data = self.patch({'op': 'copy', 'from': '/foo', 'path': '/list/0'})
+        eq_(data['list'][0], self.obj['foo'])
+        eq_(data['foo'], self.obj['foo'])
+
+        data = self.patch({'op': 'copy', 'from': '/list/2', 'path': '/list/1'},
+                          {'op': 'copy', 'from': '/foo', 'path': '/qux/foo'},
+                          {'op': 'copy', 'from': '/qux', 'path': '/foo'})
+        eq_(data['list'], [self.obj['foo'], 'b', 'a', 'b', 'c', 'd'])
+        eq_(data['foo'], {'corge': 'grault', 'foo': self.obj['foo']})
+        eq_(data['qux'], data['foo'])
+
+    def test_test(self):
+        self.patch({'op': 'test', 'path': '/foo', 'value': {'bar': 'baz', 'waldo': 'fred'}},
+                   {'op': 'test', 'path': '/list', 'value': ['a', 'b', 'c', 'd']},
+                   {'op': 'test', 'path': '/a~1b', 'value': 1.0})
+
+    @raises(jsondb.PatchTestFailed)
+    def test_test_type(self):
+        self.patch({'op': 'test', 'path': '/a~1b', 'value': True})
+
+    def test_atomic(self):
+        for ops in ([{'op': 'remove', 'path': '/foo'}, {'op': 'test', 'path': '/m~0n', 'value': 3}],
+                    [{'op': 'add', 'path': '/list/0', 'value': 'x'}, {'op': 'remove', 'path': '/nothing'}],
+                    [{'op': 'replace', 'path': '/qux', 'value': 1}, {'op': 'add', 'path': '/list/9', 'value': 1}],
+                    [{'op': 'copy', 'path': '/x'}],
+                    [{'op': 'frobnicate', 'path': '/foo'}]):
+            try:
+                self.db.patch(ops)
+            except jsondb.PatchError:
+                pass
+            else:
+                raise AssertionError(ops)
+            eq_(self.db.data(), self.obj)
+
+    def test_atomic_pending(self):
+        # The writes before the patch are kept
+        self.db['count'] = 100
+        try:
+            self.db.patch([{'op': 'replace', 'path': '/qux', 'value': 1},
+                           {'op': 'test', 'path': '/m~0n', 'value': 3}])
+        except jsondb.PatchTestFailed:
+            pass
+        else:
+            raise AssertionError
+        self.db.backend.rollback()
+        eq_(self.db['count'].data(), 100)
+        eq_(self.db['qux'].data(), self.obj['qux'])
+
+        self.patch({'op': 'replace', 'path': '/qux', 'value': 1})
+        self.db.backend.rollback()
+        eq_(self.db['qux'].data(), self.obj['qux'])
+
+    def test_json_text(self):
+        self.db.patch('[{"op": "add", "path": "/list/-", "value": "e"}]')
+        eq_(self.db['list'].data(), ['a', 'b', 'c', 'd', 'e'])
+
+    def test_node(self):
+        self.db['foo'].patch([{'op': 'add', 'path': '/qux', 'value': 1}])
+        eq_(self.db['foo'].data(), {'bar': 'baz', 'waldo': 'fred', 'qux': 1})
+
+
+class TestMerge(PatchBase):
+    def merge(self, data):
+        changes = self.db.merge(data)
+        return changes, self.db.data()
+
+    def test_rfc7386(self):
+        changes, data = self.merge({'foo': {'bar': None, 'new': {'x': [1, {'y': 2}, 3]}}, 'list': None, 'qux': 'q'})
+        eq_(changes, 4)
+        eq_(data, {'foo': {'waldo': 'fred', 'new': {'x': [1, {'y': 2}, 3]}}, 'qux': 'q', 'a/b': 1, 'm~n': 2})
+
+    def test_unchanged(self):
+        eq_(self.merge(self.obj), (0, self.obj))
+        with self.db.capture() as tracer:
+            self.db.merge({'foo': {'bar': 'baz'}, 'list': ['a', 'b', 'c', 'd'], 'a/b': 1.0})
+        eq_(tracer.stats()['operations']['merge']['rows'] > 0, True)
+        eq_([sql for sql in tracer.stats()['queries'] if sql.startswith(('insert', 'update', 'delete'))], [])
+
+    def test_refresh(self):
+        obj = dict(self.obj, foo={'bar': 'BAZ', 'waldo': [1]}, list=['a', 'x', {'c': 1}])
+        del obj['qux']
+        obj['new'] = None
+        changes, data = self.merge(obj)
+        del obj['new']
+        eq_(data, dict(obj, qux=self.obj['qux']))
+        eq_(changes, 5)
+
+    def test_lists_replaced(self):
+        eq_(self.merge({'list': ['a', 'b']}), (2, dict(self.obj, list=['a', 'b'])))
+        eq_(self.merge({'list': ['a', 'b', [1, 2], 'c']})[1]['list'], ['a', 'b', [1, 2], 'c'])
+        eq_(self.merge({'list': {'a': 1}})[1]['list'], {'a': 1})
+        eq_(self.merge({'list': 'scalar'})[1]['list'], 'scalar')
+
+    def test_node(self):
+        self.db['foo'].merge({'bar': None, 'qux': 1})
+        eq_(self.db['foo'].data(), {'waldo': 'fred', 'qux': 1})
+
+
+class Sharded:
+    def setup(self):
+        fd, self.path = tempfile.mkstemp(suffix='.jsondb')
+        os.close(fd)
+        os.remove(self.path)
+        self.url = 'sharded://%s?shards=3&range=2' % self.path
+        PatchBase.setup(self)
+
+
+class TestShardedPatch(Sharded, TestPatch):
+    pass
+
+
+class TestShardedMerge(Sharded, TestMerge):
+    pass
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.tests
+    ~~~~~~~~~~~~
+
+    Number of SQL statements of the core operations on the bookstore.
+    Lower the budgets when an operation gets cheaper, so that it stays so.
+"""
+
+import os
+import json
+import tempfile
+
+import jsondb
+from jsondb.testing import assert_max_queries
+from nose.tools import eq_, raises
+
+
+class TestQueryBudget:
+    def setup(self):
+        fd, self.path = tempfile.mkstemp(suffix='.jsondb')
+        os.close(fd)
+        fpath = os.path.join(os.path.dirname(__file__), 'bookstore.json')
+        jsondb.from_file(fpath, url=self.path).close()
+        self.db = jsondb.load(self.path)
+        self.book = self.db['store']['book']
+        self.bicycle = self.db['store']['bicycle']
+
+    def teardown(self):
+        self.db.close()
+        os.remove(self.path)
+
+    def test_from_file(self):
+        fpath = os.path.join(os.path.dirname(__file__), 'bookstore.json')
+        with assert_max_queries(73):
+            jsondb.from_file(fpath).close()
+
+    def test_getitem(self):
+        with assert_max_queries(4, self.db):
+            self.db['store']
+        with assert_max_queries(11, self.db):
+            self.db['store']['bicycle']['color']
+
+    def test_list(self):
+        with assert_max_queries(4, self.db):
+            self.book[0]
+        with assert_max_queries(1, self.db):
+            len(self.book)
+        with assert_max_queries(39, self.db):
+            [x.data() for x in self.book]
+
+    def test_dict(self):
+        with assert_max_queries(7, self.db):
+            list(self.bicycle.iteritems())
+        with assert_max_queries(2, self.db):
+            'color' in self.bicycle
+        with assert_max_queries(4, self.db):
+            self.bicycle.get('color')
+
+    def test_query(self):
+        with assert_max_queries(13, self.db):
+            self.db.query('$.store.book.author').values()
+        with assert_max_queries(10, self.db):
+            self.db.query('$.store.book[?(@.price < 10)].title').values()
+        with assert_max_queries(31, self.db):
+            self.db.query('$..price').values()
+
+    def test_data(self):
+        with assert_max_queries(32, self.db):
+            self.db.data()
+
+    def test_feed(self):
+        with assert_max_queries(10, self.db):
+            self.book.feed({'title': 'foo', 'tags': ['a', 'b']})
+
+    def test_setitem(self):
+        with assert_max_queries(11, self.db):
+            self.bicycle['color'] = 'blue'
+
+    def test_delitem(self):
+        with assert_max_queries(4, self.db):
+            del self.bicycle['color']
+
+    def test_update(self):
+        # The path, then a single UPDATE for all the matches.
+        with assert_max_queries(22, self.db):
+            self.db.update('$..price', incr=1)
+        with assert_max_queries(23, self.db):
+            self.db.update('$..price', set=0)
+
+    def test_iadd(self):
+        price = self.bicycle['price']
+        with assert_max_queries(1, self.db):
+            price += 1
+
+    def test_merge(self):
+        # A statement per dict or list, and the changes written at the end.
+        fpath = os.path.join(os.path.dirname(__file__), 'bookstore.json')
+        with open(fpath) as f:
+            data = json.load(f)
+        with assert_max_queries(9, self.db):
+            eq_(self.db.merge(data), 0)
+        data['store']['bicycle']['color'] = 'blue'
+        with assert_max_queries(11, self.db):
+            eq_(self.db.merge(data), 1)
+
+    def test_delete(self):
+        with assert_max_queries(23, self.db):
+            self.db.delete('$..price')
+
+    def test_copy(self):
+        # The paths, then one INSERT ... SELECT per copied subtree.
+        with assert_max_queries(5, self.db):
+            self.book *= 3
+        with assert_max_queries(12, self.db):
+            self.db.copy('$.store.book', '$.store', key='books')
+        # The moved subtree is read once to renumber it.
+        with assert_max_queries(22, self.db):
+            self.db.move('$.store.bicycle', '$.store.book')
+
+    def test_exceeded(self):
+        try:
+            with assert_max_queries(1):
+                self.db.query('$.store.book.author').values()
+        except AssertionError as e:
+            eq_(str(e).startswith('13 SQL statements, expected at most 1.'), True)
+        else:
+            raise Exception('not raised')
+
+    @raises(KeyError)
+    def test_error(self):
+        with assert_max_queries(0):
+            raise KeyError
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.tests
+    ~~~~~~~~~~~~
+
+    Tests for the replication of the change log.
+"""
+
+import os
+import tempfile
+
+import jsondb
+from nose.tools import eq_, raises
+
+
+class TestReplica:
+    def setup(self):
+        self.paths = []
+        self.obj = {'store': {'book': [{'title': 'a'}, {'title': 'b'}], 'bicycle': {'color': 'red'}}, 'tags': []}
+        self.primary = self.path()
+        self.replica = self.path()
+        os.remove(self.replica)
+        jsondb.create(self.obj, url=self.primary, changelog=True).close()
+
+    def teardown(self):
+        for path in self.paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def path(self):
+        fd, path = tempfile.mkstemp(suffix='.jsondb')
+        os.close(fd)
+        self.paths.append(path)
+        return path
+
+    def data(self, path):
+        db = jsondb.load(path)
+        try:
+            return db.data()
+        finally:
+            db.close()
+
+    def test_replicate(self):
+        stats = jsondb.replicate(self.primary, self.replica)
+        eq_(stats['full'], True)
+        eq_(self.data(self.replica), self.data(self.primary))
+
+        db = jsondb.load(self.primary)
+        db['store']['bicycle']['color'] = 'blue'
+        db['tags'].append({'x': [1, 2]})
+        del db['store']['book'][0]
+        db.move('$.store.bicycle', '$.tags')
+        db.close()
+
+        stats = jsondb.replicate(self.primary, self.replica, batch_size=3)
+        eq_(stats['full'], False)
+        eq_(stats['changes'] > 3, True)
+        eq_(self.data(self.replica), self.data(self.primary))
+
+        stats = jsondb.replicate(self.primary, self.replica)
+        eq_((stats['changes'], stats['rows']), (0, 0))
+
+    def test_trimmed(self):
+        jsondb.replicate(self.primary, self.replica)
+        db = jsondb.load(self.primary)
+        db['tags'].append(1)
+        db['tags'].append(2)
+        db.backend.trim_changes(db.backend.get_change_seq())
+        db.close()
+
+        # A reader of the replica keeps its data while it is copied again
+        reader = jsondb.load(self.replica, readonly=True)
+        stats = jsondb.replicate(self.primary, self.replica)
+        eq_(stats['full'], True)
+        eq_(reader['tags'].data(), [])
+        reader.close()
+        eq_(self.data(self.replica)['tags'], [1, 2])
+
+        db = jsondb.load(self.primary)
+        db['tags'].append(3)
+        db.close()
+        eq_(jsondb.replicate(self.primary, self.replica)['full'], False)
+        eq_(self.data(self.replica)['tags'], [1, 2, 3])
+
+    @raises(jsondb.UnsupportedOperation)
+    def test_no_changelog(self):
+        jsondb.create({}, url=self.primary).close()
+        jsondb.replicate(self.primary, self.replica)
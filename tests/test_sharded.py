@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.tests
+    ~~~~~~~~~~~~
+
+    Tests for the sharded backend.
+"""
+
+import os
+import glob
+import json
+import tempfile
+
+import jsondb
+from nose.tools import eq_
+
+
+class TestSharded:
+    def setup(self):
+        self.dir = tempfile.mkdtemp()
+        self.url = 'sharded://%s/db?shards=3&range=2' % self.dir
+        fpath = os.path.join(os.path.dirname(__file__), 'bookstore.json')
+        self.obj = json.load(open(fpath))
+        self.obj['keys'] = dict(('key%s' % i, i) for i in range(20))
+        self.db = jsondb.create(self.obj, url=self.url)
+
+    def teardown(self):
+        self.db.close()
+        for path in glob.glob(os.path.join(self.dir, '*')):
+            os.remove(path)
+        os.rmdir(self.dir)
+
+    def test_files(self):
+        eq_(sorted(os.listdir(self.dir)), ['db.0', 'db.1', 'db.2'])
+
+    def test_data(self):
+        eq_(self.db.data(), self.obj)
+        eq_(self.db['store']['book'][1]['author'].data(), 'Evelyn Waugh')
+        eq_(len(self.db), len(self.obj))
+        eq_('keys' in self.db, True)
+
+    def test_query(self):
+        eq_(self.db.query('$.store.book.author').values(), [x['author'] for x in self.obj['store']['book']])
+        eq_(sorted(self.db.query('$..price').values()), sorted([x['price'] for x in self.obj['store']['book']] + [19.95]))
+        eq_(self.db.query('$.store.book[?(@.price < 10)].title').values(), ['Sayings of the Century', 'Moby Dick'])
+
+    def test_reload(self):
+        self.db.close()
+        self.db = jsondb.load(self.url)
+        eq_(self.db.data(), self.obj)
+        self.db['new'] = 1
+        eq_(self.db['new'].data(), 1)
+
+
+class TestShardedList:
+    def setup(self):
+        self.dir = tempfile.mkdtemp()
+        self.url = 'sharded://%s/db?shards=2&range=3' % self.dir
+        self.obj = [{'i': i} for i in range(10)]
+        self.db = jsondb.create(self.obj, url=self.url)
+
+    def teardown(self):
+        self.db.close()
+        for path in glob.glob(os.path.join(self.dir, '*')):
+            os.remove(path)
+        os.rmdir(self.dir)
+
+    def test_order(self):
+        eq_(self.db.data(), self.obj)
+        eq_(self.db[4].data(), {'i': 4})
+        eq_(self.db[-1].data(), {'i': 9})
+        self.db.append({'i': 10})
+        eq_(self.db.data(), self.obj + [{'i': 10}])
+
+    def test_balanced(self):
+        counts = [shard.get_children_count(-1) for shard in self.db.backend.shards]
+        eq_(counts, [6, 4])
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+"""
+    jsondb.tests
+    ~~~~~~~~~~~~
+
+    Tests for the snapshots and the in-memory copies.
+"""
+
+import os
+import tempfile
+
+import jsondb
+from nose.tools import eq_, raises
+
+
+class TestSnapshot:
+    def setup(self):
+        self.paths = []
+        self.obj = {'store': {'book': [{'title': 'a'}, {'title': u'b\xe9'}], 'bicycle': {'color': 'red'}}, 'tags': []}
+        self.path = self.mkstemp()
+        self.db = jsondb.create(self.obj, url=self.path, hashes=True, changelog=True)
+        self.db.digest()
+        self.db.commit()
+        self.data = self.db.data()
+
+    def teardown(self):
+        self.db.close()
+        for path in self.paths:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+    def mkstemp(self):
+        fd, path = tempfile.mkstemp(suffix='.jsondb')
+        os.close(fd)
+        self.paths.append(path)
+        return path
+
+    def test_snapshot(self):
+        # Not committed, so not copied
+        self.db['tags'].append(1)
+
+        path = self.mkstemp()
+        pages = []
+        stats = self.db.snapshot(path, step=3, progress=pages.append)
+        eq_(stats['pages'] > 0, True)
+        eq_(stats['pages_per_sec'] > 0, True)
+        eq_(len(pages) > 3, True)
+        eq_(os.path.exists(path + '.tmp'), False)
+
+        db = jsondb.load(path)
+        eq_(db.data(), self.data)
+        eq_((db.backend.hashes, db.backend.changelog), (True, True))
+        eq_(db.digest(), jsondb.create(self.obj).digest())
+        eq_(db.backend.get_change_seq(), self.db.backend.get_change_seq() - 1)
+
+        # The triggers are copied too
+        db['tags'].append(1)
+        eq_(db.digest(), self.db.digest())
+        eq_(len(list(db.changes(self.db.backend.get_change_seq() - 1))), 1)
+        db.close()
+
+    def test_wal_writer(self):
+        # Commits go on during the copy in WAL mode, and are not in it
+        path = self.mkstemp()
+        db = jsondb.create(self.obj, url=path, profile='concurrent')
+        def progress(pages):
+            db['tags'].append(1)
+            db.commit()
+        copy = self.mkstemp()
+        db.snapshot(copy, step=1, progress=progress)
+        eq_(len(db['tags'].data()) > 1, True)
+        db.close()
+        eq_(jsondb.load(copy, readonly=True)['tags'].data(), [])
+
+    def test_load(self):
+        db = jsondb.load(self.path, snapshot=True)
+        eq_(db.get_path(), ':memory:')
+        eq_(db.backend.snapshot_stats['pages'] > 0, True)
+        eq_(db.data(), self.data)
+
+        db['store']['bicycle']['color'] = 'blue'
+        db.commit()
+        eq_(self.db['store']['bicycle']['color'].data(), 'red')
+
+        path = self.mkstemp()
+        db.snapshot('sqlite3://' + path)
+        db.close()
+        eq_(jsondb.load(path, readonly=True)['store']['bicycle']['color'].data(), 'blue')
+
+    @raises(jsondb.UnsupportedOperation)
+    def test_sharded(self):
+        path = self.mkstemp()
+        os.remove(path)
+        jsondb.create(self.obj, url='sharded://%s?shards=2' % path).snapshot(self.mkstemp())